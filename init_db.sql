@@ -1,11 +1,39 @@
-CREATE TABLE IF NOT EXISTS listening_history (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-    artist TEXT NOT NULL,
-    album TEXT,
+CREATE TABLE IF NOT EXISTS artists (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS albums (
+    id INTEGER PRIMARY KEY,
+    artist_id INTEGER NOT NULL REFERENCES artists(id),
+    name TEXT NOT NULL,
+    UNIQUE (artist_id, name)
+);
+
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    artist_id INTEGER NOT NULL REFERENCES artists(id),
     title TEXT NOT NULL,
+    UNIQUE (artist_id, title)
+);
+
+-- MPD servers plays were scrobbled from; NULL source_id is the single tracker
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS plays (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    -- Unix epoch; listening_history shows it as local time
+    timestamp INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+    artist_id INTEGER NOT NULL REFERENCES artists(id),
+    album_id INTEGER REFERENCES albums(id),
+    track_id INTEGER NOT NULL REFERENCES tracks(id),
     duration INTEGER,
-    played INTEGER DEFAULT 1
+    played INTEGER DEFAULT 1,
+    source_id INTEGER REFERENCES sources(id),
+    session_id INTEGER REFERENCES sessions(id)
 );
 
 CREATE TABLE IF NOT EXISTS stats_cache (
@@ -15,6 +43,140 @@ CREATE TABLE IF NOT EXISTS stats_cache (
     updated DATETIME
 );
 
-CREATE INDEX IF NOT EXISTS idx_timestamp ON listening_history(timestamp);
-CREATE INDEX IF NOT EXISTS idx_artist ON listening_history(artist);
-CREATE INDEX IF NOT EXISTS idx_artist_date ON listening_history(artist, date(timestamp));
+CREATE INDEX IF NOT EXISTS idx_plays_timestamp ON plays(timestamp);
+CREATE INDEX IF NOT EXISTS idx_plays_artist ON plays(artist_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_plays_track ON plays(track_id);
+
+-- Denormalized view with the original listening_history columns
+CREATE VIEW IF NOT EXISTS listening_history AS
+SELECT p.id, datetime(p.timestamp, 'unixepoch', 'localtime') AS timestamp,
+       a.name AS artist, al.name AS album, t.title, p.duration, p.played,
+       s.name AS source, p.timestamp AS epoch
+FROM plays p
+JOIN artists a ON a.id = p.artist_id
+JOIN tracks t ON t.id = p.track_id
+LEFT JOIN albums al ON al.id = p.album_id
+LEFT JOIN sources s ON s.id = p.source_id;
+
+-- Keeps writers that still INSERT INTO listening_history working. Plays
+-- added this way skip the rollups below until `mpd_stats.py rebuild`.
+CREATE TRIGGER IF NOT EXISTS listening_history_insert
+INSTEAD OF INSERT ON listening_history
+BEGIN
+    INSERT OR IGNORE INTO artists (name) VALUES (NEW.artist);
+    INSERT OR IGNORE INTO tracks (artist_id, title)
+        SELECT id, NEW.title FROM artists WHERE name = NEW.artist;
+    INSERT OR IGNORE INTO albums (artist_id, name)
+        SELECT id, NEW.album FROM artists WHERE name = NEW.artist AND NEW.album IS NOT NULL;
+    INSERT INTO plays (timestamp, artist_id, album_id, track_id, duration, played)
+        SELECT COALESCE(CAST(strftime('%s', NEW.timestamp, 'utc') AS INTEGER),
+                        CAST(strftime('%s', 'now') AS INTEGER)),
+               a.id, al.id, t.id,
+               NEW.duration, COALESCE(NEW.played, 1)
+        FROM artists a
+        JOIN tracks t ON t.artist_id = a.id AND t.title = NEW.title
+        LEFT JOIN albums al ON al.artist_id = a.id AND al.name = NEW.album
+        WHERE a.name = NEW.artist;
+END;
+
+-- Rollups maintained by mpd_scrobbler.py on every logged play
+CREATE TABLE IF NOT EXISTS artist_stats (
+    artist_id INTEGER PRIMARY KEY REFERENCES artists(id),
+    plays INTEGER NOT NULL DEFAULT 0,
+    first_play INTEGER,
+    last_play INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS track_stats (
+    track_id INTEGER PRIMARY KEY REFERENCES tracks(id),
+    plays INTEGER NOT NULL DEFAULT 0,
+    first_play INTEGER,
+    last_play INTEGER
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_stats_cache ON stats_cache(period, type);
+CREATE INDEX IF NOT EXISTS idx_artist_stats_plays ON artist_stats(plays);
+CREATE INDEX IF NOT EXISTS idx_track_stats_plays ON track_stats(plays);
+
+-- HyperLogLog registers for approximate distinct counts, per day and 'all'
+CREATE TABLE IF NOT EXISTS stats_sketches (
+    day TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    registers BLOB NOT NULL,
+    PRIMARY KEY (day, kind)
+);
+
+-- Play counts bucketed by local day and hour, overall and per artist
+CREATE TABLE IF NOT EXISTS play_days (
+    day TEXT PRIMARY KEY,
+    plays INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS play_hours (
+    day TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    plays INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, hour)
+);
+
+CREATE TABLE IF NOT EXISTS artist_days (
+    artist_id INTEGER NOT NULL REFERENCES artists(id),
+    day TEXT NOT NULL,
+    plays INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (artist_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS artist_hours (
+    artist_id INTEGER NOT NULL REFERENCES artists(id),
+    day TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    plays INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (artist_id, day, hour)
+);
+
+-- Running play totals: total counts every play up to and including day, so
+-- the plays between two days are a difference of two lookups
+CREATE TABLE IF NOT EXISTS artist_day_totals (
+    artist_id INTEGER NOT NULL REFERENCES artists(id),
+    day TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (artist_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS track_day_totals (
+    track_id INTEGER NOT NULL REFERENCES tracks(id),
+    day TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (track_id, day)
+);
+
+-- Listening sessions: runs of plays with less than mpd_db.SESSION_GAP seconds
+-- between one play ending and the next starting. seconds sums track durations;
+-- start, last_play and end are Unix epochs like plays.timestamp.
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    start INTEGER NOT NULL,
+    last_play INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    plays INTEGER NOT NULL DEFAULT 0,
+    seconds INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_sessions_start ON sessions(start);
+CREATE INDEX IF NOT EXISTS idx_sessions_seconds ON sessions(seconds);
+
+-- Yearly archive databases holding plays moved out of this one (mpd_db.archive_plays)
+CREATE TABLE IF NOT EXISTS partitions (
+    name TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    first_day TEXT NOT NULL,
+    last_day TEXT NOT NULL,
+    plays INTEGER NOT NULL DEFAULT 0
+);
+
+-- Resume points for `mpd_stats.py import-log`: the epoch of the last imported play
+CREATE TABLE IF NOT EXISTS import_state (
+    source TEXT PRIMARY KEY,
+    last_timestamp DATETIME,
+    updated DATETIME
+);
@@ -0,0 +1,265 @@
+import json
+import os
+import time
+import numpy as np
+import mpd_db
+
+# Configuration
+SNAPSHOT_DIR = os.path.expanduser("~/.config/Seas/snapshot")
+EXPORT_CHUNK = 100000
+FORMATS = ['npy', 'parquet']
+
+PERIOD_DAYS = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+
+COLUMNS = {
+    'timestamp': np.int64,
+    'artist_id': np.int32,
+    'track_id': np.int32,
+    'duration': np.int32
+}
+
+PLAYS_SQL = '''
+    SELECT timestamp, artist_id, track_id, COALESCE(duration, 0)
+    FROM {plays}
+'''
+
+class Columns:
+    """Parallel play arrays; sorted ones can be cut by time with a binary search"""
+
+    def __init__(self, arrays, is_sorted):
+        self.arrays = arrays
+        self.is_sorted = is_sorted
+
+    def __len__(self):
+        return len(self.arrays['timestamp'])
+
+    def since(self, epoch):
+        """Arrays restricted to plays strictly after epoch (views where possible)"""
+        timestamps = self.arrays['timestamp']
+        if self.is_sorted:
+            start = np.searchsorted(timestamps, epoch, side='right')
+            return {name: column[start:] for name, column in self.arrays.items()}
+        mask = timestamps > epoch
+        return {name: column[mask] for name, column in self.arrays.items()}
+
+def _read_columns(cursor, sql, params, rows):
+    """Fill preallocated arrays from a query in chunks"""
+    arrays = {name: np.empty(rows, dtype) for name, dtype in COLUMNS.items()}
+    cursor.execute(sql, params)
+    filled = 0
+    while True:
+        chunk = cursor.fetchmany(EXPORT_CHUNK)
+        if not chunk:
+            break
+        block = np.array(chunk, dtype=np.int64)
+        end = filled + len(block)
+        for i, column in enumerate(arrays.values()):
+            column[filled:end] = block[:, i]
+        filled = end
+    return {name: column[:filled] for name, column in arrays.items()}
+
+def _read_plays(cursor, where='', params=()):
+    """Columns of the matching plays from the hot table and then each archive, one at a time"""
+    parts = []
+    for schema in mpd_db.each_schema(cursor):
+        plays = f'{schema}.plays'
+        cursor.execute(f'SELECT COUNT(*) FROM {plays} {where}', params)
+        rows = cursor.fetchone()[0]
+        parts.append(_read_columns(cursor, PLAYS_SQL.format(plays=plays) + where, params, rows))
+    return {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+
+def _names(cursor):
+    cursor.execute('SELECT id, name FROM artists ORDER BY id')
+    artists = cursor.fetchall()
+    cursor.execute('SELECT id, title FROM tracks ORDER BY id')
+    tracks = cursor.fetchall()
+    return artists, tracks
+
+def export_snapshot(db, path=SNAPSHOT_DIR, fmt='npy'):
+    """Write every play as timestamp-sorted columns, returning the row count"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    cursor = db.cursor()
+    # Ids only grow, so plays committed while exporting land above last_id
+    cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'plays'")
+    last_id = cursor.fetchone()[0]
+    arrays = _read_plays(cursor, ' WHERE id <= ? ORDER BY timestamp, id', (last_id,))
+    # Each partition comes back sorted; a stable sort merges them
+    order = np.argsort(arrays['timestamp'], kind='stable')
+    arrays = {name: column[order] for name, column in arrays.items()}
+    artists, tracks = _names(cursor)
+
+    meta = {'rows': len(arrays['timestamp']), 'last_id': last_id, 'exported': int(time.time())}
+    os.makedirs(path, exist_ok=True)
+    if fmt == 'npy':
+        _write_npy(path, arrays, artists, tracks, meta)
+    else:
+        _write_parquet(path, arrays, artists, tracks, meta)
+    return meta['rows']
+
+def _replace(path, write, mode='wb'):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, mode) as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+def _write_meta(path, meta):
+    # Written last: a snapshot whose arrays do not match meta is ignored
+    _replace(os.path.join(path, 'meta.json'), lambda f: json.dump(meta, f), 'w')
+
+def _write_npy(path, arrays, artists, tracks, meta):
+    for name, column in arrays.items():
+        _replace(os.path.join(path, f'{name}.npy'), lambda f: np.save(f, column))
+    _write_meta(path, dict(meta, format='npy', artists=artists, tracks=tracks))
+
+def _write_parquet(path, arrays, artists, tracks, meta):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    def dictionary(codes, names):
+        # Ids index straight into the dictionary, so it has a slot per id
+        values = [''] * (max((i for i, _ in names), default=0) + 1)
+        for i, name in names:
+            values[i] = name
+        return pa.DictionaryArray.from_arrays(pa.array(codes), pa.array(values))
+
+    table = pa.table({
+        'timestamp': pa.array(arrays['timestamp']).cast(pa.timestamp('s')),
+        'artist_id': arrays['artist_id'],
+        'track_id': arrays['track_id'],
+        'duration': arrays['duration'],
+        'artist': dictionary(arrays['artist_id'], artists),
+        'title': dictionary(arrays['track_id'], tracks)
+    })
+    table = table.replace_schema_metadata({'mpd_stats': json.dumps(meta)})
+    _replace(os.path.join(path, 'plays.parquet'), lambda f: pq.write_table(table, f))
+    _write_meta(path, dict(meta, format='parquet'))
+
+_snapshot = {'key': None, 'columns': None, 'last_id': 0}
+
+def load_snapshot(path=None):
+    """Memory-map the exported columns, returning (Columns, last_id) or (None, 0)"""
+    path = path or SNAPSHOT_DIR
+    meta_path = os.path.join(path, 'meta.json')
+    try:
+        key = (meta_path, os.stat(meta_path).st_mtime_ns)
+    except OSError:
+        return None, 0
+    if _snapshot['key'] == key:
+        return _snapshot['columns'], _snapshot['last_id']
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+
+    if meta.get('format') == 'parquet':
+        import pyarrow.parquet as pq
+        table = pq.read_table(os.path.join(path, 'plays.parquet'), columns=list(COLUMNS),
+                              memory_map=True)
+        arrays = {name: table[name].to_numpy().astype(dtype, copy=False)
+                  for name, dtype in COLUMNS.items()}
+    else:
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+                  for name in COLUMNS}
+
+    if any(len(column) != meta['rows'] for column in arrays.values()):
+        return None, 0
+
+    _snapshot.update(key=key, columns=Columns(arrays, True), last_id=meta['last_id'])
+    return _snapshot['columns'], meta['last_id']
+
+def load_columns(cursor, path=None):
+    """The snapshot plus any plays logged after it was exported
+
+    Without a snapshot that is every play, archives included.
+    """
+    snapshot, last_id = load_snapshot(path)
+    tail = Columns(_read_plays(cursor, ' WHERE id > ?', (last_id,)), False)
+    return [chunk for chunk in (snapshot, tail) if chunk is not None and len(chunk)]
+
+def _period_epoch(period):
+    if period not in PERIOD_DAYS:
+        return -1
+    return int(time.time()) - PERIOD_DAYS[period] * 86400
+
+def _counts(chunks, column, epoch):
+    """Plays per id across every chunk, as one bincount per chunk"""
+    counts = np.zeros(0, np.int64)
+    for chunk in chunks:
+        ids = chunk.since(epoch)[column]
+        if not len(ids):
+            continue
+        chunk_counts = np.bincount(ids)
+        if len(chunk_counts) > len(counts):
+            counts = np.pad(counts, (0, len(chunk_counts) - len(counts)))
+        counts[:len(chunk_counts)] += chunk_counts
+    return counts
+
+def _top(counts, limit):
+    """Ids of the `limit` largest non-zero counts, highest first"""
+    limit = min(limit, np.count_nonzero(counts))
+    if limit <= 0:
+        return []
+    top = np.argpartition(-counts, limit - 1)[:limit]
+    return top[np.lexsort((top, -counts[top]))].tolist()
+
+def _lookup(cursor, sql, ids):
+    cursor.execute(sql.format(', '.join('?' for _ in ids)), ids)
+    return {row[0]: row[1:] for row in cursor}
+
+def query_top_artists(cursor, period='all', limit=10):
+    """Top artists for a period, counted with bincount over the snapshot"""
+    counts = _counts(load_columns(cursor), 'artist_id', _period_epoch(period))
+    top = _top(counts, limit)
+    names = _lookup(cursor, 'SELECT id, name FROM artists WHERE id IN ({})', top)
+    return {'period': period, 'rows': [(names[i][0], int(counts[i])) for i in top]}
+
+def query_top_tracks(cursor, period='all', limit=10):
+    """Top tracks for a period, counted with bincount over the snapshot"""
+    counts = _counts(load_columns(cursor), 'track_id', _period_epoch(period))
+    top = _top(counts, limit)
+    names = _lookup(cursor, '''
+        SELECT t.id, a.name, t.title
+        FROM tracks t
+        JOIN artists a ON a.id = t.artist_id
+        WHERE t.id IN ({})
+    ''', top)
+    return {'period': period, 'rows': [(*names[i], int(counts[i])) for i in top]}
+
+def query_stats_summary(cursor, period='all', approx=False):
+    """Period totals from the snapshot; distinct counts are exact, so approx is ignored"""
+    chunks = load_columns(cursor)
+    epoch = _period_epoch(period)
+    artist_counts = _counts(chunks, 'artist_id', epoch)
+    track_counts = _counts(chunks, 'track_id', epoch)
+
+    first_play = last_play = None
+    for chunk in chunks:
+        timestamps = chunk.since(epoch)['timestamp']
+        if len(timestamps):
+            first = int(timestamps.min())
+            last = int(timestamps.max())
+            first_play = first if first_play is None else min(first_play, first)
+            last_play = last if last_play is None else max(last_play, last)
+
+    top = _top(artist_counts, 1)
+    names = _lookup(cursor, 'SELECT id, name FROM artists WHERE id IN ({})', top)
+    return {
+        'period': period,
+        'total_plays': int(artist_counts.sum()),
+        'unique_artists': int(np.count_nonzero(artist_counts)),
+        'unique_tracks': int(np.count_nonzero(track_counts)),
+        'top_artist': names[top[0]][0] if top else "None",
+        'top_artist_plays': int(artist_counts[top[0]]) if top else 0,
+        'first_play': mpd_db.local_time(first_play),
+        'last_play': mpd_db.local_time(last_play)
+    }
+
+REPORTS = {
+    'ta': query_top_artists,
+    'tt': query_top_tracks,
+    'stats': query_stats_summary
+}
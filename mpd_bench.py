@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import datetime
+from rich.console import Console
+import mpd_db
+import mpd_scrobbler
+import mpd_stats
+
+# Initialize rich console (stdout is reserved for the JSON results)
+console = Console(stderr=True)
+
+# Configuration
+BENCH_DIR = os.path.expanduser("~/.cache/Seas/bench")
+SIZES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+DEFAULT_SIZES = '10k,1m'
+ZIPF_EXPONENT = 1.1
+TRACKS_PER_ARTIST = 15
+ALBUMS_PER_ARTIST = 3
+PLAYS_PER_DAY = 60
+MAX_HISTORY_DAYS = 3650
+INSERT_BATCH = 100000
+REPEAT = 5
+SCROBBLES = 500
+RENDER_WIDTH = 100
+
+ADJECTIVES = ['Black', 'Silver', 'Electric', 'Hollow', 'Crimson', 'Velvet', 'Broken', 'Golden',
+              'Static', 'Neon', 'Paper', 'Iron', 'Quiet', 'Wild', 'Lunar', 'Glass']
+NOUNS = ['Wolves', 'Machines', 'Harbor', 'Cathedral', 'Satellites', 'Orchard', 'Engines', 'Tides',
+         'Ghosts', 'Parade', 'Monarchs', 'Circuit', 'Lanterns', 'Empire', 'Garden', 'Signal']
+
+FUNCTIONS = {
+    'ta': 'top_artists',
+    'tt': 'top_tracks',
+    'rec': 'recent_tracks',
+    'tracks': 'artist_top_tracks',
+    'stats': 'stats_summary',
+    'heatmap': 'heatmap',
+    'timeline': 'timeline',
+    'sessions': 'sessions',
+    'streaks': 'streaks',
+    'dashboard': 'dashboard'
+}
+
+def zipf_cum_weights(n, exponent=ZIPF_EXPONENT):
+    """Cumulative weights for rank 1..n under a Zipf law, for random.choices"""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, n + 1)))
+
+def artist_name(i):
+    adjective = ADJECTIVES[i % len(ADJECTIVES)]
+    noun = NOUNS[(i // len(ADJECTIVES)) % len(NOUNS)]
+    generation = i // (len(ADJECTIVES) * len(NOUNS))
+    return f"{adjective} {noun}" + (f" {generation + 1}" if generation else "")
+
+def library_size(rows):
+    """Artist count that grows sublinearly with history length, like real libraries"""
+    return max(20, int(rows ** 0.6))
+
+def generate_plays(rows, artists, rng, end=None):
+    """Yield plays in time order with Zipf-distributed artists and tracks"""
+    end = end or time.time()
+    days = min(MAX_HISTORY_DAYS, max(30, rows // PLAYS_PER_DAY))
+    mean_gap = days * 86400 / rows
+    artist_weights = zipf_cum_weights(artists)
+    track_weights = zipf_cum_weights(TRACKS_PER_ARTIST)
+    artist_ids = range(1, artists + 1)
+    track_numbers = range(TRACKS_PER_ARTIST)
+
+    at = end - days * 86400
+    for start in range(0, rows, INSERT_BATCH):
+        count = min(INSERT_BATCH, rows - start)
+        picked_artists = rng.choices(artist_ids, cum_weights=artist_weights, k=count)
+        picked_tracks = rng.choices(track_numbers, cum_weights=track_weights, k=count)
+        for artist_id, number in zip(picked_artists, picked_tracks):
+            at += rng.expovariate(1 / mean_gap)
+            track_id = (artist_id - 1) * TRACKS_PER_ARTIST + number + 1
+            album_id = (artist_id - 1) * ALBUMS_PER_ARTIST + number % ALBUMS_PER_ARTIST + 1
+            yield int(min(at, end)), artist_id, album_id, track_id, 150 + (track_id * 37) % 240
+
+def generate_history(path, rows, seed=0):
+    """Create a history database with `rows` synthetic plays and fresh rollups"""
+    rng = random.Random(seed)
+    artists = library_size(rows)
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    db = mpd_db.connect(path)
+    cursor = db.cursor()
+    cursor.executemany('INSERT INTO artists (id, name) VALUES (?, ?)',
+                       ((i, artist_name(i - 1)) for i in range(1, artists + 1)))
+    cursor.executemany('INSERT INTO albums (id, artist_id, name) VALUES (?, ?, ?)', (
+        ((a - 1) * ALBUMS_PER_ARTIST + n + 1, a, f"Album {n + 1}")
+        for a in range(1, artists + 1) for n in range(ALBUMS_PER_ARTIST)))
+    cursor.executemany('INSERT INTO tracks (id, artist_id, title) VALUES (?, ?, ?)', (
+        ((a - 1) * TRACKS_PER_ARTIST + n + 1, a, f"Song {n + 1}")
+        for a in range(1, artists + 1) for n in range(TRACKS_PER_ARTIST)))
+    db.commit()
+
+    plays = generate_plays(rows, artists, rng)
+    while True:
+        batch = list(itertools.islice(plays, INSERT_BATCH))
+        if not batch:
+            break
+        cursor.executemany('''
+            INSERT INTO plays (timestamp, artist_id, album_id, track_id, duration)
+            VALUES (?, ?, ?, ?, ?)
+        ''', batch)
+        db.commit()
+
+    mpd_db.rebuild_stats_cache(db)
+    db.close()
+    return artists
+
+def dataset_path(bench_dir, size, seed):
+    return os.path.join(bench_dir, f"history-{size}-{seed}.db")
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+def report_cases(cursor):
+    """The reports to time, with an artist query taken from the generated data"""
+    cursor.execute('SELECT a.name FROM artist_stats s JOIN artists a ON a.id = s.artist_id '
+                   'ORDER BY s.plays DESC LIMIT 1')
+    row = cursor.fetchone()
+    artist = row[0].split()[0].lower() if row else 'unknown'
+
+    cases = []
+    for period in ('all', 'month', 'year'):
+        cases.append(('ta', {'period': period, 'limit': 10}))
+        cases.append(('tt', {'period': period, 'limit': 10}))
+    cases.append(('rec', {'limit': 20}))
+    cases.append(('tracks', {'artist_name': artist, 'limit': 10}))
+    for period in ('all', 'year'):
+        cases.append(('stats', {'period': period, 'approx': False}))
+    cases.append(('stats', {'period': 'year', 'approx': True}))
+    cases.append(('heatmap', {'period': 'all', 'artist_name': None}))
+    cases.append(('timeline', {'period': 'year', 'artist_name': None}))
+    cases.append(('sessions', {'period': 'year', 'limit': 10}))
+    cases.append(('streaks', {'limit': 5}))
+    cases.append(('dashboard', {'limit': 10}))
+    return cases
+
+def time_report(path, name, kwargs, engine='sql', repeat=REPEAT):
+    """Cold query on a fresh connection, then warm query and render timings"""
+    db = mpd_db.connect(path)
+    cursor = db.cursor()
+
+    started = time.perf_counter()
+    data = mpd_stats.run_report(cursor, name, kwargs, engine)
+    cold = time.perf_counter() - started
+
+    warm = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        data = mpd_stats.run_report(cursor, name, kwargs, engine)
+        warm.append(time.perf_counter() - started)
+    db.close()
+
+    render = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        mpd_stats.render_to_string(mpd_stats.render_report(name, data), RENDER_WIDTH)
+        render.append(time.perf_counter() - started)
+
+    return {
+        'function': FUNCTIONS[name],
+        'command': name,
+        'args': kwargs,
+        'engine': engine,
+        'cold_query_ms': _ms(cold),
+        'warm_query_ms': _ms(statistics.median(warm)),
+        'warm_query_min_ms': _ms(min(warm)),
+        'render_ms': _ms(statistics.median(render))
+    }
+
+def replay_scrobbles(path, count, seed=0):
+    """Feed distinct tracks through MPDTracker.log_track and flush like the idle loop"""
+    db = mpd_db.connect(path)
+    cursor = db.cursor()
+    cursor.execute('''
+        SELECT a.name, al.name, t.title
+        FROM tracks t
+        JOIN artists a ON a.id = t.artist_id
+        LEFT JOIN albums al ON al.artist_id = a.id
+        GROUP BY t.id
+    ''')
+    library = cursor.fetchall()
+    cursor.execute('SELECT COUNT(*) FROM plays')
+    before = cursor.fetchone()[0]
+    db.close()
+
+    # log_track stamps plays with the current second, so a repeated track
+    # inside one flush would be dropped as a duplicate
+    rng = random.Random(seed)
+    songs = rng.sample(library, min(count, len(library)))
+
+    spool_path = path + '.spool.jsonl'
+    if os.path.exists(spool_path):
+        os.remove(spool_path)
+    tracker = mpd_scrobbler.MPDTracker(path, spool_path)
+
+    log_times, flush_times = [], []
+    started = time.perf_counter()
+    for artist, album, title in songs:
+        song = {'artist': artist, 'album': album, 'title': title, 'duration': '200'}
+        t = time.perf_counter()
+        tracker.log_track(song)
+        log_times.append(time.perf_counter() - t)
+        if tracker.spool.due():
+            t = time.perf_counter()
+            tracker.flush_spool()
+            flush_times.append(time.perf_counter() - t)
+    t = time.perf_counter()
+    tracker.flush_spool()
+    flush_times.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+
+    cursor = tracker.db.cursor()
+    cursor.execute('SELECT COUNT(*) FROM plays')
+    committed = cursor.fetchone()[0] - before
+    tracker.db.close()
+    os.remove(spool_path)
+
+    def percentile(values, q):
+        return _ms(sorted(values)[min(len(values) - 1, int(len(values) * q))])
+
+    return {
+        'scrobbles': len(songs),
+        'committed': committed,
+        'per_second': round(len(songs) / elapsed, 1),
+        'log_track_p50_ms': percentile(log_times, 0.5),
+        'log_track_p95_ms': percentile(log_times, 0.95),
+        'flush_p50_ms': percentile(flush_times, 0.5),
+        'flush_p95_ms': percentile(flush_times, 0.95),
+        'flushes': len(flush_times)
+    }
+
+def numpy_available():
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def run(sizes, bench_dir=BENCH_DIR, seed=0, repeat=REPEAT, scrobbles=SCROBBLES, fresh=False):
+    os.makedirs(bench_dir, exist_ok=True)
+    results = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'seed': seed,
+        'repeat': repeat,
+        'datasets': []
+    }
+
+    for size in sizes:
+        rows = SIZES[size]
+        path = dataset_path(bench_dir, size, seed)
+        dataset = {'size': size, 'rows': rows, 'path': path}
+
+        if fresh or not os.path.exists(path):
+            console.print(f"[cyan]Generating {rows} plays[/cyan] in {path}")
+            started = time.perf_counter()
+            dataset['artists'] = generate_history(path, rows, seed)
+            dataset['generate_s'] = round(time.perf_counter() - started, 2)
+        dataset['db_bytes'] = os.path.getsize(path)
+
+        db = mpd_db.connect(path)
+        cases = report_cases(db.cursor())
+        engines = ['sql']
+        if numpy_available():
+            import mpd_analytics
+            mpd_analytics.SNAPSHOT_DIR = path + '.snapshot'
+            started = time.perf_counter()
+            mpd_analytics.export_snapshot(db, mpd_analytics.SNAPSHOT_DIR)
+            dataset['export_s'] = round(time.perf_counter() - started, 2)
+            engines.append('numpy')
+        db.close()
+
+        dataset['reports'] = []
+        for name, kwargs in cases:
+            for engine in engines:
+                if engine != 'sql' and name not in mpd_stats.COLUMNAR_REPORTS:
+                    continue
+                result = time_report(path, name, kwargs, engine, repeat)
+                dataset['reports'].append(result)
+                console.print(f"[dim]{size:>4}[/dim] {result['function']:<18} {engine:<5} "
+                              f"{json.dumps(kwargs):<48} cold {result['cold_query_ms']:>9.1f}ms  "
+                              f"warm {result['warm_query_ms']:>9.1f}ms  render {result['render_ms']:>6.1f}ms")
+
+        # Replaying adds plays, so keep the cached dataset pristine
+        replay_path = path + '.replay.db'
+        db = sqlite3.connect(path)
+        backup = sqlite3.connect(replay_path)
+        db.backup(backup)
+        backup.close()
+        db.close()
+        dataset['scrobbles'] = replay_scrobbles(replay_path, scrobbles, seed)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(replay_path + suffix):
+                os.remove(replay_path + suffix)
+        console.print(f"[dim]{size:>4}[/dim] log_track: {json.dumps(dataset['scrobbles'])}")
+
+        results['datasets'].append(dataset)
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark mpd_stats.py reports and scrobble logging")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help=f"Comma separated dataset sizes from {', '.join(SIZES)}")
+    parser.add_argument('--dir', default=BENCH_DIR, help='Where generated databases are kept')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='Warm runs per report')
+    parser.add_argument('--scrobbles', type=int, default=SCROBBLES,
+                        help='Scrobbles to replay through MPDTracker.log_track')
+    parser.add_argument('--fresh', action='store_true', help='Regenerate cached datasets')
+    parser.add_argument('--output', help='Write the JSON results here instead of stdout')
+    args = parser.parse_args()
+
+    sizes = [size.strip().lower() for size in args.sizes.split(',')]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+
+    results = run(sizes, args.dir, args.seed, args.repeat, args.scrobbles, args.fresh)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        console.print(f"[green]Results written to {args.output}[/green]")
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
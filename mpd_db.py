@@ -0,0 +1,852 @@
+import sqlite3
+import os
+import difflib
+import functools
+import time
+from datetime import date, datetime
+from mpd_sketch import HyperLogLog
+
+# Configuration
+DB_PATH = os.path.expanduser("~/.config/Seas/listening_history.db")
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "init_db.sql")
+MIGRATION_BATCH = 50000
+BUSY_TIMEOUT = 5
+SESSION_GAP = 30 * 60
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+OFFSET_SLOT = 15 * 60
+ARCHIVE_DIR = os.path.expanduser("~/.config/Seas/archive")
+# SQLite's default SQLITE_MAX_ATTACHED
+MAX_ATTACHED = 10
+
+PLAY_COLUMNS = 'id, timestamp, artist_id, album_id, track_id, duration, played, source_id, session_id'
+
+# Yearly cold partitions; names, tags and rollups stay in the hot database
+ARCHIVE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {schema}.plays (
+        id INTEGER PRIMARY KEY,
+        timestamp INTEGER,
+        artist_id INTEGER NOT NULL,
+        album_id INTEGER,
+        track_id INTEGER NOT NULL,
+        duration INTEGER,
+        played INTEGER DEFAULT 1,
+        source_id INTEGER,
+        session_id INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS {schema}.idx_plays_timestamp ON plays(timestamp);
+    CREATE INDEX IF NOT EXISTS {schema}.idx_plays_artist ON plays(artist_id, timestamp);
+    CREATE INDEX IF NOT EXISTS {schema}.idx_plays_track ON plays(track_id);
+'''
+
+def connect(path=DB_PATH):
+    """Open the history database and make sure the schema is current"""
+    db = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    # WAL lets mpd_stats.py readers run while the tracker commits
+    db.execute('PRAGMA journal_mode = WAL')
+    db.execute('PRAGMA synchronous = NORMAL')
+    init_schema(db)
+    return db
+
+def _read_schema():
+    with open(SCHEMA_PATH) as f:
+        return f.read()
+
+def _table_type(cursor, name):
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def _columns(cursor, table):
+    cursor.execute(f'PRAGMA table_info({table})')
+    return {row[1] for row in cursor.fetchall()}
+
+def _has_plays(cursor):
+    """Whether the hot table or any archive holds plays; archives are never empty"""
+    cursor.execute('SELECT EXISTS (SELECT 1 FROM plays) OR EXISTS (SELECT 1 FROM partitions)')
+    return cursor.fetchone()[0]
+
+def init_schema(db):
+    """Create missing tables, migrate old layouts and seed the rollups"""
+    cursor = db.cursor()
+
+    if _table_type(cursor, 'listening_history') == 'table':
+        detach_legacy_history(db)
+    else:
+        db.executescript(_read_schema())
+
+    if _table_type(cursor, 'listening_history_legacy') == 'table':
+        migrate_legacy_history(db)
+
+    if 'source_id' not in _columns(cursor, 'plays'):
+        add_play_sources(db)
+
+    if 'session_id' not in _columns(cursor, 'plays'):
+        db.execute('ALTER TABLE plays ADD COLUMN session_id INTEGER REFERENCES sessions(id)')
+        db.commit()
+
+    # Text sorts after every integer, so MAX() finds leftovers; artist_stats
+    # also covers plays that were archived before the conversion
+    cursor.execute('''
+        SELECT typeof((SELECT MAX(timestamp) FROM plays)) = 'text'
+            OR typeof((SELECT MAX(start) FROM sessions)) = 'text'
+            OR typeof((SELECT MAX(last_play) FROM artist_stats)) = 'text'
+    ''')
+    if cursor.fetchone()[0]:
+        convert_play_times(db)
+
+    init_search_index(db)
+
+    cursor.execute("SELECT 1 FROM stats_cache WHERE period = 'all' AND type = 'plays'")
+    if cursor.fetchone() is None:
+        rebuild_stats_cache(db)
+
+    cursor.execute("SELECT 1 FROM stats_sketches WHERE day = 'all'")
+    if cursor.fetchone() is None:
+        rebuild_sketches(db)
+
+    cursor.execute('SELECT EXISTS (SELECT 1 FROM play_days)')
+    if not cursor.fetchone()[0] and _has_plays(cursor):
+        rebuild_buckets(db)
+
+    cursor.execute('SELECT EXISTS (SELECT 1 FROM sessions)')
+    if not cursor.fetchone()[0] and _has_plays(cursor):
+        rebuild_sessions(db)
+
+    cursor.execute('SELECT EXISTS (SELECT 1 FROM artist_day_totals)')
+    if not cursor.fetchone()[0] and _has_plays(cursor):
+        rebuild_day_totals(db)
+
+def init_search_index(db):
+    """Create the trigram artist search index if this SQLite build supports it"""
+    cursor = db.cursor()
+    if _table_type(cursor, 'artist_search'):
+        return True
+
+    try:
+        db.executescript('''
+            BEGIN IMMEDIATE;
+            CREATE VIRTUAL TABLE artist_search USING fts5(
+                name, content='artists', content_rowid='id', tokenize='trigram'
+            );
+            CREATE TRIGGER artist_search_insert AFTER INSERT ON artists
+            BEGIN
+                INSERT INTO artist_search (rowid, name) VALUES (NEW.id, NEW.name);
+            END;
+            INSERT INTO artist_search (artist_search) VALUES ('rebuild');
+            COMMIT;
+        ''')
+    except sqlite3.OperationalError:
+        # No FTS5 or trigram tokenizer: searches fall back to scanning artists
+        if db.in_transaction:
+            db.rollback()
+        return False
+    return True
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+def search_artists(cursor, query):
+    """Find (id, name) of artists whose name contains query, best match first"""
+    if len(query) >= 3 and _table_type(cursor, 'artist_search'):
+        cursor.execute('''
+            SELECT rowid, name
+            FROM artist_search
+            WHERE artist_search MATCH ?
+            ORDER BY LOWER(name) = LOWER(?) DESC, LENGTH(name)
+        ''', (_fts_phrase(query), query))
+    else:
+        cursor.execute('''
+            SELECT id, name
+            FROM artists
+            WHERE LOWER(name) LIKE LOWER(?)
+            ORDER BY LOWER(name) = LOWER(?) DESC, LENGTH(name)
+        ''', (f'%{query}%', query))
+    return cursor.fetchall()
+
+def suggest_artists(cursor, query, limit=5):
+    """Rank artist names that share the most trigrams with a misspelled query"""
+    text = query.lower()
+    grams = {text[i:i + 3] for i in range(len(text) - 2)}
+
+    if grams and _table_type(cursor, 'artist_search'):
+        cursor.execute('''
+            SELECT name
+            FROM artist_search
+            WHERE artist_search MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        ''', (' OR '.join(_fts_phrase(gram) for gram in sorted(grams)), limit))
+        return [name for name, in cursor.fetchall()]
+
+    cursor.execute('SELECT name FROM artists')
+    names = {name.lower(): name for name, in cursor.fetchall()}
+    return [names[match] for match in difflib.get_close_matches(text, names, limit, 0.5)]
+
+def detach_legacy_history(db):
+    """Swap the flat listening_history table for the normalized schema
+
+    The old table is renamed aside and the plays sequence continues from its
+    last id, so writers can keep inserting through the listening_history view
+    while migrate_legacy_history copies the old rows across.
+    """
+    db.executescript(f'''
+        BEGIN IMMEDIATE;
+        ALTER TABLE listening_history RENAME TO listening_history_legacy;
+        DROP TABLE IF EXISTS artist_stats;
+        DROP TABLE IF EXISTS track_stats;
+        DELETE FROM stats_cache WHERE period = 'all';
+        {_read_schema()}
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'plays', COALESCE(MAX(id), 0) FROM listening_history_legacy;
+        COMMIT;
+    ''')
+
+def add_play_sources(db):
+    """Give plays a source_id column and rebuild the view that exposes it"""
+    db.executescript(f'''
+        BEGIN IMMEDIATE;
+        ALTER TABLE plays ADD COLUMN source_id INTEGER REFERENCES sources(id);
+        DROP VIEW IF EXISTS listening_history;
+        {_read_schema()}
+        COMMIT;
+    ''')
+
+def convert_play_times(db):
+    """Store play and first/last play times as Unix epochs instead of local text
+
+    Archives are converted first, one at a time, and the hot table last, so
+    an interrupted run is picked up again by init_schema. The listening_history
+    view is recreated to format the epochs back into text. Sessions are
+    cleared so init_schema splits them again, now across DST changes correctly.
+    """
+    cursor = db.cursor()
+    epoch = "CAST(strftime('%s', {0}, 'utc') AS INTEGER)".format
+    update = "UPDATE {0}.plays SET timestamp = {1} WHERE typeof(timestamp) = 'text'".format
+    for schema in each_schema(cursor):
+        if schema != 'main':
+            cursor.execute(update(schema, epoch('timestamp')))
+            db.commit()
+
+    db.executescript(f'''
+        BEGIN IMMEDIATE;
+        {update('main', epoch('timestamp'))};
+        DELETE FROM sessions;
+        UPDATE artist_stats
+        SET first_play = {epoch('first_play')}, last_play = {epoch('last_play')}
+        WHERE typeof(first_play) = 'text';
+        UPDATE track_stats
+        SET first_play = {epoch('first_play')}, last_play = {epoch('last_play')}
+        WHERE typeof(first_play) = 'text';
+        DROP VIEW IF EXISTS listening_history;
+        {_read_schema()}
+        COMMIT;
+    ''')
+
+def migrate_legacy_history(db, batch_size=MIGRATION_BATCH):
+    """Copy listening_history_legacy into plays in id order, resuming if interrupted"""
+    cursor = db.cursor()
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM listening_history_legacy')
+    legacy_max = cursor.fetchone()[0]
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM plays WHERE id <= ?', (legacy_max,))
+    last_id = cursor.fetchone()[0]
+
+    ids = {}
+    while True:
+        cursor.execute('''
+            SELECT id, timestamp, artist, album, title, duration, played
+            FROM listening_history_legacy
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+
+        plays = []
+        for play_id, timestamp, artist, album, title, duration, played in rows:
+            artist_id, album_id, track_id = resolve_ids(cursor, artist, album, title, ids)
+            plays.append((play_id, to_epoch(timestamp), artist_id, album_id, track_id, duration, played))
+
+        cursor.executemany('''
+            INSERT INTO plays (id, timestamp, artist_id, album_id, track_id, duration, played)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', plays)
+        db.commit()
+        last_id = rows[-1][0]
+
+    cursor.execute('DROP TABLE listening_history_legacy')
+    db.commit()
+
+    rebuild_stats_cache(db)
+    db.execute('VACUUM')
+
+def _lookup_id(cursor, table, keys, values):
+    where = ' AND '.join(f'{key} = ?' for key in keys)
+    cursor.execute(f'SELECT id FROM {table} WHERE {where}', values)
+    row = cursor.fetchone()
+    if row:
+        return row[0]
+
+    cursor.execute(f'''
+        INSERT INTO {table} ({', '.join(keys)})
+        VALUES ({', '.join('?' for _ in keys)})
+    ''', values)
+    return cursor.lastrowid
+
+def resolve_ids(cursor, artist, album, title, cache=None):
+    """Map tag strings to (artist_id, album_id, track_id), creating rows as needed"""
+    key = (artist, album, title)
+    if cache is not None and key in cache:
+        return cache[key]
+
+    artist_id = _lookup_id(cursor, 'artists', ('name',), (artist,))
+    album_id = _lookup_id(cursor, 'albums', ('artist_id', 'name'), (artist_id, album)) if album is not None else None
+    track_id = _lookup_id(cursor, 'tracks', ('artist_id', 'title'), (artist_id, title))
+
+    if cache is not None:
+        cache[key] = (artist_id, album_id, track_id)
+    return artist_id, album_id, track_id
+
+def to_epoch(text, fold=0):
+    """Unix epoch of a local 'YYYY-MM-DD[ HH:MM:SS]' time
+
+    In the hour DST repeats, fold=1 picks the second occurrence.
+    """
+    return int(datetime.fromisoformat(text).replace(fold=fold).timestamp())
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+@functools.lru_cache(maxsize=1 << 16)
+def _utc_offset(slot):
+    # Zones only change offset on quarter-hour boundaries
+    return time.localtime(slot * OFFSET_SLOT).tm_gmtoff
+
+@functools.lru_cache(maxsize=1 << 16)
+def _day_text(days):
+    return date.fromordinal(_EPOCH_ORDINAL + days).isoformat()
+
+def local_times(epochs):
+    """Local TIME_FORMAT text for a column of Unix epochs, keeping None as None
+
+    UTC offsets are looked up once per quarter hour and day strings once per
+    day, so a long column formats with integer arithmetic instead of strftime.
+    """
+    times = []
+    for epoch in epochs:
+        if epoch is None:
+            times.append(None)
+            continue
+        days, seconds = divmod(epoch + _utc_offset(epoch // OFFSET_SLOT), 86400)
+        times.append(f'{_day_text(days)} {seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}')
+    return times
+
+def local_time(epoch):
+    return local_times((epoch,))[0]
+
+def play_exists(cursor, timestamp, artist, title, source=None):
+    """Check whether a play with these tags was already logged at epoch timestamp by source"""
+    cursor.execute('''
+        SELECT 1
+        FROM plays p
+        JOIN tracks t ON t.id = p.track_id
+        JOIN artists a ON a.id = p.artist_id
+        LEFT JOIN sources s ON s.id = p.source_id
+        WHERE p.timestamp = ? AND a.name = ? AND t.title = ? AND s.name IS ?
+        LIMIT 1
+    ''', (timestamp, artist, title, source))
+    return cursor.fetchone() is not None
+
+def assign_session(cursor, timestamp, duration):
+    """Extend the latest session with a play at epoch timestamp, or open a new one after a long gap"""
+    cursor.execute('SELECT id, last_play, end FROM sessions ORDER BY id DESC LIMIT 1')
+    row = cursor.fetchone()
+    if row and timestamp < row[1]:
+        # Backfilled out of order; left for rebuild_sessions
+        return None
+
+    end = timestamp + (duration or 0)
+    if row:
+        if timestamp - row[2] <= SESSION_GAP:
+            cursor.execute('''
+                UPDATE sessions
+                SET last_play = ?, end = MAX(end, ?), plays = plays + 1, seconds = seconds + ?
+                WHERE id = ?
+            ''', (timestamp, end, duration or 0, row[0]))
+            return row[0]
+
+    cursor.execute('''
+        INSERT INTO sessions (start, last_play, end, plays, seconds)
+        VALUES (?, ?, ?, 1, ?)
+    ''', (timestamp, timestamp, end, duration or 0))
+    return cursor.lastrowid
+
+def record_play(cursor, timestamp, artist, album, title, duration, source=None):
+    """Insert one play logged at epoch timestamp and fold it into the rollups,
+    inside the caller's transaction"""
+    artist_id, album_id, track_id = resolve_ids(cursor, artist, album, title)
+    source_id = _lookup_id(cursor, 'sources', ('name',), (source,)) if source else None
+    session_id = assign_session(cursor, timestamp, duration)
+    cursor.execute('''
+        INSERT INTO plays (timestamp, artist_id, album_id, track_id, duration, source_id, session_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (timestamp, artist_id, album_id, track_id, duration, source_id, session_id))
+    play_id = cursor.lastrowid
+
+    update_stats_cache(cursor, artist_id, track_id, timestamp)
+    return play_id
+
+def _bump_counter(cursor, table, keys, values, timestamp):
+    """Count one play against a rollup row, returning True if the row is new"""
+    columns = ', '.join(keys)
+    where = ' AND '.join(f'{key} = ?' for key in keys)
+
+    cursor.execute(f'''
+        INSERT OR IGNORE INTO {table} ({columns}, plays, first_play, last_play)
+        VALUES ({', '.join('?' for _ in keys)}, 0, ?, ?)
+    ''', (*values, timestamp, timestamp))
+    created = cursor.rowcount == 1
+
+    cursor.execute(f'''
+        UPDATE {table}
+        SET plays = plays + 1,
+            first_play = MIN(first_play, ?),
+            last_play = MAX(last_play, ?)
+        WHERE {where}
+    ''', (timestamp, timestamp, *values))
+    return created
+
+def _bump_cache(cursor, cache_type, delta, updated):
+    cursor.execute('''
+        INSERT INTO stats_cache (period, type, data, updated)
+        VALUES ('all', ?, ?, ?)
+        ON CONFLICT (period, type) DO UPDATE
+        SET data = CAST(data AS INTEGER) + excluded.data,
+            updated = excluded.updated
+    ''', (cache_type, delta, updated))
+
+def _bump_sketch(cursor, day, kind, value):
+    cursor.execute('SELECT registers FROM stats_sketches WHERE day = ? AND kind = ?', (day, kind))
+    row = cursor.fetchone()
+    sketch = HyperLogLog(row[0] if row else None)
+
+    # Most plays leave the registers untouched once a sketch has warmed up
+    if sketch.add(value) or row is None:
+        cursor.execute('''
+            INSERT OR REPLACE INTO stats_sketches (day, kind, registers)
+            VALUES (?, ?, ?)
+        ''', (day, kind, sketch.to_bytes()))
+
+def _bump_bucket(cursor, table, keys, values):
+    columns = ', '.join(keys)
+    cursor.execute(f'''
+        INSERT INTO {table} ({columns}, plays)
+        VALUES ({', '.join('?' for _ in keys)}, 1)
+        ON CONFLICT ({columns}) DO UPDATE SET plays = plays + 1
+    ''', values)
+
+def _bump_total(cursor, table, key, key_id, day):
+    # Open the day at the running total so far, then count the play on it and
+    # every later day (only the last row, unless the play is backfilled)
+    cursor.execute(f'''
+        INSERT INTO {table} ({key}, day, total)
+        SELECT ?, ?, COALESCE((
+            SELECT total FROM {table} WHERE {key} = ? AND day < ? ORDER BY day DESC LIMIT 1
+        ), 0)
+        WHERE true
+        ON CONFLICT ({key}, day) DO NOTHING
+    ''', (key_id, day, key_id, day))
+    cursor.execute(f'UPDATE {table} SET total = total + 1 WHERE {key} = ? AND day >= ?', (key_id, day))
+
+def update_stats_cache(cursor, artist_id, track_id, timestamp):
+    """Fold a single play at epoch timestamp into the rollups, inside the caller's transaction"""
+    new_artist = _bump_counter(cursor, 'artist_stats', ('artist_id',), (artist_id,), timestamp)
+    new_track = _bump_counter(cursor, 'track_stats', ('track_id',), (track_id,), timestamp)
+
+    local = local_time(timestamp)
+    _bump_cache(cursor, 'plays', 1, local)
+    _bump_cache(cursor, 'artists', int(new_artist), local)
+    _bump_cache(cursor, 'tracks', int(new_track), local)
+
+    for day in ('all', local[:10]):
+        _bump_sketch(cursor, day, 'artists', artist_id)
+        _bump_sketch(cursor, day, 'tracks', track_id)
+
+    day, hour = local[:10], int(local[11:13])
+    _bump_bucket(cursor, 'play_days', ('day',), (day,))
+    _bump_bucket(cursor, 'play_hours', ('day', 'hour'), (day, hour))
+    _bump_bucket(cursor, 'artist_days', ('artist_id', 'day'), (artist_id, day))
+    _bump_bucket(cursor, 'artist_hours', ('artist_id', 'day', 'hour'), (artist_id, day, hour))
+    _bump_total(cursor, 'artist_day_totals', 'artist_id', artist_id, day)
+    _bump_total(cursor, 'track_day_totals', 'track_id', track_id, day)
+
+def load_sketch(cursor, kind, since=None):
+    """Merge the sketches for days on or after since, or the all-time sketch"""
+    if since is None:
+        cursor.execute("SELECT registers FROM stats_sketches WHERE day = 'all' AND kind = ?", (kind,))
+    else:
+        cursor.execute('''
+            SELECT registers
+            FROM stats_sketches
+            WHERE day != 'all' AND day >= ? AND kind = ?
+        ''', (since, kind))
+
+    sketch = HyperLogLog()
+    for registers, in cursor:
+        sketch.merge(HyperLogLog(registers))
+    return sketch
+
+def rebuild_sketches(db):
+    """Recompute the per-day and all-time HyperLogLog sketches in one pass over plays"""
+    sketches = {'all': (HyperLogLog(), HyperLogLog())}
+    cursor = db.cursor()
+    for schema in each_schema(cursor):
+        cursor.execute(f'''
+            SELECT date(timestamp, 'unixepoch', 'localtime'), artist_id, track_id FROM {schema}.plays
+        ''')
+        for day, artist_id, track_id in cursor:
+            for bucket in ('all', day):
+                if bucket not in sketches:
+                    sketches[bucket] = (HyperLogLog(), HyperLogLog())
+                sketches[bucket][0].add(artist_id)
+                sketches[bucket][1].add(track_id)
+
+    cursor.execute('DELETE FROM stats_sketches')
+    cursor.executemany('''
+        INSERT INTO stats_sketches (day, kind, registers)
+        VALUES (?, ?, ?)
+    ''', [
+        (day, kind, sketch.to_bytes())
+        for day, pair in sketches.items()
+        for kind, sketch in zip(('artists', 'tracks'), pair)
+    ])
+    db.commit()
+
+def rebuild_buckets(db):
+    """Recompute the per-day and per-hour histograms from every partition of plays"""
+    cursor = db.cursor()
+    collect_plays(db, 'hour_plays', '''
+        SELECT artist_id, date(timestamp, 'unixepoch', 'localtime') AS day,
+               CAST(strftime('%H', timestamp, 'unixepoch', 'localtime') AS INTEGER) AS hour,
+               COUNT(*) AS plays
+        FROM {plays}
+        GROUP BY 1, 2, 3
+    ''')
+
+    cursor.execute('DELETE FROM artist_hours')
+    cursor.execute('''
+        INSERT INTO artist_hours (artist_id, day, hour, plays)
+        SELECT artist_id, day, hour, SUM(plays) FROM temp.hour_plays GROUP BY 1, 2, 3
+    ''')
+    cursor.execute('DROP TABLE temp.hour_plays')
+
+    # The coarser buckets are sums of the finest one
+    cursor.execute('DELETE FROM artist_days')
+    cursor.execute('''
+        INSERT INTO artist_days (artist_id, day, plays)
+        SELECT artist_id, day, SUM(plays) FROM artist_hours GROUP BY artist_id, day
+    ''')
+
+    cursor.execute('DELETE FROM play_hours')
+    cursor.execute('''
+        INSERT INTO play_hours (day, hour, plays)
+        SELECT day, hour, SUM(plays) FROM artist_hours GROUP BY day, hour
+    ''')
+
+    cursor.execute('DELETE FROM play_days')
+    cursor.execute('''
+        INSERT INTO play_days (day, plays)
+        SELECT day, SUM(plays) FROM play_hours GROUP BY day
+    ''')
+    db.commit()
+
+def _attached(cursor):
+    cursor.execute('PRAGMA database_list')
+    return {row[1] for row in cursor.fetchall()}
+
+def _archives(cursor):
+    return [name for name in _attached(cursor) if name not in ('main', 'temp')]
+
+def _detach(cursor, name):
+    """Detach an archive unless the open transaction has read it
+
+    A pinned archive stays attached until release_partitions runs after the
+    transaction ends, so a read snapshot keeps every archive it touched.
+    """
+    try:
+        cursor.execute(f'DETACH DATABASE {name}')
+    except sqlite3.OperationalError as e:
+        if 'locked' not in str(e):
+            raise
+        return False
+    return True
+
+def release_partitions(cursor, keep=()):
+    """Detach every attached archive not in `keep` that no open transaction pins"""
+    for name in _archives(cursor):
+        if name not in keep:
+            _detach(cursor, name)
+
+def _attach(cursor, name, path):
+    """Attach an archive, first dropping unused ones once SQLite's limit is reached"""
+    if len(_archives(cursor)) >= MAX_ATTACHED:
+        release_partitions(cursor)
+    cursor.execute(f'ATTACH DATABASE ? AS {name}', (path,))
+
+def _partitions(cursor, since=None, until=None, newest_first=False):
+    cursor.execute(f'''
+        SELECT name, path FROM partitions
+        WHERE last_day >= ? AND first_day <= ?
+        ORDER BY first_day {'DESC' if newest_first else ''}
+    ''', (since or '', until or '9999-12-31'))
+    return cursor.fetchall()
+
+def attach_partitions(cursor, since=None, until=None):
+    """Attach the archives holding plays between the days `since` and `until`, oldest first
+
+    Returns their schema names; with neither bound every archive is attached.
+    Archives attached for an earlier range are detached first where possible.
+    """
+    partitions = _partitions(cursor, since, until)
+    names = [name for name, _ in partitions]
+    release_partitions(cursor, keep=names)
+    attached = _attached(cursor)
+    for name, path in partitions:
+        if name not in attached:
+            _attach(cursor, name, path)
+    return names
+
+def each_schema(cursor, newest_first=False, since=None, until=None):
+    """Yield 'main', then each archive overlapping the days `since` to `until`,
+    attaching each only while it is in use
+
+    SQLite attaches at most MAX_ATTACHED databases, so passes over the whole
+    history go through here rather than plays_sql. An archive the caller's
+    open transaction has read stays attached until release_partitions.
+    """
+    yield 'main'
+    for name, path in _partitions(cursor, since, until, newest_first):
+        attached = name in _attached(cursor)
+        if not attached:
+            _attach(cursor, name, path)
+        try:
+            yield name
+        finally:
+            if not attached:
+                _detach(cursor, name)
+
+def collect_plays(db, table, select):
+    """Run `select` against each partition's plays in turn, into temp.{table}
+
+    `select` reads from {plays}; rows are committed after every partition so
+    its archive can be detached before the next one is attached.
+    """
+    cursor = db.cursor()
+    cursor.execute(f'DROP TABLE IF EXISTS temp.{table}')
+    for schema in each_schema(cursor):
+        sql = select.format(plays=f'{schema}.plays')
+        if schema == 'main':
+            cursor.execute(f'CREATE TEMP TABLE {table} AS {sql}')
+        else:
+            cursor.execute(f'INSERT INTO temp.{table} {sql}')
+        db.commit()
+
+def plays_sql(cursor, since=None, until=None):
+    """Table expression for plays between the days `since` and `until` across the hot table and archives
+
+    Archives outside the range are left out, so short periods only ever read
+    the hot table. WHERE clauses on the result are pushed down into each arm
+    of the union and use that partition's indexes. Whole-history and long
+    range passes use each_schema instead, which stays under SQLite's attach
+    limit.
+    """
+    schemas = attach_partitions(cursor, since, until)
+    if not schemas:
+        return 'plays'
+    arms = [f'SELECT {PLAY_COLUMNS} FROM {schema}.plays' for schema in ['main', *schemas]]
+    return '(' + ' UNION ALL '.join(arms) + ')'
+
+def archive_plays(db, before, archive_dir=None):
+    """Move plays logged before the year `before` into one archive database per year
+
+    Rows are copied and committed to the archive before they are deleted from
+    the hot table, so an interrupted run only leaves duplicates that the next
+    run resolves. Returns {year: plays moved}.
+    """
+    archive_dir = archive_dir or ARCHIVE_DIR
+    cursor = db.cursor()
+    cursor.execute('''
+        SELECT DISTINCT strftime('%Y', timestamp, 'unixepoch', 'localtime')
+        FROM plays
+        WHERE timestamp < ?
+        ORDER BY 1
+    ''', (to_epoch(f'{before}-01-01'),))
+    years = [row[0] for row in cursor.fetchall()]
+    if years:
+        os.makedirs(archive_dir, exist_ok=True)
+
+    moved = {}
+    for year in years:
+        name = f'p{year}'
+        path = os.path.join(archive_dir, f'plays-{year}.db')
+        bounds = (to_epoch(f'{year}-01-01'), to_epoch(f'{int(year) + 1}-01-01'))
+        if name not in _attached(cursor):
+            cursor.execute(f'ATTACH DATABASE ? AS {name}', (path,))
+        db.executescript(ARCHIVE_SCHEMA.format(schema=name))
+
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO {name}.plays ({PLAY_COLUMNS})
+            SELECT {PLAY_COLUMNS} FROM main.plays WHERE timestamp >= ? AND timestamp < ?
+        ''', bounds)
+        db.commit()
+
+        cursor.execute('DELETE FROM main.plays WHERE timestamp >= ? AND timestamp < ?', bounds)
+        moved[year] = cursor.rowcount
+        cursor.execute(f'''
+            INSERT INTO partitions (name, path, first_day, last_day, plays)
+            SELECT ?, ?, date(MIN(timestamp), 'unixepoch', 'localtime'),
+                   date(MAX(timestamp), 'unixepoch', 'localtime'), COUNT(*)
+            FROM {name}.plays
+            WHERE true
+            ON CONFLICT (name) DO UPDATE SET
+                path = excluded.path,
+                first_day = excluded.first_day,
+                last_day = excluded.last_day,
+                plays = excluded.plays
+        ''', (name, path))
+        db.commit()
+
+        # Archives are written once, so compact them right away
+        cursor.execute(f'VACUUM {name}')
+        cursor.execute(f'DETACH DATABASE {name}')
+
+    if moved:
+        cursor.execute('VACUUM')
+    return moved
+
+def rebuild_day_totals(db):
+    """Recompute the per-artist and per-track running play totals by day"""
+    cursor = db.cursor()
+
+    cursor.execute('DELETE FROM artist_day_totals')
+    cursor.execute('''
+        INSERT INTO artist_day_totals (artist_id, day, total)
+        SELECT artist_id, day, SUM(plays) OVER (PARTITION BY artist_id ORDER BY day)
+        FROM artist_days
+    ''')
+
+    collect_plays(db, 'track_days', '''
+        SELECT track_id, date(timestamp, 'unixepoch', 'localtime') AS day, COUNT(*) AS plays
+        FROM {plays}
+        GROUP BY 1, 2
+    ''')
+
+    cursor.execute('DELETE FROM track_day_totals')
+    cursor.execute('''
+        INSERT INTO track_day_totals (track_id, day, total)
+        SELECT track_id, day, SUM(SUM(plays)) OVER (PARTITION BY track_id ORDER BY day)
+        FROM temp.track_days
+        GROUP BY track_id, day
+    ''')
+    cursor.execute('DROP TABLE temp.track_days')
+    db.commit()
+
+def range_count_sql(table, key, item=':item', since=':since', until=':until'):
+    """SQL for the plays of one {key} between two days (inclusive), as the
+    difference of two running-total lookups"""
+    return f'''(
+        COALESCE((SELECT total FROM {table} WHERE {key} = {item} AND day <= {until}
+                  ORDER BY day DESC LIMIT 1), 0)
+        - COALESCE((SELECT total FROM {table} WHERE {key} = {item} AND day < {since}
+                    ORDER BY day DESC LIMIT 1), 0)
+    )'''
+
+def rebuild_sessions(db):
+    """Split the whole history into sessions and point every play at its session
+
+    A play opens a new session when it starts more than SESSION_GAP seconds
+    after every earlier play has ended, the same rule assign_session applies.
+    """
+    cursor = db.cursor()
+    collect_plays(db, 'play_ends', '''
+        SELECT id, timestamp, COALESCE(duration, 0) AS duration,
+               timestamp + COALESCE(duration, 0) AS end
+        FROM {plays}
+    ''')
+    cursor.execute('DROP TABLE IF EXISTS temp.play_sessions')
+    cursor.execute(f'''
+        CREATE TEMP TABLE play_sessions AS
+        WITH gaps AS (
+            SELECT *, MAX(end) OVER (ORDER BY timestamp, id
+                                     ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING) AS prev_end
+            FROM temp.play_ends
+        )
+        SELECT id, timestamp, duration, end,
+               SUM(prev_end IS NULL OR timestamp - prev_end > {SESSION_GAP})
+                   OVER (ORDER BY timestamp, id) AS session_id
+        FROM gaps
+    ''')
+
+    cursor.execute('DELETE FROM sessions')
+    cursor.execute('''
+        INSERT INTO sessions (id, start, last_play, end, plays, seconds)
+        SELECT session_id, MIN(timestamp), MAX(timestamp), MAX(end), COUNT(*), SUM(duration)
+        FROM play_sessions
+        GROUP BY session_id
+    ''')
+    db.commit()
+    for schema in each_schema(cursor):
+        cursor.execute(f'''
+            UPDATE {schema}.plays SET session_id = s.session_id
+            FROM play_sessions s
+            WHERE s.id = plays.id
+        ''')
+        db.commit()
+    cursor.execute('DROP TABLE temp.play_ends')
+    cursor.execute('DROP TABLE temp.play_sessions')
+    db.commit()
+
+def rebuild_stats_cache(db):
+    """Recompute every rollup from the plays table and its archives"""
+    updated = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor = db.cursor()
+    # Per-track counts from each partition in turn; a track has one artist
+    collect_plays(db, 'track_plays', '''
+        SELECT track_id, artist_id, COUNT(*) AS plays,
+               MIN(timestamp) AS first_play, MAX(timestamp) AS last_play
+        FROM {plays}
+        GROUP BY track_id
+    ''')
+
+    cursor.execute('DELETE FROM artist_stats')
+    cursor.execute('''
+        INSERT INTO artist_stats (artist_id, plays, first_play, last_play)
+        SELECT artist_id, SUM(plays), MIN(first_play), MAX(last_play)
+        FROM temp.track_plays
+        GROUP BY artist_id
+    ''')
+
+    cursor.execute('DELETE FROM track_stats')
+    cursor.execute('''
+        INSERT INTO track_stats (track_id, plays, first_play, last_play)
+        SELECT track_id, SUM(plays), MIN(first_play), MAX(last_play)
+        FROM temp.track_plays
+        GROUP BY track_id
+    ''')
+    cursor.execute('DROP TABLE temp.track_plays')
+
+    cursor.execute("DELETE FROM stats_cache WHERE period = 'all'")
+    cursor.execute('''
+        INSERT INTO stats_cache (period, type, data, updated)
+        SELECT 'all', 'plays', COALESCE(SUM(plays), 0), ? FROM artist_stats
+        UNION ALL
+        SELECT 'all', 'artists', COUNT(*), ? FROM artist_stats
+        UNION ALL
+        SELECT 'all', 'tracks', COUNT(*), ? FROM track_stats
+    ''', (updated, updated, updated))
+
+    db.commit()
+    rebuild_sketches(db)
+    rebuild_buckets(db)
+    rebuild_day_totals(db)
+    rebuild_sessions(db)
@@ -0,0 +1,259 @@
+import bisect
+import glob
+import gzip
+import os
+import re
+import time
+import mpd_db
+import mpd_library
+
+# Configuration
+MPD_LOG_GLOB = os.path.expanduser("~/.config/mpd/mpd.log*")
+MPD_HOST = "localhost"
+MPD_PORT = 6600
+MIN_PERCENTAGE = 50
+MIN_DURATION = 30
+IMPORT_BATCH = 50000
+DEDUP_WINDOW = 120
+
+EVENT_RE = re.compile(r'^(\d{4}-\d{2}-\d{2})T(\d{2}:\d{2}:\d{2}) (\w+): (.*)$')
+PLAYED_RE = re.compile(r'^played "(.*)"$')
+FAILED_RE = re.compile(r'^Failed to decode "(.*?)"')
+FILENAME_RE = re.compile(r'^(?:\d+[.\s-]+)?(.+?) - (.+)$')
+
+def rotation_order(path):
+    """Sort key putting mpd.log.N(.gz) oldest first and the live log last"""
+    match = re.search(r'\.(\d+)(?:\.gz)?$', path)
+    return -int(match.group(1)) if match else 0
+
+def default_log_files():
+    return sorted(glob.glob(MPD_LOG_GLOB), key=rotation_order)
+
+def read_lines(paths):
+    """Stream lines from plain or gzipped log files without loading them"""
+    for path in paths:
+        with open(path, 'rb') as raw:
+            gzipped = raw.read(2) == b'\x1f\x8b'
+        opener = gzip.open if gzipped else open
+        with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+            yield from f
+
+def parse_events(lines):
+    """Yield (timestamp, uri) for every successful `player: played` line"""
+    failed = None
+    for line in lines:
+        match = EVENT_RE.match(line)
+        if not match:
+            continue
+        day, clock, domain, message = match.groups()
+        timestamp = f"{day} {clock}"
+
+        if domain == 'exception':
+            failure = FAILED_RE.match(message)
+            if failure:
+                failed = (timestamp, failure.group(1))
+            continue
+
+        if domain != 'player':
+            continue
+        played = PLAYED_RE.match(message)
+        if not played:
+            continue
+
+        uri = played.group(1)
+        # MPD logs a "played" right after failing to open a file
+        if failed and failed[0] == timestamp and failed[1].endswith(uri):
+            failed = None
+            continue
+        yield timestamp, uri
+
+def tags_from_path(uri):
+    """Best-effort tags from a 'Artist/Album/NN. Artist - Title.ext' style path"""
+    parts = uri.split('/')
+    stem = os.path.splitext(parts[-1])[0]
+    match = FILENAME_RE.match(stem)
+    artist, title = match.groups() if match else ('Unknown Artist', stem)
+    album = parts[-2] if len(parts) > 1 else 'Unknown Album'
+    return {'artist': artist, 'album': album, 'title': title, 'duration': 0}
+
+class MPDTagResolver:
+    """Resolve file paths to tags via the library index, then MPD, then the path"""
+
+    def __init__(self):
+        self.cache = {}
+        self.library = mpd_library.load()
+        self.client = None
+        try:
+            from mpd import MPDClient
+            self.client = MPDClient()
+            self.client.connect(MPD_HOST, MPD_PORT)
+        except Exception:
+            self.client = None
+
+    def __call__(self, uri):
+        if uri not in self.cache:
+            self.cache[uri] = self.lookup(uri)
+        return self.cache[uri]
+
+    def lookup(self, uri):
+        song = self.library.get(uri)
+        if song is not None:
+            return {
+                'artist': song['artist'],
+                'album': song['album'],
+                'title': song['title'],
+                'duration': int(song['duration'])
+            }
+
+        tags = tags_from_path(uri)
+        if self.client is None:
+            return tags
+        try:
+            found = self.client.find('file', uri)
+        except Exception:
+            return tags
+        if found:
+            song = found[0]
+            tags['artist'] = song.get('artist', tags['artist'])
+            tags['album'] = song.get('album', tags['album'])
+            tags['title'] = song.get('title', tags['title'])
+            tags['duration'] = int(float(song.get('duration', song.get('time', 0))))
+        return tags
+
+    def close(self):
+        if self.client is not None:
+            self.client.disconnect()
+
+def meets_criteria(duration, elapsed):
+    if elapsed is None:
+        return True
+    if duration <= 0:
+        return elapsed >= MIN_DURATION
+    if duration < MIN_DURATION and elapsed >= MIN_DURATION:
+        return True
+    return (elapsed / duration) * 100 >= MIN_PERCENTAGE
+
+def log_epoch(timestamp, prev):
+    """Epoch of a local log time, read as the repeated hour's second pass
+    once the log has already moved past its first"""
+    epoch = mpd_db.to_epoch(timestamp)
+    if prev is not None and epoch < prev:
+        later = mpd_db.to_epoch(timestamp, fold=1)
+        if later >= prev:
+            return later
+    return epoch
+
+def reconstruct_plays(events, resolve, since=None):
+    """Turn played events into plays stamped with epochs, skipping ones cut short
+    and ones at or before the epoch `since`
+
+    A "played" line is written when a song ends, so the time since the
+    previous one approximates how long the song actually played.
+    """
+    prev = None
+    for timestamp, uri in events:
+        now = log_epoch(timestamp, prev)
+        elapsed = now - prev if prev is not None else None
+        prev = now
+
+        if since is not None and now <= since:
+            continue
+
+        tags = resolve(uri)
+        if meets_criteria(tags['duration'], elapsed):
+            yield {'timestamp': now, **tags}
+
+def batched(plays, size):
+    batch = []
+    for play in plays:
+        batch.append(play)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _existing_plays(cursor, first, last):
+    """Map (artist, title) to sorted epochs of plays already logged between two epochs"""
+    start = first - DEDUP_WINDOW
+    end = last + DEDUP_WINDOW
+    existing = {}
+    # A batch of old logs can span more yearly archives than SQLite attaches at once
+    for schema in mpd_db.each_schema(cursor, since=mpd_db.local_time(start)[:10],
+                                     until=mpd_db.local_time(end)[:10]):
+        cursor.execute(f'''
+            SELECT p.timestamp, a.name, t.title
+            FROM {schema}.plays p
+            JOIN artists a ON a.id = p.artist_id
+            JOIN tracks t ON t.id = p.track_id
+            WHERE p.timestamp BETWEEN ? AND ?
+        ''', (start, end))
+        for timestamp, artist, title in cursor.fetchall():
+            existing.setdefault((artist, title), []).append(timestamp)
+    for epochs in existing.values():
+        epochs.sort()
+    return existing
+
+def _is_duplicate(existing, play):
+    epochs = existing.get((play['artist'], play['title']))
+    if not epochs:
+        return False
+    at = play['timestamp']
+    i = bisect.bisect_left(epochs, at - DEDUP_WINDOW)
+    return i < len(epochs) and epochs[i] <= at + DEDUP_WINDOW
+
+def import_logs(db, paths, source='mpd', progress=None, batch_size=IMPORT_BATCH):
+    """Backfill plays from MPD logs, resuming after the last checkpoint
+
+    Returns (lines read, plays imported, duplicates skipped).
+    """
+    cursor = db.cursor()
+    cursor.execute('SELECT last_timestamp FROM import_state WHERE source = ?', (source,))
+    row = cursor.fetchone()
+    since = row[0] if row else None
+    if isinstance(since, str):
+        # Checkpointed as local time by an older version
+        since = mpd_db.to_epoch(since)
+
+    stats = {'lines': 0, 'imported': 0, 'skipped': 0}
+    started = time.time()
+
+    def counted(lines):
+        for line in lines:
+            stats['lines'] += 1
+            yield line
+
+    resolver = MPDTagResolver()
+    ids = {}
+    try:
+        plays = reconstruct_plays(parse_events(counted(read_lines(paths))), resolver, since)
+        for batch in batched(plays, batch_size):
+            existing = _existing_plays(cursor, batch[0]['timestamp'], batch[-1]['timestamp'])
+            rows = []
+            for play in batch:
+                if _is_duplicate(existing, play):
+                    stats['skipped'] += 1
+                    continue
+                artist_id, album_id, track_id = mpd_db.resolve_ids(
+                    cursor, play['artist'], play['album'], play['title'], ids)
+                rows.append((play['timestamp'], artist_id, album_id, track_id, play['duration']))
+
+            cursor.executemany('''
+                INSERT INTO plays (timestamp, artist_id, album_id, track_id, duration)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            cursor.execute('''
+                INSERT OR REPLACE INTO import_state (source, last_timestamp, updated)
+                VALUES (?, ?, datetime('now', 'localtime'))
+            ''', (source, batch[-1]['timestamp']))
+            db.commit()
+
+            stats['imported'] += len(rows)
+            if progress:
+                progress(stats['lines'], stats['imported'], time.time() - started)
+    finally:
+        resolver.close()
+
+    if stats['imported']:
+        mpd_db.rebuild_stats_cache(db)
+    return stats['lines'], stats['imported'], stats['skipped']
@@ -0,0 +1,203 @@
+import gzip
+import os
+import pickle
+from array import array
+
+# Configuration
+DATABASE_PATH = os.path.expanduser("~/.config/mpd/database")
+CACHE_PATH = os.path.expanduser("~/.config/Seas/library_index.pickle")
+CACHE_VERSION = 1
+MPD_HOST = "localhost"
+MPD_PORT = 6600
+
+# Positions of the tags we keep in the per-song list built by parse_songs
+SONG_FIELDS = {'Artist': 1, 'Album': 2, 'Title': 3}
+
+def read_database(path=DATABASE_PATH):
+    """Stream lines from MPD's db_file, gzipped or not"""
+    with open(path, 'rb') as raw:
+        gzipped = raw.read(2) == b'\x1f\x8b'
+    opener = gzip.open if gzipped else open
+    with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            yield line.rstrip('\n')
+
+def parse_songs(lines):
+    """Yield (uri, artist, album, title, duration) for every song in the database"""
+    directory = ''
+    song = None
+    in_playlist = False
+
+    for line in lines:
+        key, _, value = line.partition(': ')
+
+        if song is not None:
+            if line == 'song_end':
+                yield directory + song[0], song[1], song[2], song[3], song[4]
+                song = None
+            elif key == 'Time':
+                song[4] = float(value)
+            elif key in SONG_FIELDS and not song[SONG_FIELDS[key]]:
+                song[SONG_FIELDS[key]] = value
+        elif in_playlist:
+            in_playlist = line != 'playlist_end'
+        elif key == 'song_begin':
+            song = [value, '', '', '', 0.0]
+        elif key == 'begin':
+            directory = value + '/'
+        elif key == 'end':
+            directory = os.path.dirname(value)
+            directory = directory + '/' if directory else ''
+        elif key == 'playlist_begin':
+            in_playlist = True
+
+class LibraryIndex:
+    """Compact file -> tags index; strings are interned and columns are arrays"""
+
+    __slots__ = ('paths', 'strings', 'artists', 'albums', 'titles', 'durations', '_interned')
+
+    def __init__(self):
+        self.paths = {}
+        self.strings = []
+        self.artists = array('I')
+        self.albums = array('I')
+        self.titles = array('I')
+        self.durations = array('d')
+        self._interned = {}
+
+    def _intern(self, value):
+        index = self._interned.get(value)
+        if index is None:
+            index = self._interned[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+    def add(self, uri, artist, album, title, duration):
+        self.paths[uri] = len(self.durations)
+        self.artists.append(self._intern(artist))
+        self.albums.append(self._intern(album))
+        self.titles.append(self._intern(title))
+        self.durations.append(duration)
+
+    def __len__(self):
+        return len(self.durations)
+
+    def __contains__(self, uri):
+        return uri in self.paths
+
+    def get(self, uri):
+        """Tags for a file path in the shape of MPD's song dicts, or None"""
+        i = self.paths.get(uri)
+        if i is None:
+            return None
+        return self._song(uri, i)
+
+    def _tags(self, uri, i):
+        strings = self.strings
+        return (strings[self.artists[i]] or 'Unknown Artist',
+                strings[self.albums[i]] or 'Unknown Album',
+                strings[self.titles[i]] or os.path.splitext(os.path.basename(uri))[0])
+
+    def _song(self, uri, i):
+        artist, album, title = self._tags(uri, i)
+        return {'file': uri, 'artist': artist, 'album': album, 'title': title, 'duration': self.durations[i]}
+
+    def songs(self):
+        for uri, i in self.paths.items():
+            yield self._song(uri, i)
+
+    def tags(self):
+        """(artist, album, title) of every song, as get() reports them, without building dicts"""
+        for uri, i in self.paths.items():
+            yield self._tags(uri, i)
+
+    @classmethod
+    def from_database(cls, path=DATABASE_PATH):
+        index = cls()
+        for song in parse_songs(read_database(path)):
+            index.add(*song)
+        return index
+
+    @classmethod
+    def from_mpd(cls, host=MPD_HOST, port=MPD_PORT):
+        """Build the index from `listallinfo`, for when MPD's db_file is not readable here"""
+        from mpd import MPDClient
+        client = MPDClient()
+        client.connect(host, port)
+        try:
+            songs = client.listallinfo()
+        finally:
+            client.disconnect()
+
+        def first(value):
+            return (value[0] if isinstance(value, list) else value or '').split('\n')[0]
+
+        index = cls()
+        for song in songs:
+            if 'file' in song:
+                index.add(song['file'], first(song.get('artist')), first(song.get('album')),
+                          first(song.get('title')), float(song.get('duration', song.get('time', 0))))
+        return index
+
+    def __getstate__(self):
+        return (list(self.paths), self.strings, self.artists, self.albums, self.titles, self.durations)
+
+    def __setstate__(self, state):
+        uris, self.strings, self.artists, self.albums, self.titles, self.durations = state
+        self.paths = {uri: i for i, uri in enumerate(uris)}
+        self._interned = {}
+
+def _stamp(path):
+    stat = os.stat(path)
+    return (CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+
+def load(path=DATABASE_PATH, cache_path=CACHE_PATH):
+    """Load the library index, reparsing the database only when it changed
+
+    Returns an empty index if MPD's database does not exist.
+    """
+    try:
+        stamp = _stamp(path)
+    except OSError:
+        return LibraryIndex()
+
+    try:
+        with open(cache_path, 'rb') as f:
+            cached_stamp, index = pickle.load(f)
+        if cached_stamp == stamp:
+            return index
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        pass
+
+    index = LibraryIndex.from_database(path)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump((stamp, index), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    return index
+
+class Library:
+    """Library index that reloads itself when MPD rewrites its database"""
+
+    def __init__(self, path=DATABASE_PATH, cache_path=CACHE_PATH):
+        self.path = path
+        self.cache_path = cache_path
+        self.stamp = None
+        self.index = LibraryIndex()
+        self.refresh()
+
+    def refresh(self):
+        """Reload the index if the database changed, returning True if it did"""
+        try:
+            stamp = _stamp(self.path)
+        except OSError:
+            return False
+        if stamp == self.stamp:
+            return False
+        self.index = load(self.path, self.cache_path)
+        self.stamp = stamp
+        return True
+
+    def get(self, uri):
+        return self.index.get(uri)
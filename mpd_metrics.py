@@ -0,0 +1,219 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Configuration
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _escape(value):
+    """Escape a label value as the text exposition format requires"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in sorted(labels)) + '}'
+
+class Counter:
+    """Monotonic counter, optionally split by label values"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.items())
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values) or {(): 0}
+        for key, value in values.items():
+            yield f"{self.name}{_labels(key)} {value}"
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[tuple(labels.items())] = value
+
+class Histogram:
+    """Cumulative latency histogram in the Prometheus bucket layout"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+            else:
+                self.counts[-1] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def samples(self):
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), counts):
+            cumulative += count
+            yield f'{self.name}_bucket{{le="{bound}"}} {cumulative}'
+        yield f"{self.name}_sum {total}"
+        yield f"{self.name}_count {cumulative}"
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help_text):
+        return self._add(Counter(name, help_text))
+
+    def gauge(self, name, help_text):
+        return self._add(Gauge(name, help_text))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, buckets))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            help_text = metric.help.replace('\\', '\\\\').replace('\n', '\\n')
+            lines.append(f"# HELP {metric.name} {help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """Atomically replace a node_exporter textfile collector file"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def start_textfile_writer(self, path, interval):
+        def write_forever():
+            while True:
+                try:
+                    self.write_textfile(path)
+                except OSError:
+                    pass
+                time.sleep(interval)
+
+        threading.Thread(target=write_forever, name='metrics-textfile', daemon=True).start()
+
+    def start_http_server(self, port, host='127.0.0.1'):
+        """Serve /metrics from a daemon thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        return server
+
+class ProfilingCursor:
+    """Cursor wrapper recording wall time, row count and query plan per statement
+
+    Results are fetched eagerly so the time covers the whole query, not just
+    the first step; fetch calls are then served from the buffered rows.
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.queries = []
+        self.rows = []
+        self.position = 0
+
+    def execute(self, sql, params=()):
+        started = time.perf_counter()
+        self.cursor.execute(sql, params)
+        self.rows = self.cursor.fetchall()
+        self.position = 0
+        elapsed = time.perf_counter() - started
+
+        plan = []
+        if sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            self.cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [(node_id, parent, detail) for node_id, parent, _, detail in self.cursor.fetchall()]
+
+        self.queries.append({'sql': sql, 'seconds': elapsed, 'rows': len(self.rows), 'plan': plan})
+        return self
+
+    def fetchmany(self, size=None):
+        end = self.position + (size or self.cursor.arraysize)
+        rows = self.rows[self.position:end]
+        self.position += len(rows)
+        return rows
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchall(self):
+        return self.fetchmany(len(self.rows))
+
+    def __iter__(self):
+        while self.position < len(self.rows):
+            yield self.fetchone()
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+def format_plan(plan):
+    """Indent EXPLAIN QUERY PLAN rows into the tree sqlite3's shell prints"""
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, detail in plan:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return '\n'.join(lines)
@@ -1,45 +1,182 @@
 #!/usr/bin/env python3
-import sqlite3
 import time
 import os
+import json
+import socket
+import sqlite3
 import logging
-from datetime import datetime  # CORRECT IMPORT
+import argparse
+from abc import ABC, abstractmethod
 from mpd import MPDClient
+import mpd_db
+import mpd_library
+import mpd_metrics
 
 # Configuration
-DB_PATH = os.path.expanduser("~/.config/Seas/listening_history.db")
 LOG_FILE = os.path.expanduser("~/.config/Seas/mpd_scrobbler.log")
+SPOOL_PATH = os.path.expanduser("~/.config/Seas/scrobble_spool.jsonl")
 MPD_HOST = "localhost"
 MPD_PORT = 6600
 MIN_PERCENTAGE = 50
 MIN_DURATION = 30
+IDLE_SUBSYSTEMS = ('player', 'playlist')
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+FLUSH_INTERVAL = 30
+FLUSH_BATCH = 20
+METRICS_TEXTFILE = os.path.expanduser("~/.config/Seas/mpd_scrobbler.prom")
+METRICS_INTERVAL = 15
+POLL_INTERVAL = 2
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler()
-    ]
-)
-
-class MPDTracker:
-    def __init__(self):
-        self.client = MPDClient()
-        self.db = sqlite3.connect(DB_PATH)
-        self.current_track = None
-        self.start_time = None
-        self.last_update = time.time()
-        
-    def connect_mpd(self):
+metrics = mpd_metrics.Registry()
+MPD_RTT = metrics.histogram('mpd_scrobbler_mpd_rtt_seconds', 'Round trip time of MPD status and currentsong')
+DB_COMMIT = metrics.histogram('mpd_scrobbler_db_commit_seconds', 'Time to write and commit a spool flush')
+LOOP_LAG = metrics.histogram('mpd_scrobbler_loop_lag_seconds', 'How much later than scheduled the loop woke up')
+RECONNECTS = metrics.counter('mpd_scrobbler_reconnects_total', 'MPD connections reopened after an error')
+IDLE_TIMEOUTS = metrics.counter('mpd_scrobbler_idle_timeouts_total', 'Idle waits that timed out and reconnected as planned')
+CONNECT_FAILURES = metrics.counter('mpd_scrobbler_connect_failures_total', 'Failed attempts to connect to MPD')
+LOOP_ERRORS = metrics.counter('mpd_scrobbler_loop_errors_total', 'Errors that dropped the MPD connection, by type')
+SCROBBLES_LOGGED = metrics.counter('mpd_scrobbler_scrobbles_logged_total', 'Plays written to the spool')
+SCROBBLES_COMMITTED = metrics.counter('mpd_scrobbler_scrobbles_committed_total', 'Spooled plays committed to the database')
+SCROBBLES_DROPPED = metrics.counter('mpd_scrobbler_scrobbles_dropped_total', 'Plays that were not recorded, by reason')
+SPOOL_PENDING = metrics.gauge('mpd_scrobbler_spool_pending', 'Plays waiting in the spool')
+
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(LOG_FILE),
+            logging.StreamHandler()
+        ]
+    )
+
+def spooled_play(entry):
+    """record_play arguments for a spool entry, raising KeyError, TypeError or ValueError if malformed"""
+    timestamp = entry['timestamp']
+    if isinstance(timestamp, str):
+        # Spooled as local time by an older version
+        timestamp = mpd_db.to_epoch(timestamp)
+    play = {'timestamp': int(timestamp), 'duration': int(entry['duration']), 'source': entry.get('source')}
+    for key in ('artist', 'album', 'title'):
+        if not isinstance(entry[key], str):
+            raise ValueError(f"{key} is not text")
+        play[key] = entry[key]
+    if play['source'] is not None and not isinstance(play['source'], str):
+        raise ValueError("source is not text")
+    return play
+
+class ScrobbleSpool:
+    """Append-only journal of scrobbles that are not committed to the database yet"""
+
+    def __init__(self, path=SPOOL_PATH):
+        self.path = path
+        self.pending = self.load()
+        # Anything left over from a previous run is replayed right away
+        self.oldest = 0 if self.pending else None
+        self.retry_at = 0
+
+    def load(self):
+        pending = []
         try:
-            self.client.connect(MPD_HOST, MPD_PORT)
-            logging.info("Connected to MPD")
-        except Exception as e:
-            logging.error(f"Failed to connect to MPD: {e}")
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        pending.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-write
+                        logging.warning(f"Skipping corrupt spool entry: {line.strip()}")
+        except FileNotFoundError:
+            pass
+        return pending
+
+    def append(self, play):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(play) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.pending.append(play)
+        if self.oldest is None:
+            self.oldest = time.time()
+
+    def seconds_until_due(self):
+        if not self.pending:
+            return None
+        due_at = self.oldest + FLUSH_INTERVAL
+        if len(self.pending) >= FLUSH_BATCH:
+            due_at = 0
+        return max(0.0, due_at - time.time(), self.retry_at - time.time())
+
+    def due(self):
+        return self.seconds_until_due() == 0.0
+
+    def clear(self):
+        with open(self.path, 'w') as f:
+            os.fsync(f.fileno())
+        self.pending = []
+        self.oldest = None
+
+    def reject(self, entries):
+        """Set malformed entries aside in a .rejected file next to the spool"""
+        with open(self.path + '.rejected', 'a') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def flush(self, db):
+        """Commit every spooled scrobble in one transaction and truncate the spool"""
+        if not self.pending:
+            return True
+
+        plays, rejected = [], []
+        for entry in self.pending:
+            try:
+                plays.append(spooled_play(entry))
+            except (KeyError, TypeError, ValueError) as e:
+                logging.error(f"Rejecting malformed spool entry {json.dumps(entry)}: {e!r}")
+                rejected.append(entry)
+
+        duplicates = 0
+        try:
+            with DB_COMMIT.time():
+                cursor = db.cursor()
+                for play in plays:
+                    # Plays committed just before a crash are still in the spool
+                    if mpd_db.play_exists(cursor, play['timestamp'], play['artist'], play['title'],
+                                          play['source']):
+                        duplicates += 1
+                    else:
+                        mpd_db.record_play(cursor, **play)
+                db.commit()
+        except sqlite3.Error as e:
+            db.rollback()
+            logging.warning(f"Deferring {len(self.pending)} spooled scrobbles: {e}")
+            self.retry_at = time.time() + FLUSH_INTERVAL
             return False
+
+        logging.info(f"Committed {len(plays)} spooled scrobbles")
+        SCROBBLES_COMMITTED.inc(len(plays) - duplicates)
+        if duplicates:
+            SCROBBLES_DROPPED.inc(duplicates, reason='duplicate')
+        if rejected:
+            self.reject(rejected)
+            SCROBBLES_DROPPED.inc(len(rejected), reason='rejected')
+        self.clear()
+        SPOOL_PENDING.set(0)
         return True
-    
+
+class PlayTracker(ABC):
+    """Player state machine deciding when a track was played long enough to log"""
+
+    def __init__(self, library, source=None):
+        self.library = library
+        self.source = source
+        self.current_track = None
+        self.start_time = None
+        self.prev_song = None
+        self.prev_duration = 0
+
     def track_meets_criteria(self, duration, elapsed):
         if duration <= 0:
             return False
@@ -47,36 +184,133 @@ class MPDTracker:
             return True
         percentage = (elapsed / duration) * 100
         return percentage >= MIN_PERCENTAGE
+
+    def seconds_until_criteria(self):
+        """Wall-clock seconds until the stopped track becomes loggable, or None"""
+        if not self.current_track or not self.start_time or not self.prev_duration:
+            return None
+        threshold = self.prev_duration * MIN_PERCENTAGE / 100
+        return max(0.0, self.start_time + threshold - time.time())
+    
+    def make_play(self, song):
+        # Stamped as an epoch, which stays unambiguous when DST repeats an hour
+        play = {
+            'timestamp': int(time.time()),
+            'artist': song.get('artist', 'Unknown Artist'),
+            'album': song.get('album', 'Unknown Album'),
+            'title': song.get('title', 'Unknown Track'),
+            'duration': int(float(song.get('duration', 0)))
+        }
+        if self.source:
+            play['source'] = self.source
+        return play
+
+    @abstractmethod
+    def log_track(self, song):
+        """Record a song that met the play criteria"""
+
+    def missing_tags(self, current_song):
+        """Whether currentsong lacks tags or duration the library index could fill in"""
+        if self.library is None or not current_song or 'file' not in current_song:
+            return False
+        return not all(current_song.get(key) for key in ('artist', 'album', 'title', 'duration'))
+
+    def with_library_tags(self, current_song):
+        """Fill tags and duration missing from currentsong from the library index
+
+        The caller refreshes the index first when missing_tags says it is needed.
+        """
+        if not self.missing_tags(current_song):
+            return current_song
+
+        song = self.library.get(current_song['file'])
+        if song is None:
+            return current_song
+        return {**song, **{key: value for key, value in current_song.items() if value}}
+
+    def handle_state(self, status, current_song):
+        """Log the previous track if the player moved on from it"""
+        current_song = self.with_library_tags(current_song)
+        if current_song and 'title' in current_song:
+            duration = float(current_song.get('duration', 0))
+
+            track_id = f"{current_song.get('artist', '')}_{current_song.get('title', '')}"
+            if track_id != self.current_track:
+                if self.current_track is not None:
+                    prev_elapsed = time.time() - self.start_time
+                    if self.prev_duration and self.track_meets_criteria(self.prev_duration, prev_elapsed):
+                        self.log_track(self.prev_song)
+
+                self.current_track = track_id
+                self.start_time = time.time()
+                self.prev_song = current_song.copy()
+                self.prev_duration = duration
+
+        elif self.current_track and self.start_time:
+            elapsed = time.time() - self.start_time
+            if self.track_meets_criteria(self.prev_duration, elapsed):
+                self.log_track(self.prev_song)
+                self.current_track = None
+
+class MPDTracker(PlayTracker):
+    def __init__(self, db_path=mpd_db.DB_PATH, spool_path=SPOOL_PATH):
+        super().__init__(mpd_library.Library())
+        self.client = MPDClient()
+        self.db = mpd_db.connect(db_path)
+        self.spool = ScrobbleSpool(spool_path)
+        self.connections = 0
+        SPOOL_PENDING.set(len(self.spool.pending))
+        
+    def connect_mpd(self, planned=False):
+        try:
+            self.client.connect(MPD_HOST, MPD_PORT)
+            logging.info("Connected to MPD")
+        except Exception as e:
+            CONNECT_FAILURES.inc()
+            logging.error(f"Failed to connect to MPD: {e}")
+            return False
+        if self.connections and not planned:
+            RECONNECTS.inc()
+        self.connections += 1
+        return True
+
+    def disconnect_mpd(self):
+        try:
+            self.client.disconnect()
+        except Exception:
+            pass
     
     def log_track(self, song):
         try:
-            cursor = self.db.cursor()
-            # Get current time as string
-            time_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            cursor.execute('''
-                INSERT INTO listening_history 
-                (timestamp, artist, album, title, duration)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                time_str,
-                song.get('artist', 'Unknown Artist'),
-                song.get('album', 'Unknown Album'),
-                song.get('title', 'Unknown Track'),
-                int(float(song.get('duration', 0)))
-            ))
-            self.db.commit()
-            
-            artist = song.get('artist', 'Unknown Artist')
-            title = song.get('title', 'Unknown Track')
-            logging.info(f"Logged: {artist} - {title} at {time_str}")
-            
+            play = self.make_play(song)
+            self.spool.append(play)
+            SCROBBLES_LOGGED.inc()
+            SPOOL_PENDING.set(len(self.spool.pending))
+            logging.info(f"Logged: {play['artist']} - {play['title']} at {mpd_db.local_time(play['timestamp'])}")
         except Exception as e:
+            SCROBBLES_DROPPED.inc(reason='error')
             logging.error(f"Failed to log track: {e}")
-    
-    def update_stats_cache(self):
-        # ... keep your existing code here ...
-        pass
+
+    def flush_spool(self):
+        return self.spool.flush(self.db)
+
+    def fetch_state(self):
+        """Query MPD for (status, currentsong), timing each round trip"""
+        with MPD_RTT.time():
+            status = self.client.status()
+        with MPD_RTT.time():
+            current_song = self.client.currentsong()
+        if self.missing_tags(current_song):
+            self.library.refresh()
+        return status, current_song
+
+    def next_timeout(self, playing):
+        """Seconds until the idle loop has work of its own to do, or None"""
+        deadlines = [self.spool.seconds_until_due()]
+        if not playing:
+            deadlines.append(self.seconds_until_criteria())
+        deadlines = [d for d in deadlines if d is not None]
+        return min(deadlines) if deadlines else None
     
     def run(self):
         if not self.connect_mpd():
@@ -87,36 +321,15 @@ class MPDTracker:
         try:
             while True:
                 try:
-                    status = self.client.status()
-                    current_song = self.client.currentsong()
-                    
-                    if current_song and 'title' in current_song:
-                        elapsed = float(status.get('elapsed', 0))
-                        duration = float(current_song.get('duration', 0))
-                        
-                        track_id = f"{current_song.get('artist', '')}_{current_song.get('title', '')}"
-                        if track_id != self.current_track:
-                            if self.current_track is not None:
-                                prev_elapsed = time.time() - self.start_time
-                                if self.prev_duration and self.track_meets_criteria(self.prev_duration, prev_elapsed):
-                                    self.log_track(self.prev_song)
-                                    self.update_stats_cache()
-                            
-                            self.current_track = track_id
-                            self.start_time = time.time()
-                            self.prev_song = current_song.copy()
-                            self.prev_duration = duration
-                    
-                    elif self.current_track and self.start_time:
-                        elapsed = time.time() - self.start_time
-                        if self.track_meets_criteria(self.prev_duration, elapsed):
-                            self.log_track(self.prev_song)
-                            self.update_stats_cache()
-                            self.current_track = None
-                    
-                    time.sleep(2)
+                    self.handle_state(*self.fetch_state())
+                    if self.spool.due():
+                        self.flush_spool()
+                    woke_at = time.monotonic() + POLL_INTERVAL
+                    time.sleep(POLL_INTERVAL)
+                    LOOP_LAG.observe(max(0.0, time.monotonic() - woke_at))
                     
                 except Exception as e:
+                    LOOP_ERRORS.inc(error=type(e).__name__)
                     logging.error(f"Error in main loop: {e}")
                     time.sleep(5)
                     self.connect_mpd()
@@ -124,9 +337,87 @@ class MPDTracker:
         except KeyboardInterrupt:
             logging.info("Shutting down...")
         finally:
+            self.flush_spool()
             self.client.close()
             self.db.close()
 
+    def watch_idle(self):
+        """Block on MPD idle notifications and re-check state only on change"""
+        while True:
+            status, current_song = self.fetch_state()
+            self.handle_state(status, current_song)
+            if self.spool.due():
+                self.flush_spool()
+
+            # A stopped track that has not met the criteria yet is logged once
+            # enough wall-clock time has passed, just like the polling loop,
+            # and spooled scrobbles are flushed once they are due.
+            # The sync client cannot send noidle, so a timed out idle leaves
+            # the connection unusable and we reconnect after handling it.
+            playing = bool(current_song and 'title' in current_song)
+            self.client.idletimeout = self.next_timeout(playing)
+            try:
+                self.client.idle(*IDLE_SUBSYSTEMS)
+            except socket.timeout:
+                IDLE_TIMEOUTS.inc()
+                self.disconnect_mpd()
+                if not playing:
+                    self.handle_state(None, None)
+                if self.spool.due():
+                    self.flush_spool()
+                if not self.connect_mpd(planned=True):
+                    raise
+
+    def run_idle(self):
+        logging.info("Starting MPD tracker (idle mode)...")
+        self.flush_spool()
+
+        delay = RECONNECT_MIN_DELAY
+        try:
+            while True:
+                if not self.connect_mpd():
+                    logging.info(f"Retrying MPD connection in {delay}s")
+                    time.sleep(delay)
+                    delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                    continue
+
+                delay = RECONNECT_MIN_DELAY
+                try:
+                    self.watch_idle()
+                except Exception as e:
+                    LOOP_ERRORS.inc(error=type(e).__name__)
+                    logging.error(f"Error in idle loop: {e}")
+                    self.disconnect_mpd()
+
+        except KeyboardInterrupt:
+            logging.info("Shutting down...")
+        finally:
+            self.flush_spool()
+            self.disconnect_mpd()
+            self.db.close()
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MPD listening history tracker")
+    parser.add_argument('--poll', action='store_true',
+                        help='Poll MPD every 2 seconds instead of waiting on idle events')
+    parser.add_argument('--metrics-file', default=METRICS_TEXTFILE,
+                        help='Prometheus textfile to rewrite periodically (empty to disable)')
+    parser.add_argument('--metrics-port', type=int,
+                        help='Also serve metrics on http://127.0.0.1:PORT/metrics')
+    args = parser.parse_args()
+
+    setup_logging()
+    if args.metrics_file:
+        metrics.start_textfile_writer(args.metrics_file, METRICS_INTERVAL)
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+
     tracker = MPDTracker()
-    tracker.run()
+    try:
+        if args.poll:
+            tracker.run()
+        else:
+            tracker.run_idle()
+    finally:
+        if args.metrics_file:
+            metrics.write_textfile(args.metrics_file)
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# Scrobbles several MPD servers from one process. Each server gets its own
+# idle-driven watcher; every play goes through one writer task that owns the
+# spool and the database connection, so commits stay batched and serialized.
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from mpd.asyncio import MPDClient
+import mpd_db
+import mpd_library
+import mpd_scrobbler
+from mpd_scrobbler import (
+    metrics, MPD_RTT, LOOP_LAG, RECONNECTS, CONNECT_FAILURES, LOOP_ERRORS,
+    SCROBBLES_LOGGED, SCROBBLES_DROPPED, SPOOL_PENDING
+)
+
+# Configuration
+SERVERS_PATH = os.path.expanduser("~/.config/Seas/mpd_servers.json")
+SPOOL_PATH = os.path.expanduser("~/.config/Seas/scrobble_spool_async.jsonl")
+METRICS_TEXTFILE = os.path.expanduser("~/.config/Seas/mpd_scrobbler_async.prom")
+IDLE_SUBSYSTEMS = ['player', 'playlist']
+# Host names of this machine; the MPD on mpd_scrobbler.MPD_PORT there owns the db_file
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+def load_servers(path=SERVERS_PATH):
+    """Servers from a JSON list of {"name", "host", "port"}, or the local MPD"""
+    try:
+        with open(path) as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        entries = [{'host': mpd_scrobbler.MPD_HOST, 'port': mpd_scrobbler.MPD_PORT}]
+
+    servers = []
+    for entry in entries:
+        host = entry.get('host', 'localhost')
+        port = int(entry.get('port', 6600))
+        servers.append({'name': entry.get('name') or f"{host}:{port}", 'host': host, 'port': port})
+
+    names = [server['name'] for server in servers]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate server names in {path}")
+    return servers
+
+class ScrobbleWriter:
+    """Single consumer that spools plays from every server and flushes them in batches"""
+
+    def __init__(self, db_path=mpd_db.DB_PATH, spool_path=SPOOL_PATH):
+        self.db_path = db_path
+        self.spool = mpd_scrobbler.ScrobbleSpool(spool_path)
+        self.queue = asyncio.Queue()
+        # The connection lives on one thread so a busy database never stalls the watchers
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='scrobble-writer')
+        self.db = None
+        SPOOL_PENDING.set(len(self.spool.pending))
+
+    def submit(self, play):
+        self.queue.put_nowait(play)
+
+    def spool_plays(self, plays):
+        """Append plays to the spool; runs on the writer thread, as the fsync can stall"""
+        for play in plays:
+            try:
+                self.spool.append(play)
+            except OSError as e:
+                SCROBBLES_DROPPED.inc(reason='error')
+                logging.error(f"Failed to spool play from {play.get('source')}: {e}")
+                continue
+            SCROBBLES_LOGGED.inc()
+        SPOOL_PENDING.set(len(self.spool.pending))
+
+    async def drain(self, play=None):
+        """Spool `play` and everything else queued, off the event loop"""
+        plays = [] if play is None else [play]
+        while not self.queue.empty():
+            plays.append(self.queue.get_nowait())
+        if plays:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, self.spool_plays, plays)
+
+    async def flush(self):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.spool.flush, self.db)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.db = await loop.run_in_executor(self.executor, mpd_db.connect, self.db_path)
+        try:
+            await self.flush()
+            while True:
+                try:
+                    play = await asyncio.wait_for(self.queue.get(), self.spool.seconds_until_due())
+                except asyncio.TimeoutError:
+                    await self.flush()
+                    continue
+
+                await self.drain(play)
+                if self.spool.due():
+                    await self.flush()
+        finally:
+            await self.drain()
+            await self.flush()
+            await loop.run_in_executor(self.executor, self.db.close)
+            self.executor.shutdown()
+
+def is_local(server):
+    """Whether server is the MPD whose db_file mpd_library reads"""
+    return server['host'] in LOCAL_HOSTS and server['port'] == mpd_scrobbler.MPD_PORT
+
+class ServerWatcher(mpd_scrobbler.PlayTracker):
+    """Follows one MPD server over idle and hands finished plays to the writer
+
+    Only the local server gets a library; remote servers' files are not in
+    the local db_file, so their plays keep the tags MPD reports.
+    """
+
+    def __init__(self, server, writer, library):
+        super().__init__(library, source=server['name'])
+        self.host = server['host']
+        self.port = server['port']
+        self.writer = writer
+        self.playing = False
+        self.changed = asyncio.Event()
+        self.connections = 0
+
+    def log_track(self, song):
+        try:
+            play = self.make_play(song)
+        except Exception as e:
+            SCROBBLES_DROPPED.inc(reason='error')
+            logging.error(f"[{self.source}] Failed to log track: {e}")
+            return
+        self.writer.submit(play)
+        logging.info(f"[{self.source}] Logged: {play['artist']} - {play['title']} "
+                     f"at {mpd_db.local_time(play['timestamp'])}")
+
+    async def refresh(self, client):
+        with MPD_RTT.time():
+            status = await client.status()
+        with MPD_RTT.time():
+            current_song = await client.currentsong()
+        if self.missing_tags(current_song):
+            # Reparsing db_file would stall every watcher on the loop
+            await asyncio.get_running_loop().run_in_executor(None, self.library.refresh)
+        self.handle_state(status, current_song)
+        self.playing = bool(current_song and 'title' in current_song)
+        self.changed.set()
+
+    async def expire(self):
+        """Log a stopped track once enough wall-clock time has passed"""
+        while True:
+            timeout = None if self.playing else self.seconds_until_criteria()
+            self.changed.clear()
+            if timeout is not None:
+                deadline = time.monotonic() + timeout
+            try:
+                await asyncio.wait_for(self.changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                LOOP_LAG.observe(max(0.0, time.monotonic() - deadline))
+                self.handle_state(None, None)
+
+    async def follow(self, client):
+        await self.refresh(client)
+        expiry = asyncio.create_task(self.expire())
+        try:
+            async for _ in client.idle(IDLE_SUBSYSTEMS):
+                await self.refresh(client)
+        finally:
+            expiry.cancel()
+
+    async def run(self):
+        delay = mpd_scrobbler.RECONNECT_MIN_DELAY
+        while True:
+            client = MPDClient()
+            try:
+                await client.connect(self.host, self.port)
+            except Exception as e:
+                CONNECT_FAILURES.inc(server=self.source)
+                logging.error(f"[{self.source}] Failed to connect to MPD: {e}; retrying in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, mpd_scrobbler.RECONNECT_MAX_DELAY)
+                continue
+
+            logging.info(f"[{self.source}] Connected to MPD at {self.host}:{self.port}")
+            if self.connections:
+                RECONNECTS.inc(server=self.source)
+            self.connections += 1
+            delay = mpd_scrobbler.RECONNECT_MIN_DELAY
+            try:
+                await self.follow(client)
+            except Exception as e:
+                LOOP_ERRORS.inc(error=type(e).__name__, server=self.source)
+                logging.error(f"[{self.source}] Error in idle loop: {e}")
+            finally:
+                client.disconnect()
+
+async def run(servers, db_path=mpd_db.DB_PATH, spool_path=SPOOL_PATH):
+    writer = ScrobbleWriter(db_path, spool_path)
+    library = None
+    if any(is_local(server) for server in servers):
+        library = await asyncio.get_running_loop().run_in_executor(None, mpd_library.Library)
+    watchers = [ServerWatcher(server, writer, library if is_local(server) else None)
+                for server in servers]
+    logging.info(f"Starting MPD tracker for {', '.join(w.source for w in watchers)}...")
+    await asyncio.gather(writer.run(), *(watcher.run() for watcher in watchers))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MPD listening history tracker for several servers")
+    parser.add_argument('--servers', default=SERVERS_PATH,
+                        help='JSON list of {"name", "host", "port"} servers to watch')
+    parser.add_argument('--metrics-file', default=METRICS_TEXTFILE,
+                        help='Prometheus textfile to rewrite periodically (empty to disable)')
+    parser.add_argument('--metrics-port', type=int,
+                        help='Also serve metrics on http://127.0.0.1:PORT/metrics')
+    args = parser.parse_args()
+
+    mpd_scrobbler.setup_logging()
+    if args.metrics_file:
+        metrics.start_textfile_writer(args.metrics_file, mpd_scrobbler.METRICS_INTERVAL)
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+
+    try:
+        asyncio.run(run(load_servers(args.servers)))
+    except KeyboardInterrupt:
+        logging.info("Shutting down...")
+    finally:
+        if args.metrics_file:
+            metrics.write_textfile(args.metrics_file)
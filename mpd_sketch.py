@@ -0,0 +1,47 @@
+import hashlib
+import math
+
+# Configuration
+PRECISION = 11
+
+class HyperLogLog:
+    """Mergeable distinct-count sketch with a fixed 2**precision byte footprint"""
+
+    def __init__(self, registers=None, precision=PRECISION):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers else bytearray(self.size)
+
+    @property
+    def error(self):
+        """Relative standard error of count()"""
+        return 1.04 / math.sqrt(self.size)
+
+    def add(self, value):
+        """Add a value, returning True if the sketch changed"""
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        x = int.from_bytes(digest, 'big')
+        index = x >> (64 - self.precision)
+        rest = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / sum(2.0 ** -r for r in self.registers)
+
+        # Linear counting is more accurate while many registers are still empty
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)
+        return round(estimate)
+
+    def to_bytes(self):
+        return bytes(self.registers)
@@ -1,286 +1,876 @@
 #!/usr/bin/env python3
-import sqlite3
 import argparse
+import calendar
+import heapq
+import io
 import json
 import os
-from datetime import datetime, timedelta
-from rich.console import Console
+import re
+import shlex
+import socketserver
+import sqlite3
+import sys
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+from rich.console import Console, Group
+from rich.live import Live
+from rich.markup import escape
 from rich.table import Table
 from rich import box
 from rich.panel import Panel
 from rich.text import Text
+import mpd_db
+import mpd_import
+import mpd_library
+import mpd_metrics
 
 # Initialize rich console
 console = Console()
 
 # Configuration
-DB_PATH = os.path.expanduser("~/.config/Seas/listening_history.db")
+SOCKET_PATH = os.path.join(os.environ.get("XDG_RUNTIME_DIR", "/tmp"), "mpd_stats.sock")
+
+PERIODS = ['day', 'week', 'month', 'year', 'all']
+
+# Period starts as Unix epochs, compared directly against plays.timestamp
+PERIOD_SQL = {
+    'day': "CAST(strftime('%s', 'now', '-1 day') AS INTEGER)",
+    'week': "CAST(strftime('%s', 'now', '-7 days') AS INTEGER)",
+    'month': "CAST(strftime('%s', 'now', '-30 days') AS INTEGER)",
+    'year': "CAST(strftime('%s', 'now', '-365 days') AS INTEGER)",
+    'all': '0'
+}
+
+MONTHS = {name.lower(): i for names in (calendar.month_name, calendar.month_abbr)
+          for i, name in enumerate(names) if name}
+RANGE_UNITS = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+
+# Reports that accept --since/--until
+RANGE_REPORTS = ['ta', 'tt', 'stats']
+
+# Rows per fetch when `rec` formats and streams its timestamps
+RECENT_CHUNK = 1000
+
+# `watch`: seconds between checks for new commits, and rows per panel
+WATCH_INTERVAL = 1.0
+WATCH_LIMIT = 10
+WATCH_RECENT = 10
+
+library = None
 
 def get_db():
-    return sqlite3.connect(DB_PATH)
+    return mpd_db.connect()
 
-def top_artists(period='all', limit=10):
-    """Get top artists for a given period"""
-    db = get_db()
-    cursor = db.cursor()
+def period_start(cursor, period):
+    """First local day covered by a period, or None for all time"""
+    if period not in PERIOD_SQL or period == 'all':
+        return None
+    cursor.execute(f"SELECT date({PERIOD_SQL[period]}, 'unixepoch', 'localtime')")
+    return cursor.fetchone()[0]
+
+def _month_span(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
 
-    period_sql = {
-        'day': 'datetime("now", "-1 day")',
-        'week': 'datetime("now", "-7 days")',
-        'month': 'datetime("now", "-30 days")',
-        'year': 'datetime("now", "-365 days")',
-        'all': "'1970-01-01'"
-    }.get(period, "'1970-01-01'")
+def parse_date_span(text, today=None):
+    """First and last day covered by '2024', '2024-03', 'March 2024', 'last 90 days', ..."""
+    today = today or date.today()
+    words = ' '.join(text.lower().split())
 
+    if words == 'today':
+        return today, today
+    if words == 'yesterday':
+        return today - timedelta(days=1), today - timedelta(days=1)
+    match = re.fullmatch(r'last (\d+) (day|week|month|year)s?', words)
+    if match:
+        days = int(match.group(1)) * RANGE_UNITS[match.group(2)]
+        return today - timedelta(days=max(days - 1, 0)), today
+    match = re.fullmatch(r'(this|last) (month|year)', words)
+    if match:
+        if match.group(2) == 'year':
+            year = today.year - (match.group(1) == 'last')
+            return date(year, 1, 1), date(year, 12, 31) if match.group(1) == 'last' else today
+        first = today.replace(day=1)
+        if match.group(1) == 'this':
+            return first, today
+        return _month_span((first - timedelta(days=1)).year, (first - timedelta(days=1)).month)
+
+    try:
+        if re.fullmatch(r'\d{4}', words):
+            return date(int(words), 1, 1), date(int(words), 12, 31)
+        if re.fullmatch(r'\d{4}-\d{2}', words):
+            return _month_span(int(words[:4]), int(words[5:]))
+        if re.fullmatch(r'\d{4}-\d{2}-\d{2}', words):
+            day = date.fromisoformat(words)
+            return day, day
+        match = re.fullmatch(r'([a-z]+) (\d{4})', words)
+        if match and match.group(1) in MONTHS:
+            return _month_span(int(match.group(2)), MONTHS[match.group(1)])
+    except ValueError:
+        pass
+    raise ValueError(f"[red]Unrecognized date: {text}[/red]\n"
+                     "Try [cyan]2024[/cyan], [cyan]2024-03[/cyan], [cyan]'March 2024'[/cyan], "
+                     "[cyan]2024-03-05[/cyan], [cyan]'last 90 days'[/cyan] or [cyan]'last year'[/cyan]")
+
+def parse_range(since=None, until=None):
+    """Inclusive (first_day, last_day) ISO strings; since starts its span and until ends it"""
+    first = parse_date_span(since)[0] if since else date.min
+    last = parse_date_span(until)[1] if until else date.today()
+    if first > last:
+        raise ValueError(f"[red]--since {since} is after --until {until}[/red]")
+    return first.isoformat(), last.isoformat()
+
+def range_label(since, until):
+    if since == date.min.isoformat():
+        return f"until {until}"
+    return since if since == until else f"{since} to {until}"
+
+def range_epochs(since, until):
+    """Epoch bounds [start, end) of the local days since..until"""
+    start = 0 if since == date.min.isoformat() else mpd_db.to_epoch(since)
+    return start, mpd_db.to_epoch((date.fromisoformat(until) + timedelta(days=1)).isoformat())
+
+def range_top(cursor, kind, since, until, limit):
+    """Top (id, plays) for a day range from the running totals
+
+    Candidates come in order of all-time plays, which bound their plays in
+    any range, so the scan stops once no remaining candidate can make the cut.
+    """
+    key = f'{kind}_id'
+    start, end = range_epochs(since, until)
     cursor.execute(f'''
-        SELECT artist, COUNT(*) as play_count
-        FROM listening_history
-        WHERE timestamp > {period_sql}
-        GROUP BY artist
-        ORDER BY play_count DESC
-        LIMIT ?
-    ''', (limit,))
+        SELECT {key}, plays
+        FROM {kind}_stats
+        WHERE first_play < ? AND last_play >= ?
+        ORDER BY plays DESC
+    ''', (end, start))
+    candidates = cursor.fetchall()
 
-    results = cursor.fetchall()
-    db.close()
+    count_sql = 'SELECT ' + mpd_db.range_count_sql(f'{kind}_day_totals', key)
+    top = []
+    for item_id, all_time in candidates:
+        if len(top) == limit and all_time <= top[0][0]:
+            break
+        cursor.execute(count_sql, {'item': item_id, 'since': since, 'until': until})
+        plays = cursor.fetchone()[0]
+        if plays <= 0:
+            continue
+        if len(top) < limit:
+            heapq.heappush(top, (plays, item_id))
+        elif plays > top[0][0]:
+            heapq.heapreplace(top, (plays, item_id))
+    return sorted(top, key=lambda item: (-item[0], item[1]))
 
-    if results:
-        table = Table(
-            title=f"🎤 Top Artists - Last {period}",
-            box=box.ROUNDED,
-            header_style="bold cyan",
-            border_style="green",
-            title_style="bold green",
-            show_header=True,
-            title_justify="left"
-        )
+def get_library():
+    """The MPD library index, loaded once and reloaded when the database changes"""
+    global library
+    if library is None:
+        library = mpd_library.Library()
+    else:
+        library.refresh()
+    return library
 
-        table.add_column("Rank", style="green", justify="right", width=6)
-        table.add_column("Artist", style="cyan", min_width=20)
-        table.add_column("Plays", style="yellow", justify="right", width=8)
+def lookup_names(cursor, sql, ids):
+    """Map ids to the rest of each row of a `... WHERE id IN ({})` query"""
+    cursor.execute(sql.format(', '.join('?' for _ in ids)), ids)
+    return {row[0]: row[1:] for row in cursor.fetchall()}
 
-        for i, (artist, plays) in enumerate(results):
-            table.add_row(str(i+1), artist, str(plays))
+def select_top_artists(cursor, period='all', limit=10, since=None, until=None):
+    if since:
+        top = range_top(cursor, 'artist', since, until, limit)
+        names = lookup_names(cursor, 'SELECT id, name FROM artists WHERE id IN ({})', [i for _, i in top])
+        return [(*names[i], plays) for plays, i in top]
 
-        console.print(table)
+    period_sql = PERIOD_SQL.get(period, PERIOD_SQL['all'])
+
+    if period == 'all':
+        cursor.execute('''
+            SELECT a.name, s.plays
+            FROM artist_stats s
+            JOIN artists a ON a.id = s.artist_id
+            ORDER BY s.plays DESC
+            LIMIT ?
+        ''', (limit,))
     else:
-        console.print(f"[yellow]No listening data for the last {period}[/yellow]")
+        plays = mpd_db.plays_sql(cursor, period_start(cursor, period))
+        cursor.execute(f'''
+            SELECT a.name, c.play_count
+            FROM (
+                SELECT artist_id, COUNT(*) as play_count
+                FROM {plays}
+                WHERE timestamp > {period_sql}
+                GROUP BY artist_id
+                ORDER BY play_count DESC
+                LIMIT ?
+            ) c
+            JOIN artists a ON a.id = c.artist_id
+            ORDER BY c.play_count DESC
+        ''', (limit,))
+    return cursor
 
-def top_tracks(period='all', limit=10):
-    """Get top tracks for a given period"""
-    db = get_db()
-    cursor = db.cursor()
+def query_top_artists(cursor, period='all', limit=10, since=None, until=None):
+    """Get top artists for a given period"""
+    data = {'period': period, 'rows': list(select_top_artists(cursor, period, limit, since, until))}
+    if since:
+        data['range'] = range_label(since, until)
+    return data
 
-    period_sql = {
-        'day': 'datetime("now", "-1 day")',
-        'week': 'datetime("now", "-7 days")',
-        'month': 'datetime("now", "-30 days")',
-        'year': 'datetime("now", "-365 days")',
-        'all': "'1970-01-01'"
-    }.get(period, "'1970-01-01'")
+def render_top_artists(data):
+    period = f"the last {data['period']}"
+    if 'range' in data:
+        period = data['range']
+    if not data['rows']:
+        return f"[yellow]No listening data for {period}[/yellow]"
 
-    cursor.execute(f'''
-        SELECT artist, title, COUNT(*) as play_count
-        FROM listening_history
-        WHERE timestamp > {period_sql}
-        GROUP BY artist, title
-        ORDER BY play_count DESC
-        LIMIT ?
-    ''', (limit,))
+    table = Table(
+        title=f"🎤 Top Artists - {period[0].upper()}{period[1:]}",
+        box=box.ROUNDED,
+        header_style="bold cyan",
+        border_style="green",
+        title_style="bold green",
+        show_header=True,
+        title_justify="left"
+    )
 
-    results = cursor.fetchall()
-    db.close()
+    table.add_column("Rank", style="green", justify="right", width=6)
+    table.add_column("Artist", style="cyan", min_width=20)
+    table.add_column("Plays", style="yellow", justify="right", width=8)
 
-    if results:
-        table = Table(
-            title=f"🎵 Top Tracks - Last {period}",
-            box=box.ROUNDED,
-            header_style="bold cyan",
-            border_style="green",
-            title_style="bold green",
-            show_header=True
-        )
+    for i, (artist, plays) in enumerate(data['rows']):
+        table.add_row(str(i+1), artist, str(plays))
 
-        table.add_column("Rank", style="green", justify="right", width=6)
-        table.add_column("Artist", style="cyan", min_width=15)
-        table.add_column("Track", style="blue", min_width=25)
-        table.add_column("Plays", style="yellow", justify="right", width=8)
+    return table
 
-        for i, (artist, title, plays) in enumerate(results):
-            table.add_row(str(i+1), artist, title, str(plays))
+def select_top_tracks(cursor, period='all', limit=10, since=None, until=None):
+    if since:
+        top = range_top(cursor, 'track', since, until, limit)
+        names = lookup_names(cursor, '''
+            SELECT t.id, a.name, t.title
+            FROM tracks t
+            JOIN artists a ON a.id = t.artist_id
+            WHERE t.id IN ({})
+        ''', [i for _, i in top])
+        return [(*names[i], plays) for plays, i in top]
 
-        console.print(table)
+    period_sql = PERIOD_SQL.get(period, PERIOD_SQL['all'])
+
+    if period == 'all':
+        cursor.execute('''
+            SELECT a.name, t.title, s.plays
+            FROM track_stats s
+            JOIN tracks t ON t.id = s.track_id
+            JOIN artists a ON a.id = t.artist_id
+            ORDER BY s.plays DESC
+            LIMIT ?
+        ''', (limit,))
     else:
-        console.print(f"[yellow]No listening data for the last {period}[/yellow]")
+        plays = mpd_db.plays_sql(cursor, period_start(cursor, period))
+        cursor.execute(f'''
+            SELECT a.name, t.title, c.play_count
+            FROM (
+                SELECT track_id, COUNT(*) as play_count
+                FROM {plays}
+                WHERE timestamp > {period_sql}
+                GROUP BY track_id
+                ORDER BY play_count DESC
+                LIMIT ?
+            ) c
+            JOIN tracks t ON t.id = c.track_id
+            JOIN artists a ON a.id = t.artist_id
+            ORDER BY c.play_count DESC
+        ''', (limit,))
+    return cursor
 
-def recent_tracks(limit=20):
+def query_top_tracks(cursor, period='all', limit=10, since=None, until=None):
+    """Get top tracks for a given period"""
+    data = {'period': period, 'rows': list(select_top_tracks(cursor, period, limit, since, until))}
+    if since:
+        data['range'] = range_label(since, until)
+    return data
+
+def render_top_tracks(data):
+    period = f"the last {data['period']}"
+    if 'range' in data:
+        period = data['range']
+    if not data['rows']:
+        return f"[yellow]No listening data for {period}[/yellow]"
+
+    table = Table(
+        title=f"🎵 Top Tracks - {period[0].upper()}{period[1:]}",
+        box=box.ROUNDED,
+        header_style="bold cyan",
+        border_style="green",
+        title_style="bold green",
+        show_header=True
+    )
+
+    table.add_column("Rank", style="green", justify="right", width=6)
+    table.add_column("Artist", style="cyan", min_width=15)
+    table.add_column("Track", style="blue", min_width=25)
+    table.add_column("Plays", style="yellow", justify="right", width=8)
+
+    for i, (artist, title, plays) in enumerate(data['rows']):
+        table.add_row(str(i+1), artist, title, str(plays))
+
+    return table
+
+def format_day(timestamp):
+    """'Mar 05, 2024' for a local time or day string"""
+    return date.fromisoformat(timestamp[:10]).strftime('%b %d, %Y')
+
+def parse_before(before):
+    """Split a `--before` cursor, "EPOCH[,ID]" or "YYYY-MM-DD HH:MM:SS[,ID]", into (epoch, id or None)
+
+    The `next` cursors rec hands out carry the epoch, so paging never goes
+    through local time, which repeats an hour when DST ends.
+    """
+    timestamp, _, play_id = before.rpartition(',') if ',' in before else (before, '', '')
+    timestamp = timestamp.strip()
+    try:
+        if timestamp.isdigit():
+            epoch = int(timestamp)
+        else:
+            datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+            epoch = mpd_db.to_epoch(timestamp)
+        return epoch, int(play_id) if play_id else None
+    except ValueError:
+        raise ValueError(f"[red]Invalid --before cursor: {before}[/red]\n"
+                         "Use the [cyan]EPOCH,ID[/cyan] cursor rec prints, "
+                         "or [cyan]'YYYY-MM-DD HH:MM:SS'[/cyan]")
+
+def recent_plays(cursor, limit=20, before=None):
+    """Chunks of (epoch, artist, title, album, id) for the newest plays below a `--before` cursor"""
+    # Keyset pagination: each page starts strictly below the last (timestamp, id) seen
+    where, params, until = '', (), None
+    if before:
+        timestamp, play_id = parse_before(before)
+        until = mpd_db.local_time(timestamp)[:10]
+        if play_id is None:
+            where, params = 'WHERE p.timestamp < ?', (timestamp,)
+        else:
+            where, params = 'WHERE (p.timestamp, p.id) < (?, ?)', (timestamp, play_id)
+
+    def newest(schema):
+        cursor.execute(f'''
+            SELECT p.timestamp, a.name, t.title, al.name, p.id
+            FROM {schema}.plays p
+            JOIN artists a ON a.id = p.artist_id
+            JOIN tracks t ON t.id = p.track_id
+            LEFT JOIN albums al ON al.id = p.album_id
+            {where}
+            ORDER BY p.timestamp DESC, p.id DESC
+            LIMIT ?
+        ''', (*params, limit))
+        return cursor.fetchall()
+
+    def rows():
+        # The hot table can hold backfilled plays older than any archive, so
+        # every partition that may beat the page's oldest row is merged in;
+        # with a full page of recent plays no archive is attached at all
+        page = newest('main')
+        since = mpd_db.local_time(page[-1][0])[:10] if len(page) == limit else None
+        for schema in mpd_db.each_schema(cursor, newest_first=True, since=since, until=until):
+            if schema != 'main':
+                page = heapq.nlargest(limit, page + newest(schema), key=lambda row: (row[0], row[4]))
+        for i in range(0, len(page), RECENT_CHUNK):
+            yield page[i:i + RECENT_CHUNK]
+
+    return rows()
+
+def select_recent_tracks(cursor, limit=20, before=None):
+    for rows in recent_plays(cursor, limit, before):
+        times = mpd_db.local_times([row[0] for row in rows])
+        yield from ((timestamp, *row[1:]) for timestamp, row in zip(times, rows))
+
+def query_recent_tracks(cursor, limit=20, before=None):
     """Get recently played tracks"""
-    db = get_db()
-    cursor = db.cursor()
+    rows = [row for chunk in recent_plays(cursor, limit, before) for row in chunk]
+    times = mpd_db.local_times([row[0] for row in rows])
+    data = {'rows': [(timestamp, *row[1:]) for timestamp, row in zip(times, rows)], 'next': None}
+    if rows and len(rows) == limit:
+        data['next'] = f"{rows[-1][0]},{rows[-1][4]}"
+    return data
 
-    cursor.execute('''
-        SELECT timestamp, artist, title, album
-        FROM listening_history
-        ORDER BY timestamp DESC
-        LIMIT ?
-    ''', (limit,))
+def render_recent_tracks(data):
+    if not data['rows']:
+        return "[yellow]No listening history yet[/yellow]"
 
-    results = cursor.fetchall()
-    db.close()
+    table = Table(
+        title="⏰ Recently Played",
+        box=box.ROUNDED,
+        header_style="bold cyan",
+        border_style="green",
+        title_style="bold green",
+        show_header=True
+    )
 
-    if results:
-        table = Table(
-            title="⏰ Recently Played",
-            box=box.ROUNDED,
-            header_style="bold cyan",
-            border_style="green",
-            title_style="bold green",
-            show_header=True
-        )
+    table.add_column("Time", style="dim", width=16)
+    table.add_column("Artist", style="cyan", min_width=15)
+    table.add_column("Track", style="blue", min_width=20)
+    table.add_column("Album", style="magenta", min_width=20)
 
-        table.add_column("Time", style="dim", width=16)
-        table.add_column("Artist", style="cyan", min_width=15)
-        table.add_column("Track", style="blue", min_width=20)
-        table.add_column("Album", style="magenta", min_width=20)
+    if data.get('next'):
+        table.caption = f"Older: --before '{data['next']}'"
 
-        for timestamp, artist, title, album in results:
-            time_str = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d %H:%M')
-            table.add_row(time_str, artist, title, album)
+    for timestamp, artist, title, album, *_ in data['rows']:
+        table.add_row(timestamp[:16], artist, title, album)
 
-        console.print(table)
-    else:
-        console.print("[yellow]No listening history yet[/yellow]")
+    return table
 
-def artist_top_tracks(artist_name, limit=10):
+def query_artist_top_tracks(cursor, artist_name, limit=10):
     """Get top tracks for a specific artist"""
-    db = get_db()
-    cursor = db.cursor()
+    data = {'query': artist_name, 'tracks': []}
 
     # Search for artist (case-insensitive, partial match)
-    cursor.execute('''
-        SELECT title, COUNT(*) as play_count,
-               MIN(timestamp) as first_play,
-               MAX(timestamp) as last_play
-        FROM listening_history
-        WHERE LOWER(artist) LIKE LOWER(?)
-        GROUP BY title
-        ORDER BY play_count DESC
-        LIMIT ?
-    ''', (f'%{artist_name}%', limit))
+    matches = mpd_db.search_artists(cursor, artist_name)
+    artist_ids = [artist_id for artist_id, _ in matches]
+    id_list = ', '.join('?' for _ in artist_ids)
 
-    results = cursor.fetchall()
+    if artist_ids:
+        cursor.execute(f'''
+            SELECT t.title, SUM(s.plays) as play_count,
+                   MIN(s.first_play) as first_play,
+                   MAX(s.last_play) as last_play
+            FROM tracks t
+            JOIN track_stats s ON s.track_id = t.id
+            WHERE t.artist_id IN ({id_list})
+            GROUP BY t.title
+            ORDER BY play_count DESC
+            LIMIT ?
+        ''', (*artist_ids, limit))
+        tracks = cursor.fetchall()
+        firsts = mpd_db.local_times([first for _, _, first, _ in tracks])
+        lasts = mpd_db.local_times([last for *_, last in tracks])
+        data['tracks'] = [(title, plays, first, last)
+                          for (title, plays, *_), first, last in zip(tracks, firsts, lasts)]
 
-    if results:
+    if data['tracks']:
         # Get total plays and exact artist name
-        cursor.execute('''
-            SELECT COUNT(*), MIN(timestamp), MAX(timestamp)
-            FROM listening_history
-            WHERE LOWER(artist) LIKE LOWER(?)
-        ''', (f'%{artist_name}%',))
-        total_plays, first_play, last_play = cursor.fetchone()
+        cursor.execute(f'''
+            SELECT SUM(plays), MIN(first_play), MAX(last_play)
+            FROM artist_stats
+            WHERE artist_id IN ({id_list})
+        ''', artist_ids)
+        data['total_plays'], *first_last = cursor.fetchone()
+        data['first_play'], data['last_play'] = mpd_db.local_times(first_last)
+        data['artist'] = matches[0][1]
+    else:
+        # Show similar artists
+        data['suggestions'] = mpd_db.suggest_artists(cursor, artist_name, 5)
+
+    return data
+
+def render_artist_top_tracks(data):
+    if not data['tracks']:
+        lines = [f"[red]No tracks found for artist: {data['query']}[/red]"]
+        if data['suggestions']:
+            lines.append("\n[yellow]Did you mean one of these?[/yellow]")
+            for artist in data['suggestions']:
+                lines.append(f"  • [cyan]{artist}[/cyan]")
+        return Group(*(Text.from_markup(line) for line in lines))
 
+    first_play, last_play = data['first_play'], data['last_play']
+
+    # Create artist info panel
+    first_date = format_day(first_play) if first_play else "Never"
+    last_date = format_day(last_play) if last_play else "Never"
+
+    info_text = Text()
+    info_text.append(f"Total plays: ", style="bold")
+    info_text.append(f"{data['total_plays']}\n", style="yellow")
+    info_text.append(f"First play: ", style="bold")
+    info_text.append(f"{first_date}\n", style="dim")
+    info_text.append(f"Last play: ", style="bold")
+    info_text.append(f"{last_date}", style="dim")
+
+    panel = Panel(info_text,
+                  title=f"🎤 {data['artist']}",
+                  border_style="cyan",
+                  width=50)
+
+    # Create tracks table
+    table = Table(
+        title=f"Top {len(data['tracks'])} Tracks",
+        box=box.ROUNDED,
+        header_style="bold cyan",
+        border_style="green",
+        title_style="bold green",
+        show_header=True
+    )
+
+    table.add_column("Rank", style="green", justify="right", width=6)
+    table.add_column("Track", style="blue", min_width=30)
+    table.add_column("Plays", style="yellow", justify="right", width=8)
+    table.add_column("First Play", style="dim", width=12)
+    table.add_column("Last Play", style="dim", width=12)
+
+    for i, (title, plays, first, last) in enumerate(data['tracks']):
+        table.add_row(str(i+1), title, str(plays), (first or "")[:10], (last or "")[:10])
+
+    return Group(panel, table)
+
+def range_edge(cursor, aggregate, day, start, end):
+    """MIN or MAX epoch in [start, end) over the partitions that can hold plays on `day`"""
+    edges = []
+    for schema in mpd_db.each_schema(cursor, since=day, until=day):
+        cursor.execute(f'SELECT {aggregate}(timestamp) FROM {schema}.plays WHERE timestamp >= ? AND timestamp < ?',
+                       (start, end))
+        edges.append(cursor.fetchone()[0])
+    edges = [edge for edge in edges if edge is not None]
+    return (min if aggregate == 'MIN' else max)(edges, default=None)
+
+def query_range_summary(cursor, since, until):
+    """Statistics for a day range from the daily buckets and running totals"""
+    cursor.execute('SELECT COALESCE(SUM(plays), 0) FROM play_days WHERE day BETWEEN ? AND ?',
+                   (since, until))
+    total_plays = cursor.fetchone()[0]
+
+    start, end = range_epochs(since, until)
+    unique = {}
+    for kind in ('artist', 'track'):
+        key = f'{kind}_id'
+        cursor.execute(f'''
+            SELECT COUNT(*)
+            FROM {kind}_stats s
+            WHERE s.first_play < :end AND s.last_play >= :start
+              AND {mpd_db.range_count_sql(f'{kind}_day_totals', key, f's.{key}')} > 0
+        ''', {'since': since, 'until': until, 'start': start, 'end': end})
+        unique[kind] = cursor.fetchone()[0]
+
+    top = range_top(cursor, 'artist', since, until, 1)
+    names = lookup_names(cursor, 'SELECT id, name FROM artists WHERE id IN ({})', [i for _, i in top])
+
+    # The buckets name the first and last days with plays; only the
+    # partitions holding those two days are read for the exact times
+    cursor.execute('SELECT MIN(day), MAX(day) FROM play_days WHERE day BETWEEN ? AND ? AND plays > 0',
+                   (since, until))
+    first_day, last_day = cursor.fetchone()
+    first_play = last_play = None
+    if first_day:
+        first_play, last_play = mpd_db.local_times((
+            range_edge(cursor, 'MIN', first_day, start, end),
+            range_edge(cursor, 'MAX', last_day, start, end)))
+
+    return {
+        'period': 'range',
+        'range': range_label(since, until),
+        'total_plays': total_plays,
+        'unique_artists': unique['artist'],
+        'unique_tracks': unique['track'],
+        'top_artist': names[top[0][1]][0] if top else "None",
+        'top_artist_plays': top[0][0] if top else 0,
+        'first_play': first_play,
+        'last_play': last_play
+    }
+
+def query_stats_summary(cursor, period='all', approx=False, since=None, until=None):
+    """Show overall statistics"""
+    if since:
+        return query_range_summary(cursor, since, until)
+
+    period_sql = PERIOD_SQL.get(period, PERIOD_SQL['all'])
+
+    if period == 'all':
+        # Everything comes from the rollups the tracker maintains
         cursor.execute('''
-            SELECT DISTINCT artist
-            FROM listening_history
-            WHERE LOWER(artist) LIKE LOWER(?)
-            LIMIT 1
-        ''', (f'%{artist_name}%',))
-        exact_artist = cursor.fetchone()
-        artist_display = exact_artist[0] if exact_artist else artist_name
+            SELECT
+                (SELECT CAST(data AS INTEGER) FROM stats_cache WHERE period = 'all' AND type = 'plays'),
+                (SELECT CAST(data AS INTEGER) FROM stats_cache WHERE period = 'all' AND type = 'artists'),
+                (SELECT CAST(data AS INTEGER) FROM stats_cache WHERE period = 'all' AND type = 'tracks'),
+                a.name, top.plays,
+                (SELECT MIN(first_play) FROM artist_stats),
+                (SELECT MAX(last_play) FROM artist_stats)
+            FROM (SELECT 1)
+            LEFT JOIN (
+                SELECT artist_id, plays FROM artist_stats ORDER BY plays DESC LIMIT 1
+            ) top
+            LEFT JOIN artists a ON a.id = top.artist_id
+        ''')
+    else:
+        # One pass over the period, reused for every metric
+        plays = mpd_db.plays_sql(cursor, period_start(cursor, period))
+        cursor.execute(f'''
+            WITH per_track AS (
+                SELECT track_id, artist_id, COUNT(*) AS plays,
+                       MIN(timestamp) AS first_play, MAX(timestamp) AS last_play
+                FROM {plays}
+                WHERE timestamp > {period_sql}
+                GROUP BY track_id
+            ), per_artist AS (
+                SELECT artist_id, SUM(plays) AS plays
+                FROM per_track
+                GROUP BY artist_id
+            )
+            SELECT
+                (SELECT SUM(plays) FROM per_track),
+                (SELECT COUNT(*) FROM per_artist),
+                (SELECT COUNT(*) FROM per_track),
+                a.name, top.plays,
+                (SELECT MIN(first_play) FROM per_track),
+                (SELECT MAX(last_play) FROM per_track)
+            FROM (SELECT 1)
+            LEFT JOIN (
+                SELECT artist_id, plays FROM per_artist ORDER BY plays DESC LIMIT 1
+            ) top
+            LEFT JOIN artists a ON a.id = top.artist_id
+        ''')
 
-        db.close()
+    (total_plays, unique_artists, unique_tracks,
+     top_artist, top_artist_plays, *first_last) = cursor.fetchone()
+    first_play, last_play = mpd_db.local_times(first_last)
+    data = {
+        'period': period,
+        'total_plays': total_plays or 0,
+        'unique_artists': unique_artists,
+        'unique_tracks': unique_tracks,
+        'top_artist': top_artist or "None",
+        'top_artist_plays': top_artist_plays or 0,
+        'first_play': first_play,
+        'last_play': last_play
+    }
 
-        # Create artist info panel
-        first_date = datetime.strptime(first_play, '%Y-%m-%d %H:%M:%S').strftime('%b %d, %Y') if first_play else "Never"
-        last_date = datetime.strptime(last_play, '%Y-%m-%d %H:%M:%S').strftime('%b %d, %Y') if last_play else "Never"
+    if approx:
+        since = period_start(cursor, period)
+        artist_sketch = mpd_db.load_sketch(cursor, 'artists', since)
+        track_sketch = mpd_db.load_sketch(cursor, 'tracks', since)
+        data['unique_artists'] = artist_sketch.count()
+        data['unique_tracks'] = track_sketch.count()
+        data['error'] = artist_sketch.error
 
-        info_text = Text()
-        info_text.append(f"Total plays: ", style="bold")
-        info_text.append(f"{total_plays}\n", style="yellow")
-        info_text.append(f"First play: ", style="bold")
-        info_text.append(f"{first_date}\n", style="dim")
-        info_text.append(f"Last play: ", style="bold")
-        info_text.append(f"{last_date}", style="dim")
+    return data
 
-        console.print(Panel(info_text,
-                          title=f"🎤 {artist_display}",
-                          border_style="cyan",
-                          width=50))
+def render_stats_summary(data):
+    period = data['period']
+    suffix = f" - Last {period}" if period != 'all' else ""
+    if 'range' in data:
+        suffix = f" - {data['range']}"
 
-        # Create tracks table
-        table = Table(
-            title=f"Top {len(results)} Tracks",
-            box=box.ROUNDED,
-            header_style="bold cyan",
-            border_style="green",
-            title_style="bold green",
-            show_header=True
-        )
+    # Create stats table
+    table = Table(
+        title="📊 Listening Statistics" + suffix,
+        box=box.ROUNDED,
+        header_style="bold cyan",
+        border_style="green",
+        title_style="bold green",
+        show_header=False,
+        show_edge=False
+    )
 
-        table.add_column("Rank", style="green", justify="right", width=6)
-        table.add_column("Track", style="blue", min_width=30)
-        table.add_column("Plays", style="yellow", justify="right", width=8)
-        table.add_column("First Play", style="dim", width=12)
-        table.add_column("Last Play", style="dim", width=12)
+    table.add_column("Metric", style="bold cyan", width=20)
+    table.add_column("Value", style="yellow")
+
+    unique_artists = str(data['unique_artists'])
+    unique_tracks = str(data['unique_tracks'])
+    if 'error' in data:
+        unique_artists = f"~{unique_artists} (±{data['error']:.1%})"
+        unique_tracks = f"~{unique_tracks} (±{data['error']:.1%})"
+
+    table.add_row("Total Plays", str(data['total_plays']))
+    table.add_row("Unique Artists", unique_artists)
+    table.add_row("Unique Tracks", unique_tracks)
+    table.add_row("Top Artist", f"{data['top_artist']} ({data['top_artist_plays']} plays)")
+
+    if data['first_play']:
+        table.add_row("First Track", format_day(data['first_play']))
+        table.add_row("Last Track", format_day(data['last_play']))
 
-        for i, (title, plays, first, last) in enumerate(results):
-            first_str = datetime.strptime(first, '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d') if first else ""
-            last_str = datetime.strptime(last, '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d') if last else ""
-            table.add_row(str(i+1), title, str(plays), first_str, last_str)
+    return table
 
-        console.print(table)
+HEATMAP_SHADES = ['  ', '░░', '▒▒', '▓▓', '██']
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+TIMELINE_WIDTH = 40
+
+def _artist_filter(cursor, artist_name, data):
+    """Resolve an artist query to ids, recording the match or suggestions in data"""
+    matches = mpd_db.search_artists(cursor, artist_name)
+    if matches:
+        data['artist'] = matches[0][1]
     else:
-        console.print(f"[red]No tracks found for artist: {artist_name}[/red]")
+        data['suggestions'] = mpd_db.suggest_artists(cursor, artist_name, 5)
+    return [artist_id for artist_id, _ in matches]
 
-        # Show similar artists
+def render_no_artist(data):
+    lines = [f"[red]No plays found for artist: {data['query']}[/red]"]
+    if data['suggestions']:
+        lines.append("\n[yellow]Did you mean one of these?[/yellow]")
+        for artist in data['suggestions']:
+            lines.append(f"  • [cyan]{artist}[/cyan]")
+    return Group(*(Text.from_markup(line) for line in lines))
+
+def query_heatmap(cursor, period='all', artist_name=None):
+    """Plays per weekday and hour, from the hourly buckets"""
+    data = {'period': period, 'query': artist_name, 'grid': [[0] * 24 for _ in WEEKDAYS]}
+    since = period_start(cursor, period) or ''
+
+    if artist_name:
+        artist_ids = _artist_filter(cursor, artist_name, data)
+        if not artist_ids:
+            return data
+        cursor.execute(f'''
+            SELECT strftime('%w', day), hour, SUM(plays)
+            FROM artist_hours
+            WHERE artist_id IN ({', '.join('?' for _ in artist_ids)}) AND day >= ?
+            GROUP BY 1, 2
+        ''', (*artist_ids, since))
+    else:
         cursor.execute('''
-            SELECT DISTINCT artist
-            FROM listening_history
-            WHERE artist LIKE ?
-            LIMIT 5
-        ''', (f'%{artist_name}%',))
-
-        similar = cursor.fetchall()
-        if similar:
-            console.print("\n[yellow]Did you mean one of these?[/yellow]")
-            for artist, in similar:
-                console.print(f"  • [cyan]{artist}[/cyan]")
+            SELECT strftime('%w', day), hour, SUM(plays)
+            FROM play_hours
+            WHERE day >= ?
+            GROUP BY 1, 2
+        ''', (since,))
 
-        db.close()
+    for weekday, hour, plays in cursor:
+        # strftime('%w') counts from Sunday
+        data['grid'][(int(weekday) - 1) % 7][hour] = plays
+    return data
 
-def stats_summary():
-    """Show overall statistics"""
-    db = get_db()
-    cursor = db.cursor()
+def render_heatmap(data):
+    if data['query'] and 'artist' not in data:
+        return render_no_artist(data)
 
-    cursor.execute('SELECT COUNT(*) FROM listening_history')
-    total_plays = cursor.fetchone()[0]
+    period = data['period']
+    peak = max(max(row) for row in data['grid'])
+    if not peak:
+        return f"[yellow]No listening data for the last {period}[/yellow]"
+
+    title = "🔥 Listening Heatmap" + (f" - Last {period}" if period != 'all' else "")
+    if data['query']:
+        title += f" - {data['artist']}"
+
+    table = Table(
+        title=title,
+        box=box.ROUNDED,
+        header_style="bold cyan",
+        border_style="green",
+        title_style="bold green",
+        show_header=True,
+        padding=(0, 0)
+    )
 
-    cursor.execute('SELECT COUNT(DISTINCT artist) FROM listening_history')
-    unique_artists = cursor.fetchone()[0]
+    table.add_column("Day", style="cyan", width=4)
+    for hour in range(24):
+        table.add_column(f"{hour:02d}", justify="center", width=2)
+    table.add_column("Plays", style="yellow", justify="right", width=7)
 
-    cursor.execute('SELECT COUNT(DISTINCT title) FROM listening_history')
-    unique_tracks = cursor.fetchone()[0]
+    for weekday, row in zip(WEEKDAYS, data['grid']):
+        cells = []
+        for plays in row:
+            level = 0 if not plays else 1 + (plays * (len(HEATMAP_SHADES) - 2)) // peak
+            cells.append(Text(HEATMAP_SHADES[level], style="green"))
+        table.add_row(weekday, *cells, str(sum(row)))
 
-    cursor.execute('''
-        SELECT artist, COUNT(*) as plays
-        FROM listening_history
-        GROUP BY artist
-        ORDER BY plays DESC
-        LIMIT 1
-    ''')
-    top_artist_result = cursor.fetchone()
-    top_artist = top_artist_result[0] if top_artist_result else "None"
-    top_artist_plays = top_artist_result[1] if top_artist_result else 0
+    return table
 
-    cursor.execute('SELECT MIN(timestamp), MAX(timestamp) FROM listening_history')
-    first_last = cursor.fetchone()
+def _timeline_bucket(period):
+    if period in ('day', 'week', 'month'):
+        return 'day'
+    return 'week' if period == 'year' else 'month'
 
-    db.close()
+def _bucket_keys(bucket, first, last):
+    """Every bucket key from first to last, so gaps show up as empty rows"""
+    if bucket == 'month':
+        year, month = map(int, first.split('-'))
+        while f"{year:04d}-{month:02d}" <= last:
+            yield f"{year:04d}-{month:02d}"
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return
+
+    step = timedelta(days=7 if bucket == 'week' else 1)
+    day = datetime.strptime(first, '%Y-%m-%d')
+    while day.strftime('%Y-%m-%d') <= last:
+        yield day.strftime('%Y-%m-%d')
+        day += step
+
+def query_timeline(cursor, period='month', artist_name=None):
+    """Plays per day, week or month, from the daily buckets"""
+    bucket = _timeline_bucket(period)
+    data = {'period': period, 'query': artist_name, 'bucket': bucket, 'rows': []}
+    since = period_start(cursor, period) or ''
+
+    key_sql = {
+        'day': 'day',
+        'week': "date(day, '-6 days', 'weekday 1')",
+        'month': 'substr(day, 1, 7)'
+    }[bucket]
+
+    if artist_name:
+        artist_ids = _artist_filter(cursor, artist_name, data)
+        if not artist_ids:
+            return data
+        cursor.execute(f'''
+            SELECT {key_sql}, SUM(plays)
+            FROM artist_days
+            WHERE artist_id IN ({', '.join('?' for _ in artist_ids)}) AND day >= ?
+            GROUP BY 1
+            ORDER BY 1
+        ''', (*artist_ids, since))
+    else:
+        cursor.execute(f'''
+            SELECT {key_sql}, SUM(plays)
+            FROM play_days
+            WHERE day >= ?
+            GROUP BY 1
+            ORDER BY 1
+        ''', (since,))
+
+    counts = dict(cursor.fetchall())
+    if counts:
+        keys = list(counts)
+        data['rows'] = [(key, counts.get(key, 0)) for key in _bucket_keys(bucket, keys[0], keys[-1])]
+    return data
+
+def render_timeline(data):
+    if data['query'] and 'artist' not in data:
+        return render_no_artist(data)
+
+    period = data['period']
+    if not data['rows']:
+        return f"[yellow]No listening data for the last {period}[/yellow]"
+
+    title = "📈 Listening Timeline" + (f" - Last {period}" if period != 'all' else "")
+    if data['query']:
+        title += f" - {data['artist']}"
 
-    # Create stats table
     table = Table(
-        title="📊 Listening Statistics",
+        title=title,
+        box=box.ROUNDED,
+        header_style="bold cyan",
+        border_style="green",
+        title_style="bold green",
+        show_header=True,
+        title_justify="left"
+    )
+
+    table.add_column(data['bucket'].capitalize(), style="cyan", width=10)
+    table.add_column("Plays", style="yellow", justify="right", width=8)
+    table.add_column("", style="green", min_width=TIMELINE_WIDTH)
+
+    peak = max(plays for _, plays in data['rows'])
+    for key, plays in data['rows']:
+        table.add_row(key, str(plays), "█" * round(plays * TIMELINE_WIDTH / peak))
+
+    return table
+
+def query_library_summary(cursor):
+    """Summarize MPD's music library from the index"""
+    index = get_library().index
+    artists = {index.artists[i] for i in range(len(index))}
+    albums = {(index.artists[i], index.albums[i]) for i in range(len(index))}
+    return {
+        'songs': len(index),
+        'artists': len(artists),
+        'albums': len(albums),
+        'total_seconds': int(sum(index.durations)),
+        'database': mpd_library.DATABASE_PATH
+    }
+
+def render_library_summary(data):
+    if not data['songs']:
+        return f"[yellow]No songs found in {data['database']}[/yellow]"
+
+    table = Table(
+        title="💿 Music Library",
         box=box.ROUNDED,
         header_style="bold cyan",
         border_style="green",
@@ -292,75 +882,1114 @@ def stats_summary():
     table.add_column("Metric", style="bold cyan", width=20)
     table.add_column("Value", style="yellow")
 
-    table.add_row("Total Plays", str(total_plays))
-    table.add_row("Unique Artists", str(unique_artists))
-    table.add_row("Unique Tracks", str(unique_tracks))
-    table.add_row("Top Artist", f"{top_artist} ({top_artist_plays} plays)")
+    hours, rest = divmod(data['total_seconds'], 3600)
+    table.add_row("Songs", str(data['songs']))
+    table.add_row("Artists", str(data['artists']))
+    table.add_row("Albums", str(data['albums']))
+    table.add_row("Total Length", f"{hours}h {rest // 60:02d}m")
 
-    if first_last and first_last[0]:
-        first_date = datetime.strptime(first_last[0], '%Y-%m-%d %H:%M:%S').strftime('%b %d, %Y')
-        last_date = datetime.strptime(first_last[1], '%Y-%m-%d %H:%M:%S').strftime('%b %d, %Y')
-        table.add_row("First Track", first_date)
-        table.add_row("Last Track", last_date)
+    return table
 
-    console.print(table)
+COVERAGE_VIEWS = ['artists', 'albums']
+UNPLAYED_KINDS = ['albums', 'tracks', 'once']
+# A song played once and not since is listed by `unplayed once` after this long
+DROPPED_AFTER_DAYS = 90
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="MPD Listening Statistics")
-    parser.add_argument('command', nargs='?', help='Command to execute')
-    parser.add_argument('args', nargs='*', help='Additional arguments')
+listing = None
 
-    args = parser.parse_args()
+def library_index():
+    """The library from MPD's database file, or from `listallinfo` when it cannot be read"""
+    global listing
+    index = get_library().index
+    if len(index):
+        return index
+    if listing is None:
+        try:
+            listing = mpd_library.LibraryIndex.from_mpd()
+        except Exception:
+            listing = mpd_library.LibraryIndex()
+    return listing
 
-    # Handle artist-specific command
-    if args.command and args.command not in ['ta', 'tt', 'rec', 'stats']:
-        if len(args.args) >= 1 and args.args[0].lower() == 'tracks':
-            artist_name = args.command
-            try:
-                limit = int(args.args[1]) if len(args.args) > 1 else 10
-                artist_top_tracks(artist_name, limit)
-            except ValueError:
-                console.print("[red]Error: Please provide a valid number for track count[/red]")
+def library_plays(cursor):
+    """(artist, album, title, plays, last_play) for every library song
+
+    All-time counts come from one pass over track_stats, hashed on
+    (artist, title) like plays are logged, and each song is a single probe
+    into that, so there is no query per song. Also returns how many played
+    tracks are no longer in the library.
+    """
+    cursor.execute('''
+        SELECT a.name, t.title, s.plays, s.last_play
+        FROM track_stats s
+        JOIN tracks t ON t.id = s.track_id
+        JOIN artists a ON a.id = t.artist_id
+        WHERE s.plays > 0
+    ''')
+    played = {(artist, title): (plays, last_play) for artist, title, plays, last_play in cursor}
+
+    songs = []
+    found = set()
+    for artist, album, title in library_index().tags():
+        plays, last_play = played.get((artist, title), (0, None))
+        if plays:
+            found.add((artist, title))
+        songs.append((artist, album, title, plays, last_play))
+    return songs, len(played) - len(found)
+
+def _album_groups(songs):
+    """[songs, played songs, plays] per artist and per (artist, album)"""
+    artists = {}
+    albums = {}
+    for artist, album, _, plays, _ in songs:
+        for groups, key in ((artists, artist), (albums, (artist, album))):
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = [0, 0, 0]
+            group[0] += 1
+            group[1] += plays > 0
+            group[2] += plays
+    return artists, albums
+
+def query_coverage(cursor, view='artists', limit=20):
+    """How much of the library has been played, overall and for the largest artists or albums"""
+    songs, missing = library_plays(cursor)
+    artists, albums = _album_groups(songs)
+    groups = artists if view == 'artists' else albums
+    largest = heapq.nsmallest(limit, groups.items(), key=lambda item: (-item[1][0], item[0]))
+
+    return {
+        'view': view,
+        'songs': len(songs),
+        'played_songs': sum(1 for *_, plays, _ in songs if plays),
+        'artists': len(artists),
+        'played_artists': sum(1 for _, played, _ in artists.values() if played),
+        'albums': len(albums),
+        'played_albums': sum(1 for _, played, _ in albums.values() if played),
+        'complete_albums': sum(1 for count, played, _ in albums.values() if played == count),
+        'missing_tracks': missing,
+        'rows': [(*(key if view == 'albums' else (key,)), *group) for key, group in largest],
+        'database': mpd_library.DATABASE_PATH
+    }
+
+def percent(part, whole):
+    return f"{part * 100 / whole:.1f}%" if whole else "-"
+
+def render_coverage(data):
+    if not data['songs']:
+        return f"[yellow]No songs found in {data['database']} or from MPD[/yellow]"
+
+    summary = Table(
+        title="📀 Library Coverage",
+        box=box.ROUNDED,
+        header_style="bold cyan",
+        border_style="green",
+        title_style="bold green",
+        show_header=True,
+        title_justify="left"
+    )
+
+    summary.add_column("", style="bold cyan", width=16)
+    summary.add_column("Played", style="yellow", justify="right", width=9)
+    summary.add_column("Total", style="yellow", justify="right", width=9)
+    summary.add_column("Coverage", style="magenta", justify="right", width=9)
+
+    for label, played, total in (("Songs", data['played_songs'], data['songs']),
+                                 ("Artists", data['played_artists'], data['artists']),
+                                 ("Albums", data['played_albums'], data['albums']),
+                                 ("Complete albums", data['complete_albums'], data['albums'])):
+        summary.add_row(label, str(played), str(total), percent(played, total))
+    if data['missing_tracks']:
+        summary.caption = f"{data['missing_tracks']} played tracks are no longer in the library"
+
+    albums = data['view'] == 'albums'
+    table = Table(
+        title="Largest " + ("Albums" if albums else "Artists"),
+        box=box.ROUNDED,
+        header_style="bold cyan",
+        border_style="green",
+        title_style="bold green",
+        show_header=True,
+        title_justify="left"
+    )
+
+    table.add_column("Artist", style="cyan", width=24 if albums else 40)
+    if albums:
+        table.add_column("Album", style="blue", width=24)
+    table.add_column("Songs", style="yellow", justify="right", width=7)
+    table.add_column("Played", style="yellow", justify="right", width=7)
+    table.add_column("Coverage", style="magenta", justify="right", width=9)
+    table.add_column("Plays", style="green", justify="right", width=8)
+
+    for *names, songs, played, plays in data['rows']:
+        table.add_row(*names, str(songs), str(played), percent(played, songs), str(plays))
+
+    return Group(summary, table)
+
+def query_unplayed(cursor, kind='albums', limit=20):
+    """Albums or songs never played, or songs played once and dropped, from the library"""
+    songs, _ = library_plays(cursor)
+
+    if kind == 'albums':
+        _, albums = _album_groups(songs)
+        candidates = [(artist, album, count) for (artist, album), (count, played, _) in albums.items()
+                      if not played]
+        rows = heapq.nsmallest(limit, candidates, key=lambda row: (-row[2], row[0], row[1]))
+    elif kind == 'tracks':
+        candidates = [(artist, album, title) for artist, album, title, plays, _ in songs if not plays]
+        rows = heapq.nsmallest(limit, candidates)
+    else:
+        cutoff = int(time.time()) - DROPPED_AFTER_DAYS * 86400
+        candidates = [(artist, album, title, last_play) for artist, album, title, plays, last_play in songs
+                      if plays == 1 and last_play < cutoff]
+        rows = heapq.nsmallest(limit, candidates, key=lambda row: (-row[3], row[0], row[2]))
+        times = mpd_db.local_times([row[3] for row in rows])
+        rows = [(*row[:3], played) for row, played in zip(rows, times)]
+
+    return {
+        'kind': kind,
+        'songs': len(songs),
+        'total': len(candidates),
+        'dropped_after_days': DROPPED_AFTER_DAYS,
+        'rows': rows,
+        'database': mpd_library.DATABASE_PATH
+    }
+
+def render_unplayed(data):
+    if not data['songs']:
+        return f"[yellow]No songs found in {data['database']} or from MPD[/yellow]"
+
+    kind = data['kind']
+    if not data['rows']:
+        return "[yellow]Nothing unplayed in the library[/yellow]"
+
+    titles = {
+        'albums': "🆕 Unplayed Albums",
+        'tracks': "🆕 Unplayed Songs",
+        'once': f"💤 Played Once, Not in {data['dropped_after_days']} Days"
+    }
+    table = Table(
+        title=titles[kind],
+        box=box.ROUNDED,
+        header_style="bold cyan",
+        border_style="green",
+        title_style="bold green",
+        show_header=True,
+        title_justify="left"
+    )
+
+    table.add_column("Artist", style="cyan", width=22)
+    table.add_column("Album", style="blue", width=22)
+    if kind == 'albums':
+        table.add_column("Songs", style="yellow", justify="right", width=7)
+    else:
+        table.add_column("Title", style="yellow", width=30)
+    if kind == 'once':
+        table.add_column("Played", style="green", width=12)
+
+    for row in data['rows']:
+        if kind == 'albums':
+            table.add_row(row[0], row[1], str(row[2]))
+        elif kind == 'tracks':
+            table.add_row(*row)
         else:
-            console.print(f"[red]Unknown command: {args.command}[/red]")
-            console.print("Available commands: [cyan]top-artists[/cyan], [cyan]top-tracks[/cyan], [cyan]recent[/cyan], [cyan]stats[/cyan]")
-            console.print("Or use: [cyan]<artist_name> tracks <number>[/cyan]")
-    elif args.command == 'ta':
-        period = 'all'
-        limit = 10
-        if args.args:
-            period = args.args[0] if args.args[0] in ['day', 'week', 'month', 'year', 'all'] else 'all'
-            if len(args.args) > 1:
-                try:
-                    limit = int(args.args[1])
-                except ValueError:
-                    pass
-        top_artists(period, limit)
-    elif args.command == 'tt':
+            table.add_row(*row[:3], format_day(row[3]))
+
+    table.caption = f"{len(data['rows'])} of {data['total']}"
+    return table
+
+def format_seconds(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    return f"{hours}h {rest // 60:02d}m"
+
+def query_sessions(cursor, period='all', limit=10):
+    """Longest listening sessions, read from the session summaries"""
+    period_sql = PERIOD_SQL.get(period, PERIOD_SQL['all'])
+    cursor.execute(f'''
+        SELECT COUNT(*), COALESCE(SUM(seconds), 0), COALESCE(SUM(plays), 0)
+        FROM sessions
+        WHERE start > {period_sql}
+    ''')
+    count, seconds, plays = cursor.fetchone()
+
+    cursor.execute(f'''
+        SELECT start, end, plays, seconds
+        FROM sessions
+        WHERE start > {period_sql}
+        ORDER BY seconds DESC
+        LIMIT ?
+    ''', (limit,))
+    rows = cursor.fetchall()
+    starts = mpd_db.local_times([start for start, *_ in rows])
+    ends = mpd_db.local_times([end for _, end, *_ in rows])
+
+    return {
+        'period': period,
+        'sessions': count,
+        'seconds': seconds,
+        'plays': plays,
+        'gap_minutes': mpd_db.SESSION_GAP // 60,
+        'rows': [(start, end, *row[2:]) for row, start, end in zip(rows, starts, ends)]
+    }
+
+def render_sessions(data):
+    period = data['period']
+    if not data['rows']:
+        return f"[yellow]No listening sessions for the last {period}[/yellow]"
+
+    table = Table(
+        title="🎧 Longest Sessions" + (f" - Last {period}" if period != 'all' else ""),
+        box=box.ROUNDED,
+        header_style="bold cyan",
+        border_style="green",
+        title_style="bold green",
+        show_header=True,
+        title_justify="left"
+    )
+
+    table.add_column("Rank", style="green", justify="right", width=6)
+    table.add_column("Start", style="cyan", width=16)
+    table.add_column("End", style="cyan", width=16)
+    table.add_column("Plays", style="yellow", justify="right", width=8)
+    table.add_column("Listened", style="magenta", justify="right", width=9)
+
+    for i, (start, end, plays, seconds) in enumerate(data['rows']):
+        table.add_row(str(i + 1), start[:16], end[:16], str(plays), format_seconds(seconds))
+
+    average = data['seconds'] / data['sessions']
+    table.caption = (f"{data['sessions']} sessions, {format_seconds(average)} on average "
+                     f"(split after {data['gap_minutes']} min of silence)")
+    return table
+
+def query_streaks(cursor, limit=5):
+    """Runs of consecutive listening days, from the per-day play counts"""
+    cursor.execute('''
+        WITH runs AS (
+            SELECT day, plays, julianday(day) - ROW_NUMBER() OVER (ORDER BY day) AS run
+            FROM play_days
+            WHERE plays > 0
+        )
+        SELECT MIN(day), MAX(day), COUNT(*), SUM(plays)
+        FROM runs
+        GROUP BY run
+        ORDER BY MIN(day)
+    ''')
+    runs = cursor.fetchall()
+
+    cursor.execute("SELECT date('now', 'localtime', '-1 day')")
+    yesterday = cursor.fetchone()[0]
+    current = runs[-1] if runs and runs[-1][1] >= yesterday else None
+
+    longest = sorted(runs, key=lambda run: (run[2], run[0]), reverse=True)[:limit]
+    return {
+        'active_days': sum(run[2] for run in runs),
+        'current': current,
+        'rows': longest
+    }
+
+def render_streaks(data):
+    if not data['rows']:
+        return "[yellow]No listening history yet[/yellow]"
+
+    table = Table(
+        title="🔥 Listening Streaks",
+        box=box.ROUNDED,
+        header_style="bold cyan",
+        border_style="green",
+        title_style="bold green",
+        show_header=True,
+        title_justify="left"
+    )
+
+    table.add_column("Rank", style="green", justify="right", width=6)
+    table.add_column("Days", style="yellow", justify="right", width=6)
+    table.add_column("From", style="cyan", width=12)
+    table.add_column("To", style="cyan", width=12)
+    table.add_column("Plays", style="yellow", justify="right", width=8)
+
+    for i, (first, last, days, plays) in enumerate(data['rows']):
+        table.add_row(str(i + 1), str(days), first, last, str(plays))
+
+    if data['current']:
+        first, _, days, _ = data['current']
+        table.caption = (f"Current streak: {days} day{'s' if days != 1 else ''} since {first} "
+                         f"({data['active_days']} active days)")
+    else:
+        table.caption = f"No current streak ({data['active_days']} active days)"
+    return table
+
+def query_dashboard(cursor, limit=10):
+    """Top artists and tracks for every period from a single scan of the last year
+
+    Each play in the year window is counted once per track, with a
+    conditional SUM per shorter period; artist counts are summed from the
+    track counts and all-time tops come from the rollups.
+    """
+    windows = [period for period in PERIODS if period != 'all']
+    cursor.execute('SELECT ' + ', '.join(PERIOD_SQL[period] for period in windows))
+    epochs = cursor.fetchone()
+
+    # Grouping on +track_id keeps SQLite on the timestamp index: a range scan
+    # plus a sort of the year's plays, instead of walking idx_plays_track
+    # through the whole history
+    plays = mpd_db.plays_sql(cursor, period_start(cursor, windows[-1]))
+    cursor.execute(f'''
+        SELECT track_id, artist_id, {', '.join('SUM(timestamp > ?)' for _ in windows[:-1])}, COUNT(*)
+        FROM {plays}
+        WHERE timestamp > ?
+        GROUP BY +track_id
+    ''', (*epochs[:-1], epochs[-1]))
+
+    track_counts = {period: {} for period in windows}
+    artist_counts = {period: {} for period in windows}
+    for track_id, artist_id, *counts in cursor:
+        for period, count in zip(windows, counts):
+            if count:
+                track_counts[period][track_id] = count
+                artists = artist_counts[period]
+                artists[artist_id] = artists.get(artist_id, 0) + count
+
+    def top(counts):
+        return heapq.nsmallest(limit, counts.items(), key=lambda item: (-item[1], item[0]))
+
+    top_artists = {period: top(artist_counts[period]) for period in windows}
+    top_tracks = {period: top(track_counts[period]) for period in windows}
+    cursor.execute('SELECT artist_id, plays FROM artist_stats ORDER BY plays DESC LIMIT ?', (limit,))
+    top_artists['all'] = cursor.fetchall()
+    cursor.execute('SELECT track_id, plays FROM track_stats ORDER BY plays DESC LIMIT ?', (limit,))
+    top_tracks['all'] = cursor.fetchall()
+
+    artist_names = lookup_names(cursor, 'SELECT id, name FROM artists WHERE id IN ({})',
+                                list({i for rows in top_artists.values() for i, _ in rows}))
+    track_names = lookup_names(cursor, '''
+        SELECT t.id, a.name, t.title
+        FROM tracks t
+        JOIN artists a ON a.id = t.artist_id
+        WHERE t.id IN ({})
+    ''', list({i for rows in top_tracks.values() for i, _ in rows}))
+
+    return {
+        'periods': PERIODS,
+        'artists': {period: [(*artist_names[i], plays) for i, plays in rows]
+                    for period, rows in top_artists.items()},
+        'tracks': {period: [(*track_names[i], plays) for i, plays in rows]
+                   for period, rows in top_tracks.items()}
+    }
+
+def render_dashboard(data):
+    if not data['artists']['all']:
+        return "[yellow]No listening history yet[/yellow]"
+
+    tables = []
+    for kind, title in (('artists', "🎤 Top Artists"), ('tracks', "🎵 Top Tracks")):
+        table = Table(
+            title=title,
+            box=box.ROUNDED,
+            header_style="bold cyan",
+            border_style="green",
+            title_style="bold green",
+            show_header=True,
+            title_justify="left",
+            expand=True
+        )
+
+        table.add_column("#", style="green", justify="right", width=3)
+        for period in data['periods']:
+            table.add_column("All Time" if period == 'all' else f"Last {period}",
+                             style="cyan", ratio=1, no_wrap=True, overflow="ellipsis")
+
+        columns = [data[kind][period] for period in data['periods']]
+        for i in range(max(len(rows) for rows in columns)):
+            cells = []
+            for rows in columns:
+                if i >= len(rows):
+                    cells.append("")
+                    continue
+                *names, plays = rows[i]
+                # Plays first, so narrow columns cut the name instead
+                cells.append(Text.assemble((str(plays), "yellow"), ' ', ' - '.join(names)))
+            table.add_row(str(i + 1), *cells)
+        tables.append(table)
+
+    return Group(*tables)
+
+REPORTS = {
+    'ta': (query_top_artists, render_top_artists),
+    'tt': (query_top_tracks, render_top_tracks),
+    'rec': (query_recent_tracks, render_recent_tracks),
+    'stats': (query_stats_summary, render_stats_summary),
+    'tracks': (query_artist_top_tracks, render_artist_top_tracks),
+    'library': (query_library_summary, render_library_summary),
+    'coverage': (query_coverage, render_coverage),
+    'unplayed': (query_unplayed, render_unplayed),
+    'heatmap': (query_heatmap, render_heatmap),
+    'timeline': (query_timeline, render_timeline),
+    'sessions': (query_sessions, render_sessions),
+    'streaks': (query_streaks, render_streaks),
+    'dashboard': (query_dashboard, render_dashboard),
+}
+
+# Reports mpd_analytics can answer from the exported columns
+COLUMNAR_REPORTS = ['ta', 'tt', 'stats']
+EXPORT_FORMATS = ['npy', 'parquet']
+
+# Reports whose rows can be streamed straight off the cursor, with their column names
+ROW_REPORTS = {
+    'ta': (select_top_artists, ['artist', 'plays']),
+    'tt': (select_top_tracks, ['artist', 'title', 'plays']),
+    'rec': (select_recent_tracks, ['timestamp', 'artist', 'title', 'album', 'id']),
+}
+OUTPUT_FORMATS = ['table', 'jsonl', 'tsv']
+
+def parse_command(command, args, approx=False, before=None, since=None, until=None):
+    """Turn CLI words into a report name and its query arguments
+
+    Raises ValueError with a printable message for bad input.
+    """
+    name, kwargs = parse_report_words(command, args, approx, before)
+    if since or until:
+        if name not in RANGE_REPORTS:
+            raise ValueError(f"[red]--since/--until only apply to: {', '.join(RANGE_REPORTS)}[/red]")
+        kwargs['since'], kwargs['until'] = parse_range(since, until)
+    return name, kwargs
+
+def parse_report_words(command, args, approx=False, before=None):
+    if command in ['ta', 'tt']:
         period = 'all'
         limit = 10
-        if args.args:
-            period = args.args[0] if args.args[0] in ['day', 'week', 'month', 'year', 'all'] else 'all'
-            if len(args.args) > 1:
+        if args and args[0].isdigit():
+            args = ['all', *args]
+        if args:
+            period = args[0] if args[0] in PERIODS else 'all'
+            if len(args) > 1:
                 try:
-                    limit = int(args.args[1])
+                    limit = int(args[1])
                 except ValueError:
                     pass
-        top_tracks(period, limit)
-    elif args.command == 'rec':
+        return command, {'period': period, 'limit': limit}
+    elif command == 'rec':
         limit = 20
-        if args.args:
+        if args:
             try:
-                limit = int(args.args[0])
+                limit = int(args[0])
             except ValueError:
                 pass
-        recent_tracks(limit)
-    elif args.command == 'stats':
-        stats_summary()
+        if before:
+            parse_before(before)
+        return command, {'limit': limit, 'before': before}
+    elif command == 'stats':
+        period = args[0] if args and args[0] in PERIODS else 'all'
+        return command, {'period': period, 'approx': approx}
+    elif command == 'library':
+        return command, {}
+    elif command == 'sessions':
+        period = 'all'
+        if args and args[0] in PERIODS:
+            period, args = args[0], args[1:]
+        limit = int(args[0]) if args and args[0].isdigit() else 10
+        return command, {'period': period, 'limit': limit}
+    elif command in ['coverage', 'unplayed']:
+        choices = COVERAGE_VIEWS if command == 'coverage' else UNPLAYED_KINDS
+        choice = choices[0]
+        if args and args[0] in choices:
+            choice, args = args[0], args[1:]
+        limit = int(args[0]) if args and args[0].isdigit() else 20
+        return command, {'view' if command == 'coverage' else 'kind': choice, 'limit': limit}
+    elif command == 'dashboard':
+        return command, {'limit': int(args[0]) if args and args[0].isdigit() else 10}
+    elif command == 'streaks':
+        return command, {'limit': int(args[0]) if args and args[0].isdigit() else 5}
+    elif command in ['heatmap', 'timeline']:
+        period = 'all' if command == 'heatmap' else 'month'
+        if args and args[0] in PERIODS:
+            period, args = args[0], args[1:]
+        return command, {'period': period, 'artist_name': ' '.join(args) or None}
+    elif len(args) >= 1 and args[0].lower() == 'tracks':
+        try:
+            limit = int(args[1]) if len(args) > 1 else 10
+        except ValueError:
+            raise ValueError("[red]Error: Please provide a valid number for track count[/red]")
+        return 'tracks', {'artist_name': command, 'limit': limit}
+
+    raise ValueError(
+        f"[red]Unknown command: {command}[/red]\n"
+        "Available commands: [cyan]ta[/cyan], [cyan]tt[/cyan], [cyan]rec[/cyan], [cyan]stats[/cyan], "
+        "[cyan]heatmap[/cyan], [cyan]timeline[/cyan], [cyan]sessions[/cyan], [cyan]streaks[/cyan], "
+        "[cyan]dashboard[/cyan], [cyan]library[/cyan], [cyan]coverage[/cyan], [cyan]unplayed[/cyan], "
+        "[cyan]rebuild[/cyan], "
+        "[cyan]serve[/cyan], [cyan]watch[/cyan], [cyan]import-log[/cyan], [cyan]export[/cyan], [cyan]batch[/cyan], "
+        "[cyan]archive[/cyan]\n"
+        "Or use: [cyan]<artist_name> tracks <number>[/cyan]"
+    )
+
+def run_report(cursor, name, kwargs, engine='sql'):
+    # Date ranges are answered from the running totals, whatever the engine
+    if engine == 'numpy' and name in COLUMNAR_REPORTS and 'since' not in kwargs:
+        # NumPy is only needed by the columnar engine
+        import mpd_analytics
+        return mpd_analytics.REPORTS[name](cursor, **kwargs)
+    query, _ = REPORTS[name]
+    return query(cursor, **kwargs)
+
+def render_report(name, data):
+    _, render = REPORTS[name]
+    return render(data)
+
+def show_report(name, engine='sql', **kwargs):
+    db = get_db()
+    data = run_report(db.cursor(), name, kwargs, engine)
+    db.close()
+
+    console.print(render_report(name, data))
+
+def tsv_field(value):
+    if value is None:
+        return ''
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+def stream_report(name, kwargs, engine='sql', fmt='jsonl', out=None):
+    """Write report rows as JSON Lines or TSV while they are read from the cursor"""
+    out = out or sys.stdout
+    if name not in ROW_REPORTS and fmt == 'tsv':
+        console.print(f"[red]TSV output is only available for: {', '.join(ROW_REPORTS)}[/red]")
+        return
+
+    db = get_db()
+    try:
+        if name not in ROW_REPORTS:
+            out.write(json.dumps(run_report(db.cursor(), name, kwargs, engine)) + '\n')
+            return
+
+        select, columns = ROW_REPORTS[name]
+        if engine == 'numpy' and name in COLUMNAR_REPORTS and 'since' not in kwargs:
+            rows = run_report(db.cursor(), name, kwargs, engine)['rows']
+        else:
+            rows = select(db.cursor(), **kwargs)
+
+        if fmt == 'tsv':
+            out.write('\t'.join(columns) + '\n')
+        for row in rows:
+            if fmt == 'jsonl':
+                out.write(json.dumps(dict(zip(columns, row))) + '\n')
+            else:
+                out.write('\t'.join(tsv_field(value) for value in row) + '\n')
+        out.flush()
+    except BrokenPipeError:
+        # The reader went away (`| head`); keep the exit-time flush quiet
+        os.dup2(os.open(os.devnull, os.O_WRONLY), out.fileno())
+    finally:
+        db.close()
+
+def render_profile(queries, timings):
+    table = Table(
+        title="⏱ Profile",
+        box=box.ROUNDED,
+        header_style="bold cyan",
+        border_style="green",
+        title_style="bold green",
+        show_header=True,
+        show_lines=True,
+        title_justify="left"
+    )
+
+    table.add_column("#", style="green", justify="right", width=3)
+    table.add_column("ms", style="yellow", justify="right", width=9)
+    table.add_column("Rows", style="yellow", justify="right", width=6)
+    table.add_column("Query and plan", style="cyan")
+
+    for i, query in enumerate(queries):
+        cell = Text(' '.join(query['sql'].split()))
+        if query['plan']:
+            cell.append('\n' + mpd_metrics.format_plan(query['plan']), style="dim")
+        table.add_row(str(i + 1), f"{query['seconds'] * 1000:.2f}", str(query['rows']), cell)
+
+    sql_seconds = sum(query['seconds'] for query in queries)
+    summary = Text()
+    for label, seconds in [("connect + schema check", timings['connect']),
+                           ("SQL", sql_seconds),
+                           ("report code outside SQL", timings['query'] - sql_seconds),
+                           ("render + print", timings['render'])]:
+        summary.append(f"{label}: ", style="bold")
+        summary.append(f"{seconds * 1000:.2f} ms\n", style="yellow")
+    summary.rstrip()
+
+    return Group(table, summary)
+
+def profile_report(name, kwargs, engine='sql', as_json=False):
+    """Run a report printing wall time and EXPLAIN QUERY PLAN for every query"""
+    timings = {}
+    started = time.perf_counter()
+    db = get_db()
+    timings['connect'] = time.perf_counter() - started
+
+    cursor = mpd_metrics.ProfilingCursor(db.cursor())
+    started = time.perf_counter()
+    data = run_report(cursor, name, kwargs, engine)
+    timings['query'] = time.perf_counter() - started
+    db.close()
+
+    started = time.perf_counter()
+    if as_json:
+        print(json.dumps(data))
+    else:
+        console.print(render_report(name, data))
+    timings['render'] = time.perf_counter() - started
+
+    # Keep stdout parseable when it carries JSON
+    out = Console(stderr=True) if as_json else console
+    out.print(render_profile(cursor.queries, timings))
+
+def top_artists(period='all', limit=10):
+    """Get top artists for a given period"""
+    show_report('ta', period=period, limit=limit)
+
+def top_tracks(period='all', limit=10):
+    """Get top tracks for a given period"""
+    show_report('tt', period=period, limit=limit)
+
+def recent_tracks(limit=20):
+    """Get recently played tracks"""
+    show_report('rec', limit=limit)
+
+def artist_top_tracks(artist_name, limit=10):
+    """Get top tracks for a specific artist"""
+    show_report('tracks', artist_name=artist_name, limit=limit)
+
+def stats_summary(period='all', approx=False):
+    """Show overall statistics"""
+    show_report('stats', period=period, approx=approx)
+
+def rebuild_cache():
+    """Recompute the play count rollups from the full history"""
+    db = get_db()
+    mpd_db.rebuild_stats_cache(db)
+    db.close()
+
+    console.print("[green]Stats cache rebuilt[/green]")
+
+def import_log(paths, source='mpd'):
+    """Backfill listening history from MPD's log files"""
+    paths = paths or mpd_import.default_log_files()
+    if not paths:
+        console.print("[yellow]No MPD log files found[/yellow]")
+        return
+
+    def progress(lines, imported, elapsed):
+        console.print(f"[dim]{lines} lines, {imported} plays "
+                      f"({lines / max(elapsed, 1e-9):.0f} lines/s)[/dim]")
+
+    db = get_db()
+    started = datetime.now()
+    lines, imported, skipped = mpd_import.import_logs(db, paths, source, progress)
+    db.close()
+
+    seconds = (datetime.now() - started).total_seconds()
+    console.print(f"[green]Imported {imported} plays[/green] from {lines} log lines "
+                  f"in {seconds:.1f}s ({skipped} already logged)")
+
+def export(args):
+    """Dump listening history to a columnar snapshot for the numpy engine"""
+    import mpd_analytics
+
+    fmt = args[0] if args and args[0] in EXPORT_FORMATS else 'npy'
+    path = args[1] if len(args) > 1 else mpd_analytics.SNAPSHOT_DIR
+
+    db = get_db()
+    started = datetime.now()
+    try:
+        rows = mpd_analytics.export_snapshot(db, path, fmt)
+    except RuntimeError as e:
+        console.print(f"[red]{e}[/red]")
+        return
+    finally:
+        db.close()
+
+    seconds = (datetime.now() - started).total_seconds()
+    console.print(f"[green]Exported {rows} plays[/green] to {path} ({fmt}) in {seconds:.1f}s")
+
+def read_batch_commands(args):
+    """Command lines from the arguments, from @file arguments, or from stdin"""
+    lines = []
+    for arg in args or ['-']:
+        if arg == '-':
+            lines.extend(sys.stdin)
+        elif arg.startswith('@'):
+            with open(os.path.expanduser(arg[1:])) as f:
+                lines.extend(f)
+        else:
+            lines.append(arg)
+
+    commands = []
+    for line in lines:
+        words = shlex.split(line, comments=True)
+        # Unquoted artist names: `Alice In Chains tracks 5`
+        if words and words[0] not in REPORTS and 'tracks' in words[2:]:
+            split = words.index('tracks', 2)
+            words = [' '.join(words[:split]), *words[split:]]
+        if words:
+            commands.append(words)
+    return commands
+
+def batch(args, engine='sql', approx=False, as_json=False):
+    """Run many reports on one connection, all reading the same snapshot"""
+    try:
+        commands = read_batch_commands(args)
+    except (OSError, ValueError) as e:
+        console.print(f"[red]Could not read batch commands: {e}[/red]")
+        return
+
+    parser = build_parser(LineParser)
+    db = get_db()
+    cursor = db.cursor()
+    # A WAL read transaction pins the snapshot taken by the first query
+    cursor.execute('BEGIN')
+    try:
+        for words in commands:
+            line = shlex.join(words)
+            try:
+                # Lines may carry their own --since/--until/--before
+                line_args = parser.parse_args(words)
+                name, kwargs = parse_command(line_args.command, line_args.args, approx or line_args.approx,
+                                             line_args.before, line_args.since, line_args.until)
+                data = run_report(cursor, name, kwargs, engine)
+            except SystemExit:
+                # --help printed its text; there is no report to run
+                continue
+            except (ValueError, sqlite3.OperationalError) as e:
+                # One line per failed command, the rest of the batch still runs;
+                # archives read under the snapshot stay attached until it ends,
+                # so a line needing more than SQLite attaches fails here too
+                text = str(e) if isinstance(e, ValueError) else escape(str(e))
+                message = ' '.join(Text.from_markup(text).plain.split())
+                if as_json:
+                    print(json.dumps({'command': line, 'error': message}))
+                else:
+                    console.print(Text(f"{line}: {message}", style="red"), soft_wrap=True)
+                continue
+
+            if as_json:
+                print(json.dumps({'command': line, 'report': name, 'data': data}))
+            else:
+                console.print(render_report(name, data))
+    finally:
+        db.rollback()
+        db.close()
+
+def archive(args):
+    """Move plays from before a year (default: this year) into yearly archive databases"""
+    year = int(args[0]) if args and args[0].isdigit() else datetime.now().year
+
+    db = get_db()
+    started = datetime.now()
+    moved = mpd_db.archive_plays(db, year)
+    db.close()
+
+    if not moved:
+        console.print(f"[yellow]No plays before {year} left to archive[/yellow]")
+        return
+    seconds = (datetime.now() - started).total_seconds()
+    for archived_year, plays in moved.items():
+        console.print(f"[green]{archived_year}[/green]: {plays} plays archived")
+    console.print(f"[dim]Archives in {mpd_db.ARCHIVE_DIR}, compacted in {seconds:.1f}s[/dim]")
+
+def render_to_string(renderable, width=100, color=False):
+    out = Console(file=io.StringIO(), width=width, force_terminal=color,
+                  color_system="truecolor" if color else None)
+    out.print(renderable)
+    return out.file.getvalue()
+
+def serve(socket_path=SOCKET_PATH):
+    """Answer report requests over a Unix socket from one long-lived connection
+
+    Each request is a single JSON line {"argv": [...], "format": "json"|"table",
+    "width": int, "color": bool}; the reply is the JSON result or the rendered
+    table, after which the server closes the connection. Results are cached
+    until PRAGMA data_version reports a commit from another connection or the
+    local day changes, which moves every relative period.
+    """
+    db = get_db()
+    cursor = db.cursor()
+    parser = build_parser(LineParser)
+    cache = {}
+    data_version = None
+    cache_day = None
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            nonlocal data_version, cache_day
+            try:
+                request = json.loads(self.rfile.readline())
+                args = parser.parse_args(request.get('argv', []))
+                name, kwargs = parse_command(args.command, args.args, args.approx, args.before,
+                                             args.since, args.until)
+            except (ValueError, SystemExit) as e:
+                message = str(e) if isinstance(e, ValueError) else "Invalid arguments"
+                self.wfile.write(render_to_string(Text.from_markup(message, style="red")).encode())
+                return
+
+            cursor.execute('PRAGMA data_version')
+            version = cursor.fetchone()[0]
+            today = date.today()
+            if get_library().refresh() or version != data_version or today != cache_day:
+                cache.clear()
+                data_version = version
+                cache_day = today
+
+            key = (name, args.engine, json.dumps(kwargs, sort_keys=True))
+            if key not in cache:
+                cache[key] = run_report(cursor, name, kwargs, args.engine)
+                # One connection serves for days, so archives go back after every report
+                mpd_db.release_partitions(cursor)
+            data = cache[key]
+
+            if request.get('format') == 'json':
+                output = json.dumps(data) + '\n'
+            else:
+                output = render_to_string(render_report(name, data),
+                                          request.get('width', 100),
+                                          request.get('color', False))
+            self.wfile.write(output.encode())
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    with socketserver.UnixStreamServer(socket_path, Handler) as server:
+        os.chmod(socket_path, 0o600)
+        console.print(f"[green]Serving stats on {socket_path}[/green]")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(socket_path)
+            db.close()
+
+class LiveStats:
+    """All-time aggregates held in memory and advanced by the plays committed since the last poll
+
+    Counts start from the artist/track rollups; afterwards every poll reads
+    only plays with an id above the last one seen, and only when PRAGMA
+    data_version says another connection has committed. Counts never go
+    down, so the top lists are kept exact by letting a bumped id replace
+    the smallest entry instead of re-ranking everything.
+    """
+
+    def __init__(self, cursor, limit=WATCH_LIMIT, recent=WATCH_RECENT):
+        self.cursor = cursor
+        self.limit = limit
+        cursor.execute('PRAGMA data_version')
+        self.version = cursor.fetchone()[0]
+
+        # One read transaction, so the rollups and last_id agree
+        cursor.execute('BEGIN')
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM plays')
+        self.last_id = cursor.fetchone()[0]
+        cursor.execute('SELECT artist_id, plays FROM artist_stats WHERE plays > 0')
+        self.artist_plays = dict(cursor)
+        cursor.execute('SELECT track_id, plays FROM track_stats WHERE plays > 0')
+        self.track_plays = dict(cursor)
+        cursor.execute('SELECT MIN(first_play), MAX(last_play) FROM artist_stats')
+        self.first_play, self.last_play = cursor.fetchone()
+        cursor.execute("SELECT day, plays FROM play_days WHERE day = date('now', 'localtime')")
+        self.day_plays = dict(cursor)
+
+        cursor.execute('''
+            SELECT s.artist_id, a.name
+            FROM artist_stats s
+            JOIN artists a ON a.id = s.artist_id
+            ORDER BY s.plays DESC
+            LIMIT ?
+        ''', (limit,))
+        self.artist_names = dict(cursor)
+        cursor.execute('''
+            SELECT s.track_id, a.name, t.title
+            FROM track_stats s
+            JOIN tracks t ON t.id = s.track_id
+            JOIN artists a ON a.id = t.artist_id
+            ORDER BY s.plays DESC
+            LIMIT ?
+        ''', (limit,))
+        self.track_names = {track_id: names for track_id, *names in cursor}
+        cursor.execute('COMMIT')
+
+        # Read after the transaction, since archives cannot be detached inside
+        # it; plays newer than last_id are left for the first poll
+        self.recent = deque((row for row in select_recent_tracks(cursor, recent) if row[4] <= self.last_id),
+                            maxlen=recent)
+
+        self.total = sum(self.artist_plays.values())
+        self.top_artists = [i for i in self.artist_names if i in self.artist_plays]
+        self.top_tracks = [i for i in self.track_names if i in self.track_plays]
+
+    def _bump(self, plays, top, key):
+        plays[key] = plays.get(key, 0) + 1
+        if key not in top:
+            if len(top) < self.limit:
+                top.append(key)
+            elif plays[key] > plays[top[-1]]:
+                top[-1] = key
+            else:
+                return
+        top.sort(key=lambda i: -plays[i])
+
+    def poll(self):
+        """Fold in plays committed since the last call, returning whether there were any"""
+        cursor = self.cursor
+        cursor.execute('PRAGMA data_version')
+        version = cursor.fetchone()[0]
+        if version == self.version:
+            return False
+        self.version = version
+
+        cursor.execute('''
+            SELECT p.id, p.timestamp, p.artist_id, p.track_id, a.name, t.title, al.name
+            FROM plays p
+            JOIN artists a ON a.id = p.artist_id
+            JOIN tracks t ON t.id = p.track_id
+            LEFT JOIN albums al ON al.id = p.album_id
+            WHERE p.id > ?
+            ORDER BY p.id
+        ''', (self.last_id,))
+        rows = cursor.fetchall()
+
+        times = mpd_db.local_times([row[1] for row in rows])
+        for (play_id, timestamp, artist_id, track_id, artist, title, album), local in zip(rows, times):
+            self.total += 1
+            self.artist_names[artist_id] = artist
+            self.track_names[track_id] = (artist, title)
+            self._bump(self.artist_plays, self.top_artists, artist_id)
+            self._bump(self.track_plays, self.top_tracks, track_id)
+            self.day_plays[local[:10]] = self.day_plays.get(local[:10], 0) + 1
+            self.first_play = min(self.first_play or timestamp, timestamp)
+            self.last_play = max(self.last_play or timestamp, timestamp)
+            self.recent.appendleft((local, artist, title, album, play_id))
+            self.last_id = play_id
+        return bool(rows)
+
+    def render(self):
+        top = self.top_artists[0] if self.top_artists else None
+        first_play, last_play = mpd_db.local_times((self.first_play, self.last_play))
+        summary = render_stats_summary({
+            'period': 'all',
+            'total_plays': self.total,
+            'unique_artists': len(self.artist_plays),
+            'unique_tracks': len(self.track_plays),
+            'top_artist': self.artist_names[top] if top else "None",
+            'top_artist_plays': self.artist_plays[top] if top else 0,
+            'first_play': first_play,
+            'last_play': last_play
+        })
+        artists = render_top_artists({
+            'period': 'all',
+            'rows': [(self.artist_names[i], self.artist_plays[i]) for i in self.top_artists]
+        })
+        tracks = render_top_tracks({
+            'period': 'all',
+            'rows': [(*self.track_names[i], self.track_plays[i]) for i in self.top_tracks]
+        })
+
+        tops = Table.grid(padding=(0, 2))
+        tops.add_row(artists, tracks)
+        today = self.day_plays.get(date.today().isoformat(), 0)
+        status = Text.from_markup(f"[dim]Updated {datetime.now():%H:%M:%S} · "
+                                  f"{today} play{'s' if today != 1 else ''} today · Ctrl+C to quit[/dim]")
+        return Group(summary, tops, render_recent_tracks({'rows': list(self.recent)}), status)
+
+def watch(args):
+    """Redraw a live dashboard whenever new plays are committed"""
+    limit = int(args[0]) if args and args[0].isdigit() else WATCH_LIMIT
+    db = get_db()
+    stats = LiveStats(db.cursor(), limit)
+    try:
+        with Live(stats.render(), console=console, screen=True, auto_refresh=False) as live:
+            while True:
+                time.sleep(WATCH_INTERVAL)
+                if stats.poll():
+                    live.update(stats.render(), refresh=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db.close()
+
+class LineParser(argparse.ArgumentParser):
+    """Parser for batch and serve lines: a bad line raises instead of printing usage and exiting"""
+
+    def error(self, message):
+        raise ValueError(escape(f"Invalid arguments: {message}"))
+
+def build_parser(parser_class=argparse.ArgumentParser):
+    parser = parser_class(description="MPD Listening Statistics")
+    parser.add_argument('command', nargs='?', help='Command to execute')
+    parser.add_argument('args', nargs='*', help='Additional arguments')
+    parser.add_argument('--approx', action='store_true',
+                        help='Estimate distinct counts from HyperLogLog sketches in stats')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the report data as JSON instead of a table')
+    parser.add_argument('--socket', default=SOCKET_PATH,
+                        help='Unix socket path for serve')
+    parser.add_argument('--source', default='mpd',
+                        help='Checkpoint name for import-log')
+    parser.add_argument('--engine', choices=['sql', 'numpy'], default='sql',
+                        help='Answer ta/tt/stats from the exported NumPy snapshot')
+    parser.add_argument('--profile', action='store_true',
+                        help='Show wall time and EXPLAIN QUERY PLAN for each query')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='table',
+                        help='Stream ta/tt/rec rows as JSON Lines or TSV instead of a table')
+    parser.add_argument('--before', metavar='EPOCH[,ID]',
+                        help="Page through rec: only plays older than this cursor")
+    parser.add_argument('--since', metavar='DATE',
+                        help="Start of a ta/tt/stats range: 2024, 2024-03, 'March 2024', 'last 90 days'")
+    parser.add_argument('--until', metavar='DATE',
+                        help='End of the range, inclusive of the whole span (default: today)')
+    return parser
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+
+    if args.command == 'rebuild':
+        rebuild_cache()
+    elif args.command == 'serve':
+        serve(args.socket)
+    elif args.command == 'import-log':
+        import_log(args.args, args.source)
+    elif args.command == 'export':
+        export(args.args)
+    elif args.command == 'batch':
+        batch(args.args, args.engine, args.approx, args.json)
+    elif args.command == 'archive':
+        archive(args.args)
+    elif args.command == 'watch':
+        watch(args.args)
+    elif args.command:
+        try:
+            name, kwargs = parse_command(args.command, args.args, args.approx, args.before,
+                                         args.since, args.until)
+        except ValueError as e:
+            console.print(str(e))
+        else:
+            if args.profile:
+                profile_report(name, kwargs, args.engine, args.json)
+            elif args.json:
+                db = get_db()
+                print(json.dumps(run_report(db.cursor(), name, kwargs, args.engine)))
+                db.close()
+            elif args.format != 'table':
+                stream_report(name, kwargs, args.engine, args.format)
+            else:
+                show_report(name, args.engine, **kwargs)
     else:
-        console.print("[cyan]Usage:[/cyan] mpd_stats.py {top-artists|top-tracks|recent|stats}")
+        console.print("[cyan]Usage:[/cyan] mpd_stats.py {ta|tt|rec|stats|heatmap|timeline|sessions|streaks|dashboard|library|coverage|unplayed|rebuild|serve|watch|import-log|export|batch|archive}")
         console.print("Or: mpd_stats.py <artist_name> tracks <number>")
         console.print("\n[bold]Examples:[/bold]")
         console.print("  mpd_stats.py 'Taylor Swift' tracks 10")
-        console.print("  mpd_stats.py top-artists week")
-        console.print("  mpd_stats.py top-tracks month 20")
+        console.print("  mpd_stats.py ta week")
+        console.print("  mpd_stats.py tt month 20")
+        console.print("  mpd_stats.py dashboard 5")
+        console.print("  mpd_stats.py heatmap year 'Alice In Chains'")
+        console.print("  mpd_stats.py unplayed albums 30")
+        console.print("  mpd_stats.py export npy && mpd_stats.py ta year --engine numpy")
+        console.print("  mpd_stats.py batch 'ta week 20' 'tt month' 'rec 50' stats")
+        console.print("  mpd_stats.py batch @daily.txt --json")
+        console.print("  mpd_stats.py rec 100000 --format tsv | cut -f2 | sort | uniq -c")
+        console.print("  mpd_stats.py archive 2025")
+        console.print("  mpd_stats.py ta 20 --since 'March 2024' --until 'March 2024'")
+        console.print("  mpd_stats.py tt --since 'last 90 days'")
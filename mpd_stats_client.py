@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# Thin client for `mpd_stats.py serve`. Deliberately imports nothing heavy so
+# status bars and rofi menus only pay for interpreter startup and one socket
+# round trip. Falls back to running mpd_stats.py directly if no server is up.
+import json
+import os
+import shutil
+import socket
+import sys
+
+# Configuration
+SOCKET_PATH = os.path.join(os.environ.get("XDG_RUNTIME_DIR", "/tmp"), "mpd_stats.sock")
+STATS_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mpd_stats.py")
+
+def main(argv):
+    request = {
+        'argv': [arg for arg in argv if arg != '--json'],
+        'format': 'json' if '--json' in argv else 'table',
+        'width': shutil.get_terminal_size().columns,
+        'color': sys.stdout.isatty()
+    }
+
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(SOCKET_PATH)
+    except OSError:
+        os.execv(sys.executable, [sys.executable, STATS_SCRIPT, *argv])
+
+    with sock:
+        sock.sendall(json.dumps(request).encode() + b'\n')
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            sys.stdout.buffer.write(chunk)
+    sys.stdout.flush()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
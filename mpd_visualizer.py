@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# Spectrum visualizer fed by MPD's fifo output ("Visualizer feed" in mpd.conf).
+# Raw PCM is read straight into a preallocated buffer and viewed as int16
+# without copying; each frame takes an FFT of the newest window only, so a
+# slow frame drops audio instead of queueing it.
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+# Configuration
+FIFO_PATH = "/tmp/mpd.fifo"
+SAMPLE_RATE = 44100
+CHANNELS = 2
+FPS = 30
+BANDS = 16
+FFT_SIZE = 2048
+MIN_FREQ = 50
+MAX_FREQ = 16000
+FLOOR_DB = -70
+DECAY = 0.8
+IDLE_AFTER = 0.25
+# Read at most one default Linux pipe's worth per frame, so a writer running
+# ahead of real time cannot keep a frame from finishing
+MAX_READ_BYTES = 64 * 1024
+BAR_CHARS = ' ▁▂▃▄▅▆▇█'
+
+# Colors (you can customize these)
+bar_color = "#c678dd"
+silent_color = "#5c6370"
+
+class Spectrum:
+    """Log-spaced FFT band levels in 0..1 over a window of the newest samples"""
+
+    def __init__(self, bands=BANDS, fft_size=FFT_SIZE, sample_rate=SAMPLE_RATE):
+        self.samples = np.zeros(fft_size, np.float32)
+        self.window = np.hanning(fft_size).astype(np.float32)
+        self.windowed = np.empty(fft_size, np.float32)
+        self.levels = np.zeros(bands, np.float32)
+
+        # First FFT bin of each band; every band gets at least one bin
+        freqs = np.geomspace(MIN_FREQ, min(MAX_FREQ, sample_rate / 2), bands + 1)
+        starts = np.maximum(np.round(freqs[:-1] * fft_size / sample_rate).astype(np.intp), 1)
+        offsets = np.arange(bands)
+        self.starts = np.maximum.accumulate(starts - offsets) + offsets
+        self.stop = max(int(freqs[-1] * fft_size / sample_rate), int(self.starts[-1]) + 1)
+
+        # A full-scale sine through the Hann window peaks at fft_size / 4 * 32768
+        self.reference = fft_size / 4 * 32768
+
+    def push(self, frames):
+        """Append int16 frames (n x channels), mixed down to mono"""
+        count = len(frames)
+        if count == 0:
+            return
+        if count >= len(self.samples):
+            frames = frames[-len(self.samples):]
+            count = len(frames)
+        else:
+            self.samples[:-count] = self.samples[count:]
+        np.mean(frames, axis=1, dtype=np.float32, out=self.samples[-count:])
+
+    def silence(self):
+        self.samples.fill(0)
+
+    def update(self):
+        np.multiply(self.samples, self.window, out=self.windowed)
+        magnitudes = np.abs(np.fft.rfft(self.windowed)[:self.stop])
+        peaks = np.maximum.reduceat(magnitudes, self.starts)
+        db = 20 * np.log10(np.maximum(peaks / self.reference, 1e-9))
+        fresh = np.clip(1 - db / FLOOR_DB, 0, 1)
+        # Rise at once, fall off gradually
+        np.maximum(fresh, self.levels * DECAY, out=self.levels)
+        return self.levels
+
+class FifoReader:
+    """Non-blocking reader that hands out whole PCM frames from MPD's FIFO"""
+
+    def __init__(self, path=FIFO_PATH, frames=FFT_SIZE):
+        self.path = path
+        self.file = None
+        self.frame_bytes = 2 * CHANNELS
+        self.buffer = bytearray(frames * self.frame_bytes)
+        self.view = memoryview(self.buffer)
+        self.pcm = np.frombuffer(self.buffer, dtype=np.int16).reshape(-1, CHANNELS)
+        self.partial = 0
+
+    def open(self):
+        try:
+            # O_NONBLOCK so opening does not wait for MPD to start writing
+            fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        except FileNotFoundError:
+            return False
+        self.file = os.fdopen(fd, 'rb', buffering=0)
+        return True
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.partial = 0
+
+    def drain(self, spectrum):
+        """Feed everything MPD has written so far into spectrum, returning the bytes read"""
+        if self.file is None and not self.open():
+            return 0
+
+        total = 0
+        while total < MAX_READ_BYTES:
+            read = self.file.readinto(self.view[self.partial:])
+            if not read:
+                if read == 0:
+                    # No writer left (output disabled or MPD gone); reopen next frame
+                    self.close()
+                return total
+            total += read
+
+            filled = self.partial + read
+            frames = filled // self.frame_bytes
+            spectrum.push(self.pcm[:frames])
+            self.partial = filled - frames * self.frame_bytes
+            if self.partial:
+                self.view[:self.partial] = self.view[frames * self.frame_bytes:filled]
+        return total
+
+def render_bars(levels):
+    top = len(BAR_CHARS) - 1
+    return ''.join(BAR_CHARS[int(level * top + 0.5)] for level in levels)
+
+class Emitter:
+    """Write each frame for Waybar (JSON lines, only on change) or a terminal"""
+
+    def __init__(self, fmt, out=sys.stdout):
+        self.fmt = fmt
+        self.out = out
+        self.last_line = None
+
+    def emit(self, levels, playing):
+        bars = render_bars(levels)
+        if self.fmt == 'waybar':
+            color = bar_color if playing else silent_color
+            line = json.dumps({
+                'text': f"<span foreground='{color}'>{bars}</span>",
+                'class': 'playing' if playing else 'stopped'
+            }, ensure_ascii=False) + '\n'
+        else:
+            line = '\r' + bars
+        if line != self.last_line:
+            self.out.write(line)
+            self.out.flush()
+            self.last_line = line
+
+def run(emitter, path=FIFO_PATH, fps=FPS, bands=BANDS):
+    spectrum = Spectrum(bands)
+    reader = FifoReader(path)
+    period = 1 / fps
+    deadline = last_data = time.monotonic()
+
+    while True:
+        if reader.drain(spectrum):
+            last_data = time.monotonic()
+        # MPD keeps the FIFO open but stops writing while paused
+        playing = time.monotonic() - last_data < IDLE_AFTER
+        if not playing:
+            spectrum.silence()
+        emitter.emit(spectrum.update(), playing)
+
+        deadline += period
+        now = time.monotonic()
+        if now > deadline:
+            # Too slow for this frame rate: skip the missed frames rather than catch up
+            deadline += (int((now - deadline) / period) + 1) * period
+        time.sleep(deadline - now)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Spectrum bars from MPD's FIFO output")
+    parser.add_argument('--fifo', default=FIFO_PATH, help='FIFO written by MPD (44100:16:2)')
+    parser.add_argument('--format', choices=['waybar', 'term'],
+                        default='term' if sys.stdout.isatty() else 'waybar',
+                        help='JSON lines for a Waybar custom module, or one redrawn terminal line')
+    parser.add_argument('--fps', type=int, default=FPS, help='Frames per second')
+    parser.add_argument('--bands', type=int, default=BANDS, help='Number of bars')
+    args = parser.parse_args()
+
+    try:
+        run(Emitter(args.format), args.fifo, args.fps, args.bands)
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# Waybar custom module for MPD. Replaces mpd.sh's mpc/awk/sed pipeline with one
+# long-lived process on one MPD connection, speaking Waybar's continuous exec
+# protocol: a JSON line is printed only when the rendered output changes.
+import argparse
+import asyncio
+import html
+import json
+import os
+import sys
+import time
+from mpd.asyncio import MPDClient
+
+# Configuration
+MPD_HOST = "localhost"
+MPD_PORT = 6600
+IDLE_SUBSYSTEMS = ['player', 'database']
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 30
+
+# Colors (you can customize these)
+state_color = "#ff6b6b"
+artist_color = "#51afef"
+title_color = "#c678dd"
+album_color = "#98c379"
+time_color = "#abb2bf"
+paused_color = "#f2392cb"
+stopped_color = "#e06c75"
+off_color = "#5c6370"
+
+def tag(song, name):
+    """First value of a tag, as `mpc current -f %tag% | head -1` would print it"""
+    value = song.get(name, '')
+    if isinstance(value, list):
+        value = value[0] if value else ''
+    return value.split('\n')[0]
+
+def format_elapsed(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+def render_offline():
+    return {
+        'text': f'<span foreground="{off_color}">🔇 MPD Off</span>',
+        'class': 'stopped'
+    }
+
+def render(state, song, elapsed):
+    """Build the Waybar payload for a player state, matching mpd.sh"""
+    if state == 'stop':
+        song = {}
+    artist = tag(song, 'artist')
+    title = tag(song, 'title')
+    album = tag(song, 'album')
+    elapsed = format_elapsed(elapsed) if state != 'stop' else ''
+
+    if not artist:
+        artist = os.path.basename(tag(song, 'file')).split('.')[0]
+
+    # Truncate before escaping so an entity like &amp; is never cut in half
+    short_artist, short_title = (html.escape(value, quote=False) for value in (artist[:15], title[:20]))
+    artist, title, album = (html.escape(value, quote=False) for value in (artist, title, album))
+
+    if state in ('play', 'pause'):
+        icon, css_class, icon_color = ('▶', 'playing', state_color) if state == 'play' \
+            else ('⏸', 'paused', paused_color)
+        text = (f"<span foreground='{icon_color}'>{icon}</span> "
+                f"<span foreground='{artist_color}'>{short_artist}</span> - "
+                f"<span foreground='{title_color}'>{short_title}</span> | "
+                f"<span foreground='{time_color}'>{elapsed or '0:00'}</span>")
+    else:
+        css_class = 'stopped'
+        text = f"<span foreground='{stopped_color}'>⏹ Stopped</span>"
+
+    tooltip = (f"<b>MPD</b>\n"
+               f"<span foreground='{artist_color}'><b>Artist:</b></span> {artist or 'Unknown'}\n"
+               f"<span foreground='{title_color}'><b>Title:</b></span> {title or 'Unknown'}\n"
+               f"<span foreground='{album_color}'><b>Album:</b></span> {album or 'Unknown'}\n"
+               f"<span foreground='{time_color}'><b>Time:</b></span> {elapsed or '0:00'}")
+
+    return {'text': text, 'class': css_class, 'tooltip': tooltip, 'escape': False}
+
+class WaybarEmitter:
+    """Track MPD's player state and print a JSON line whenever the bar text changes"""
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.last_line = None
+        self.state = 'stop'
+        self.song = {}
+        self.elapsed = 0.0
+        self.since = time.monotonic()
+        self.changed = asyncio.Event()
+
+    def emit(self, payload):
+        line = json.dumps(payload, ensure_ascii=False)
+        if line != self.last_line:
+            self.out.write(line + '\n')
+            self.out.flush()
+            self.last_line = line
+
+    def current_elapsed(self):
+        if self.state != 'play':
+            return self.elapsed
+        return self.elapsed + time.monotonic() - self.since
+
+    def emit_state(self):
+        self.emit(render(self.state, self.song, self.current_elapsed()))
+
+    async def refresh(self, client):
+        status = await client.status()
+        self.song = await client.currentsong()
+        self.state = status.get('state', 'stop')
+        self.elapsed = float(status.get('elapsed', 0))
+        self.since = time.monotonic()
+        self.emit_state()
+        self.changed.set()
+
+    async def watch(self, client):
+        async for _ in client.idle(IDLE_SUBSYSTEMS):
+            await self.refresh(client)
+
+    async def tick(self):
+        """Re-render on each whole second of elapsed time while playing"""
+        while True:
+            timeout = None
+            if self.state == 'play':
+                timeout = 1 - self.current_elapsed() % 1
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(self.changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                self.emit_state()
+
+    async def follow(self, client):
+        await self.refresh(client)
+        ticker = asyncio.create_task(self.tick())
+        try:
+            await self.watch(client)
+        finally:
+            ticker.cancel()
+
+    async def run(self):
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            client = MPDClient()
+            try:
+                await client.connect(MPD_HOST, MPD_PORT)
+            except Exception:
+                self.emit(render_offline())
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                continue
+
+            delay = RECONNECT_MIN_DELAY
+            try:
+                await self.follow(client)
+            except Exception:
+                self.emit(render_offline())
+            finally:
+                client.disconnect()
+
+async def print_once():
+    emitter = WaybarEmitter()
+    client = MPDClient()
+    try:
+        await client.connect(MPD_HOST, MPD_PORT)
+    except Exception:
+        emitter.emit(render_offline())
+        return
+    try:
+        await emitter.refresh(client)
+    finally:
+        client.disconnect()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MPD status for Waybar")
+    parser.add_argument('--once', action='store_true',
+                        help='Print the current status once and exit, like mpd.sh')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(print_once() if args.once else WaybarEmitter().run())
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mpd_db
+import mpd_stats
+
+def set_timezone(name):
+    if name is None:
+        os.environ.pop('TZ', None)
+    else:
+        os.environ['TZ'] = name
+    time.tzset()
+    # Offsets and day names are memoized per process
+    mpd_db._utc_offset.cache_clear()
+    mpd_db._day_text.cache_clear()
+
+@pytest.fixture
+def new_york():
+    """Run in a zone that falls back on 2025-11-02, repeating 01:00-02:00"""
+    saved = os.environ.get('TZ')
+    set_timezone('America/New_York')
+    yield
+    set_timezone(saved)
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(mpd_db, 'ARCHIVE_DIR', str(tmp_path / 'archive'))
+    return str(tmp_path / 'listening_history.db')
+
+@pytest.fixture
+def stats_db(db_path, monkeypatch):
+    """mpd_stats reports run against the test database"""
+    monkeypatch.setattr(mpd_stats, 'get_db', lambda: mpd_db.connect(db_path))
+    return db_path
+
+def add_plays(db, plays, duration=200):
+    """Record (local time, artist, title) plays and commit"""
+    cursor = db.cursor()
+    for timestamp, artist, title in plays:
+        mpd_db.record_play(cursor, mpd_db.to_epoch(timestamp), artist, 'Album', title, duration)
+    db.commit()
+
+@pytest.fixture
+def no_mpd(monkeypatch):
+    """Tag lookups fall back to file names: no library index, no MPD to ask"""
+    import mpd_import
+    import mpd_library
+    monkeypatch.setattr(mpd_library, 'load', lambda: mpd_library.LibraryIndex())
+    monkeypatch.setattr(mpd_import, 'MPD_PORT', 1)
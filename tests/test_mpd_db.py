@@ -0,0 +1,135 @@
+import sqlite3
+import mpd_db
+
+# The flat table every install started with
+BASELINE_SCHEMA = '''
+CREATE TABLE listening_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+    artist TEXT NOT NULL,
+    album TEXT,
+    title TEXT NOT NULL,
+    duration INTEGER,
+    played INTEGER DEFAULT 1
+);
+CREATE TABLE stats_cache (
+    period TEXT,
+    type TEXT,
+    data TEXT,
+    updated DATETIME
+);
+CREATE INDEX idx_timestamp ON listening_history(timestamp);
+CREATE INDEX idx_artist ON listening_history(artist);
+CREATE INDEX idx_artist_date ON listening_history(artist, date(timestamp));
+'''
+
+LEGACY_ROWS = [
+    (1, '2025-03-01 09:00:00', 'TOOL', 'Lateralus', 'Schism', 403, 1),
+    (2, '2025-03-01 09:07:00', 'TOOL', 'Lateralus', 'Parabola', 363, 1),
+    (4, '2025-03-01 21:30:00', 'Eminem', None, 'Lose Yourself', 326, 1),
+    (5, '2025-03-02 08:15:00', 'TOOL', 'Lateralus', 'Schism', 403, 0),
+    (7, '2025-03-02 08:22:00', 'Björk', 'Homogenic', 'Jóga', 305, 1),
+]
+
+def make_baseline(path, rows):
+    db = sqlite3.connect(path)
+    db.executescript(BASELINE_SCHEMA)
+    db.executemany('INSERT INTO listening_history VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+    db.commit()
+    db.close()
+
+def test_migrate_baseline_history(db_path, new_york):
+    make_baseline(db_path, LEGACY_ROWS)
+    db = mpd_db.connect(db_path)
+    cursor = db.cursor()
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE name = 'listening_history_legacy'")
+    assert cursor.fetchone() is None
+    cursor.execute('SELECT COUNT(*) FROM plays')
+    assert cursor.fetchone()[0] == len(LEGACY_ROWS)
+    cursor.execute('SELECT COUNT(*) FROM artists')
+    assert cursor.fetchone()[0] == 3
+    cursor.execute('SELECT COUNT(*) FROM tracks')
+    assert cursor.fetchone()[0] == 4
+
+    cursor.execute('''
+        SELECT id, timestamp, artist, album, title, duration, played
+        FROM listening_history ORDER BY id
+    ''')
+    assert cursor.fetchall() == LEGACY_ROWS
+    cursor.execute('SELECT epoch FROM listening_history WHERE id = 1')
+    assert cursor.fetchone()[0] == mpd_db.to_epoch('2025-03-01 09:00:00')
+
+    cursor.execute('SELECT a.name, s.plays FROM artist_stats s JOIN artists a ON a.id = s.artist_id ORDER BY a.name')
+    assert cursor.fetchall() == [('Björk', 1), ('Eminem', 1), ('TOOL', 3)]
+    cursor.execute('SELECT COUNT(*), SUM(plays) FROM sessions')
+    assert cursor.fetchone() == (3, len(LEGACY_ROWS))
+
+    # New plays continue after the last legacy id
+    assert mpd_db.record_play(cursor, mpd_db.to_epoch('2025-03-03 10:00:00'),
+                              'TOOL', 'Lateralus', 'Schism', 403) == 8
+    db.commit()
+    db.close()
+
+# 00:50 EDT, the first 01:10 (EDT) and 02:10 EST on the night New York falls back
+FALL_BACK_TEXT = ['2025-11-02 00:50:00', '2025-11-02 01:10:00', '2025-11-02 02:10:00']
+FALL_BACK_EPOCHS = [1762059000, 1762060200, 1762067400]
+
+def test_convert_play_times_across_fall_back(db_path, new_york):
+    db = mpd_db.connect(db_path)
+    cursor = db.cursor()
+    for epoch in FALL_BACK_EPOCHS:
+        mpd_db.record_play(cursor, epoch, 'TOOL', 'Lateralus', 'Schism', 200)
+    db.commit()
+    assert mpd_db.archive_plays(db, 2026) == {'2025': 3}
+
+    # Roll the archive and rollups back to the local text older versions stored
+    cursor.execute("SELECT path FROM partitions WHERE name = 'p2025'")
+    cursor.execute('ATTACH DATABASE ? AS p2025', cursor.fetchone())
+    cursor.execute("UPDATE p2025.plays SET timestamp = datetime(timestamp, 'unixepoch', 'localtime')")
+    for table in ('artist_stats', 'track_stats'):
+        cursor.execute(f'''
+            UPDATE {table}
+            SET first_play = datetime(first_play, 'unixepoch', 'localtime'),
+                last_play = datetime(last_play, 'unixepoch', 'localtime')
+        ''')
+    cursor.execute('SELECT timestamp FROM p2025.plays ORDER BY id')
+    assert [row[0] for row in cursor.fetchall()] == FALL_BACK_TEXT
+    db.commit()
+    db.close()
+
+    db = mpd_db.connect(db_path)
+    cursor = db.cursor()
+    cursor.execute(f'SELECT timestamp FROM {mpd_db.plays_sql(cursor)} ORDER BY id')
+    assert [row[0] for row in cursor.fetchall()] == FALL_BACK_EPOCHS
+    cursor.execute('SELECT first_play, last_play FROM artist_stats')
+    assert cursor.fetchall() == [(FALL_BACK_EPOCHS[0], FALL_BACK_EPOCHS[-1])]
+    # Every play is archived, and sessions are still split on real elapsed time:
+    # 01:10 EDT to 02:10 EST is two hours
+    cursor.execute('SELECT start, plays FROM sessions ORDER BY start')
+    assert cursor.fetchall() == [(FALL_BACK_EPOCHS[0], 2), (FALL_BACK_EPOCHS[2], 1)]
+    db.close()
+
+SEARCH_ARTISTS = ['Alice In Chains', 'Chains', 'Alice Cooper', 'TOOL', 'Björk', '50% Off']
+
+def test_search_artists_through_fts_index(db_path):
+    db = mpd_db.connect(db_path)
+    cursor = db.cursor()
+    for i, artist in enumerate(SEARCH_ARTISTS):
+        mpd_db.record_play(cursor, 1760000000 + i * 300, artist, 'Album', 'Track', 200)
+    db.commit()
+
+    names = lambda query: [name for _, name in mpd_db.search_artists(cursor, query)]
+    # Substrings anywhere in the name, exact match first, then shortest
+    assert names('lice') == ['Alice Cooper', 'Alice In Chains']
+    assert names('chains') == ['Chains', 'Alice In Chains']
+    assert names('BJÖ') == ['Björk']
+    # Quotes and LIKE wildcards are matched literally
+    assert names('0% O') == ['50% Off']
+    assert names('"') == []
+    # Too short for trigrams: falls back to LIKE
+    assert names('oo') == ['TOOL', 'Alice Cooper']
+
+    assert mpd_db.suggest_artists(cursor, 'Alise in Chanes', limit=1) == ['Alice In Chains']
+    assert mpd_db.suggest_artists(cursor, 'Alice Coper', limit=2)[0] == 'Alice Cooper'
+    db.close()
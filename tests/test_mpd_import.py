@@ -0,0 +1,42 @@
+import mpd_db
+import mpd_import
+
+# The night New York falls back: the log's local clock runs 01:00-02:00 twice
+FALL_BACK_LOG = [
+    ('2025-11-02T00:50:00', 'One', 1762059000),
+    ('2025-11-02T01:20:00', 'Two', 1762060800),
+    ('2025-11-02T01:50:00', 'Three', 1762062600),
+    ('2025-11-02T01:10:00', 'Four', 1762063800),
+    ('2025-11-02T01:40:00', 'Five', 1762065600),
+    ('2025-11-02T02:10:00', 'Six', 1762067400),
+]
+
+def write_log(path, entries):
+    with open(path, 'w') as f:
+        for timestamp, title, _ in entries:
+            f.write(f'{timestamp} player: played "Artist/Album/Band - {title}.mp3"\n')
+
+def test_import_resumes_across_repeated_hour(db_path, tmp_path, new_york, no_mpd):
+    log = str(tmp_path / 'mpd.log')
+    db = mpd_db.connect(db_path)
+    write_log(log, FALL_BACK_LOG[:4])
+    assert mpd_import.import_logs(db, [log]) == (4, 4, 0)
+    cursor = db.cursor()
+    cursor.execute('SELECT last_timestamp FROM import_state')
+    assert cursor.fetchone()[0] == FALL_BACK_LOG[3][2]
+
+    # The log grows; only the plays after the checkpoint are new
+    write_log(log, FALL_BACK_LOG)
+    assert mpd_import.import_logs(db, [log]) == (6, 2, 0)
+    cursor.execute('SELECT title, epoch FROM listening_history ORDER BY epoch')
+    assert cursor.fetchall() == [(title, epoch) for _, title, epoch in FALL_BACK_LOG]
+    db.close()
+
+def test_import_reads_a_local_time_checkpoint(db_path, tmp_path, new_york, no_mpd):
+    log = str(tmp_path / 'mpd.log')
+    write_log(log, FALL_BACK_LOG[:3])
+    db = mpd_db.connect(db_path)
+    db.execute("INSERT INTO import_state (source, last_timestamp) VALUES ('mpd', '2025-11-02 01:20:00')")
+    db.commit()
+    assert mpd_import.import_logs(db, [log]) == (3, 1, 0)
+    db.close()
@@ -0,0 +1,12 @@
+import mpd_metrics
+
+def test_label_values_are_escaped():
+    registry = mpd_metrics.Registry()
+    counter = registry.counter('plays_total', 'Plays\nby artist')
+    counter.inc(artist='The "Band"', server='C:\\mpd\nkitchen')
+    lines = registry.render().splitlines()
+    assert lines == [
+        '# HELP plays_total Plays\\nby artist',
+        '# TYPE plays_total counter',
+        'plays_total{artist="The \\"Band\\"",server="C:\\\\mpd\\nkitchen"} 1',
+    ]
@@ -0,0 +1,46 @@
+import json
+import mpd_db
+import mpd_scrobbler
+
+def play(i, **fields):
+    return {'timestamp': 1760000000 + i * 300, 'artist': 'TOOL', 'album': 'Lateralus',
+            'title': f'Track {i}', 'duration': 200, **fields}
+
+def titles(db):
+    return [row[0] for row in db.execute('SELECT title FROM listening_history ORDER BY epoch')]
+
+def test_spool_replays_after_restart_without_duplicates(db_path, tmp_path):
+    path = str(tmp_path / 'spool.jsonl')
+    db = mpd_db.connect(db_path)
+    spool = mpd_scrobbler.ScrobbleSpool(path)
+    for i in range(3):
+        spool.append(play(i))
+    # Track 0 was committed just before a crash that left the spool untruncated
+    mpd_db.record_play(db.cursor(), **mpd_scrobbler.spooled_play(play(0)))
+    db.commit()
+    with open(path, 'a') as f:
+        f.write('{"timestamp": 17600')
+
+    spool = mpd_scrobbler.ScrobbleSpool(path)
+    assert [entry['title'] for entry in spool.pending] == ['Track 0', 'Track 1', 'Track 2']
+    assert spool.due()
+    assert spool.flush(db)
+    assert titles(db) == ['Track 0', 'Track 1', 'Track 2']
+    assert spool.pending == [] and mpd_scrobbler.ScrobbleSpool(path).pending == []
+    db.close()
+
+def test_spool_rejects_malformed_entries(db_path, tmp_path, new_york):
+    path = str(tmp_path / 'spool.jsonl')
+    db = mpd_db.connect(db_path)
+    spool = mpd_scrobbler.ScrobbleSpool(path)
+    bad = [play(1, duration='long'), {'timestamp': 1760000600, 'artist': 'TOOL'}, play(3, title=None)]
+    for entry in [play(0), *bad, play(4, timestamp='2025-10-09 12:00:00')]:
+        spool.append(entry)
+
+    assert spool.flush(db)
+    # Legacy local time entries are still accepted
+    assert titles(db) == ['Track 0', 'Track 4']
+    with open(path + '.rejected') as f:
+        assert [json.loads(line) for line in f] == bad
+    assert mpd_scrobbler.ScrobbleSpool(path).pending == []
+    db.close()
@@ -0,0 +1,30 @@
+import asyncio
+import threading
+import mpd_db
+import mpd_scrobbler_async
+
+def test_writer_spools_off_the_event_loop(db_path, tmp_path):
+    writer = mpd_scrobbler_async.ScrobbleWriter(db_path, str(tmp_path / 'spool.jsonl'))
+    threads = []
+    append = writer.spool.append
+
+    def recording_append(play):
+        threads.append(threading.current_thread().name)
+        append(play)
+
+    writer.spool.append = recording_append
+
+    async def scenario():
+        task = asyncio.create_task(writer.run())
+        for i in range(3):
+            writer.submit({'timestamp': 1760000000 + i * 300, 'artist': 'TOOL', 'album': 'Lateralus',
+                           'title': f'Track {i}', 'duration': 200, 'source': 'desk'})
+        await asyncio.sleep(0.2)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert threads and all(name.startswith('scrobble-writer') for name in threads)
+    db = mpd_db.connect(db_path)
+    assert db.execute("SELECT COUNT(*) FROM listening_history WHERE source = 'desk'").fetchone()[0] == 3
+    db.close()
@@ -0,0 +1,205 @@
+import json
+import time
+from datetime import date, timedelta
+import mpd_db
+import mpd_import
+import mpd_stats
+from conftest import add_plays
+
+# 01:00 EDT on 2025-11-02; New York repeats 01:00-02:00 an hour later as EST
+FALL_BACK = 1762059600
+
+def test_rec_pages_through_repeated_hour(db_path, new_york):
+    db = mpd_db.connect(db_path)
+    cursor = db.cursor()
+    # Every 15 minutes for two hours, with two plays sharing the last second
+    epochs = [FALL_BACK + i * 900 for i in range(8)] + [FALL_BACK + 7 * 900]
+    for i, epoch in enumerate(epochs):
+        mpd_db.record_play(cursor, epoch, 'TOOL', 'Lateralus', f'Track {i}', 200)
+    db.commit()
+
+    pages, before = [], None
+    while True:
+        data = mpd_stats.query_recent_tracks(cursor, 4, before)
+        pages.append(data['rows'])
+        before = data['next']
+        if before is None:
+            break
+
+    assert [len(page) for page in pages] == [4, 4, 1]
+    titles = [row[2] for page in pages for row in page]
+    assert titles == [f'Track {i}' for i in (8, 7, 6, 5, 4, 3, 2, 1, 0)]
+    # Local times run backwards through the repeated hour twice
+    times = [row[0][11:16] for page in pages for row in page]
+    assert times == ['01:45', '01:45', '01:30', '01:15', '01:00', '01:45', '01:30', '01:15', '01:00']
+
+    # A local time cursor in the repeated hour means its first occurrence
+    data = mpd_stats.query_recent_tracks(cursor, 20, '2025-11-02 01:15:00')
+    assert [row[2] for row in data['rows']] == ['Track 0']
+    db.close()
+
+def test_batch_rec_reads_archives_in_one_snapshot(stats_db, capsys):
+    db = mpd_db.connect(stats_db)
+    add_plays(db, [(f'{year}-06-01 12:00:00', 'TOOL', f'Track {year}') for year in range(2022, 2027)])
+    assert len(mpd_db.archive_plays(db, 2026)) == 4
+    db.close()
+
+    mpd_stats.batch(['rec 2000', 'rec 2', 'stats'], as_json=True)
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [line['command'] for line in lines] == ['rec 2000', 'rec 2', 'stats']
+    assert [row[2] for row in lines[0]['data']['rows']] == [f'Track {year}' for year in range(2026, 2021, -1)]
+    assert [row[2] for row in lines[1]['data']['rows']] == ['Track 2026', 'Track 2025']
+    assert lines[2]['data']['total_plays'] == 5
+
+def test_rec_merges_backfilled_plays_with_archives(db_path):
+    db = mpd_db.connect(db_path)
+    add_plays(db, [('2024-05-01 12:00:00', 'A', 'archived-2024'), ('2026-05-01 12:00:00', 'A', 'recent-2026')])
+    mpd_db.archive_plays(db, 2026)
+    # import-log backfills into the hot table, older than every archive
+    add_plays(db, [('2019-05-01 12:00:00', 'A', 'backfilled-2019')])
+    cursor = db.cursor()
+
+    data = mpd_stats.query_recent_tracks(cursor, 2)
+    assert [row[2] for row in data['rows']] == ['recent-2026', 'archived-2024']
+    data = mpd_stats.query_recent_tracks(cursor, 2, data['next'])
+    assert [row[2] for row in data['rows']] == ['backfilled-2019']
+    db.close()
+
+def test_range_reports_over_more_archives_than_sqlite_attaches(db_path):
+    db = mpd_db.connect(db_path)
+    add_plays(db, [(f'{year}-06-01 12:00:00', f'Artist {year % 3}', f'Track {year}')
+                   for year in range(2010, 2027)])
+    assert len(mpd_db.archive_plays(db, 2026)) == 16
+    cursor = db.cursor()
+
+    name, kwargs = mpd_stats.parse_command('stats', [], since='2010', until='2025')
+    data = mpd_stats.run_report(cursor, name, kwargs)
+    assert data['total_plays'] == 16
+    assert data['first_play'] == '2010-06-01 12:00:00'
+    assert data['last_play'] == '2025-06-01 12:00:00'
+    assert data['unique_tracks'] == 16
+
+    name, kwargs = mpd_stats.parse_command('stats', [], since='2012-06-01', until='2012-06-01')
+    assert mpd_stats.run_report(cursor, name, kwargs)['total_plays'] == 1
+
+    existing = mpd_import._existing_plays(cursor, mpd_db.to_epoch('2010-06-01 12:00:00'),
+                                          mpd_db.to_epoch('2026-06-01 12:00:00'))
+    assert sum(len(epochs) for epochs in existing.values()) == 17
+    # Nothing stays attached once a pass is over
+    cursor.execute('PRAGMA database_list')
+    assert [row[1] for row in cursor.fetchall() if row[1] != 'temp'] == ['main']
+    db.close()
+
+def test_batch_reports_bad_lines_and_keeps_going(stats_db, capsys):
+    db = mpd_db.connect(stats_db)
+    add_plays(db, [('2026-05-01 12:00:00', 'TOOL', 'Schism')])
+    db.close()
+
+    mpd_stats.batch(['ta --engine x', 'stats --frob', 'rec --before nope', 'bogus', 'rec 1'], as_json=True)
+    out, err = capsys.readouterr()
+    lines = [json.loads(line) for line in out.splitlines()]
+    assert [line.get('error', '')[:17] for line in lines] == [
+        'Invalid arguments', 'Invalid arguments', 'Invalid --before ', 'Unknown command: ', '']
+    assert lines[-1]['data']['rows'][0][2] == 'Schism'
+    # No argparse usage block per bad line
+    assert err == ''
+
+RANGE_PLAYS = [
+    ('2025-03-01 10:00:00', 'A', 'One'),
+    ('2025-03-01 23:30:00', 'B', 'Two'),
+    ('2025-03-02 00:10:00', 'A', 'One'),
+    ('2025-03-03 12:00:00', 'A', 'Three'),
+    ('2026-03-02 12:00:00', 'C', 'Four'),
+    ('2026-03-03 12:00:00', 'B', 'Two'),
+]
+
+def range_report(cursor, command, since, until):
+    name, kwargs = mpd_stats.parse_command(command, [], since=since, until=until)
+    return mpd_stats.run_report(cursor, name, kwargs)
+
+def test_range_totals_from_daily_rollups(db_path, new_york):
+    db = mpd_db.connect(db_path)
+    add_plays(db, RANGE_PLAYS)
+    mpd_db.archive_plays(db, 2026)
+    cursor = db.cursor()
+
+    data = range_report(cursor, 'stats', '2025-03-02', '2026-03-02')
+    assert (data['total_plays'], data['unique_artists'], data['unique_tracks']) == (3, 2, 3)
+    assert (data['top_artist'], data['top_artist_plays']) == ('A', 2)
+    assert (data['first_play'], data['last_play']) == ('2025-03-02 00:10:00', '2026-03-02 12:00:00')
+    assert range_report(cursor, 'ta', '2025-03-02', '2026-03-02')['rows'] == [('A', 2), ('C', 1)]
+    assert sorted(range_report(cursor, 'tt', '2025-03-02', '2026-03-02')['rows']) == [
+        ('A', 'One', 1), ('A', 'Three', 1), ('C', 'Four', 1)]
+
+    # Days split at local midnight
+    data = range_report(cursor, 'stats', '2025-03-01', '2025-03-01')
+    assert (data['total_plays'], data['unique_artists']) == (2, 2)
+    assert (data['first_play'], data['last_play']) == ('2025-03-01 10:00:00', '2025-03-01 23:30:00')
+    assert sorted(range_report(cursor, 'tt', '2025-03-01', '2026-12-31')['rows']) == [
+        ('A', 'One', 2), ('A', 'Three', 1), ('B', 'Two', 2), ('C', 'Four', 1)]
+    assert range_report(cursor, 'ta', '2025-03-01', '2026-12-31')['rows'][:2] == [('A', 3), ('B', 2)]
+
+    data = range_report(cursor, 'stats', '2025-04-01', '2025-12-31')
+    assert (data['total_plays'], data['unique_artists'], data['top_artist'], data['first_play']) == (0, 0, 'None', None)
+    db.close()
+
+def test_sessions_and_streaks(db_path, new_york):
+    db = mpd_db.connect(db_path)
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    # 200 second plays; a gap of exactly 30 minutes after a play ends keeps the session open
+    add_plays(db, [
+        ('2025-03-01 10:00:00', 'A', 'One'),
+        ('2025-03-01 10:05:00', 'A', 'Two'),
+        ('2025-03-01 10:38:20', 'A', 'Three'),
+        ('2025-03-01 11:09:00', 'A', 'Four'),
+        ('2025-03-01 12:00:00', 'B', 'One'),
+        ('2025-03-02 12:00:00', 'B', 'Two'),
+        ('2025-03-03 12:00:00', 'B', 'Three'),
+        ('2025-03-05 12:00:00', 'C', 'One'),
+        (f'{yesterday} 12:00:00', 'C', 'Two'),
+        (f'{today} 00:00:01', 'C', 'Three'),
+    ])
+    # Backfilled before the first session and folded into it on rebuild
+    add_plays(db, [('2025-03-01 09:40:00', 'A', 'Zero')])
+    mpd_db.rebuild_sessions(db)
+    cursor = db.cursor()
+
+    data = mpd_stats.query_sessions(cursor, limit=2)
+    assert (data['sessions'], data['plays'], data['seconds'], data['gap_minutes']) == (7, 11, 2200, 30)
+    assert data['rows'][0] == ('2025-03-01 09:40:00', '2025-03-01 11:12:20', 5, 1000)
+    assert data['rows'][1][2:] == (1, 200)
+    assert mpd_stats.query_sessions(cursor, 'week')['sessions'] == 2
+
+    data = mpd_stats.query_streaks(cursor)
+    assert data['active_days'] == 6
+    assert data['current'] == (str(yesterday), str(today), 2, 2)
+    assert data['rows'] == [('2025-03-01', '2025-03-03', 3, 8), (str(yesterday), str(today), 2, 2),
+                            ('2025-03-05', '2025-03-05', 1, 1)]
+    db.close()
+
+def test_dashboard_matches_per_period_reports(db_path):
+    db = mpd_db.connect(db_path)
+    cursor = db.cursor()
+    now = int(time.time())
+    # (artist, plays, age in days): each artist falls in one period window
+    for artist, count, days in [('A', 3, 0.05), ('B', 2, 2), ('C', 4, 20), ('D', 5, 200), ('E', 6, 800)]:
+        for i in range(count):
+            mpd_db.record_play(cursor, now - int(days * 86400) - i * 300, artist, 'Album', f'{artist} song', 200)
+    db.commit()
+    assert sum(mpd_db.archive_plays(db, date.today().year - 1).values()) == 6
+
+    data = mpd_stats.query_dashboard(cursor)
+    assert data['periods'] == mpd_stats.PERIODS
+    assert data['artists'] == {
+        'day': [('A', 3)],
+        'week': [('A', 3), ('B', 2)],
+        'month': [('C', 4), ('A', 3), ('B', 2)],
+        'year': [('D', 5), ('C', 4), ('A', 3), ('B', 2)],
+        'all': [('E', 6), ('D', 5), ('C', 4), ('A', 3), ('B', 2)],
+    }
+    for period in mpd_stats.PERIODS:
+        assert data['tracks'][period] == [(artist, f'{artist} song', plays) for artist, plays in data['artists'][period]]
+        assert data['artists'][period] == mpd_stats.query_top_artists(cursor, period)['rows']
+        assert data['tracks'][period] == mpd_stats.query_top_tracks(cursor, period)['rows']
+    db.close()
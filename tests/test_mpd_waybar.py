@@ -0,0 +1,10 @@
+import xml.dom.minidom
+import mpd_waybar
+
+def test_truncated_tags_stay_valid_markup():
+    song = {'artist': 'Earth, Wind & Fire', 'title': "Let's Groove <Extended> & Remastered", 'album': 'R&B'}
+    payload = mpd_waybar.render('play', song, 65)
+    assert "Earth, Wind &amp; F<" in payload['text']
+    # Pango markup is XML; a half entity would make Waybar drop the label
+    for markup in (payload['text'], payload['tooltip']):
+        xml.dom.minidom.parseString(f'<markup>{markup}</markup>')